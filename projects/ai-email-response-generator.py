@@ -1,4 +1,6 @@
 from deepseek_connector import DeepSeekR1LocalConnector
+from model_manager import model_manager
+from session_manager import SessionManager
 import gradio as gr
 from enum import Enum
 
@@ -8,50 +10,58 @@ class EmailTone(Enum):
     FRIENDLY = "friendly"
 
 class AIEmailResponseGenerator(DeepSeekR1LocalConnector):
-    
+    MODEL_ID: str = "deepseek-r1:1.5b"
+    # sent as conversation turns after the system prompt, in the exact format of the requests.
+    FEW_SHOT_EXAMPLES: list[tuple[str, str]] = [
+        ("I hope this email finds you well.", "Thank you for your kind words. I hope you are doing well too."),
+        ("Can you provide an update on the project?", "Sure, I will get back to you with the latest updates shortly."),
+        ("Let's catch up over coffee next week.", "That sounds great! Let me know your available times."),
+        ("I have attached the report for your review.", "Thank you for sharing the report. I will review it and get back to you soon."),
+        ("Hey, just want an update on the project's progress",
+         "Sure! The project is on track and we are making good progress. I will send you a detailed update by the end of the day."),
+        ("I appreciate your help with this matter.", "You are welcome! I am glad I could assist you."),
+        ("Can we schedule a meeting to discuss this further?", "Absolutely! Please let me know your available times and I will arrange the meeting."),
+    ]
+
     def __init__(self, tone: EmailTone = EmailTone.FORMAL) -> None:
-        examples = (
-            f"1. Email:{self._format_for_prompt('I hope this email finds you well.')}\n"
-            f"\tResponse to the email:{self._format_for_prompt('Thank you for your kind words. I hope you are doing well too.')}\n"
-            f"2. Email:{self._format_for_prompt('Can you provide an update on the project?')}\n"
-            f"\tResponse to the email:{self._format_for_prompt('Sure, I will get back to you with the latest updates shortly.')}\n"
-            f"3. Email:{self._format_for_prompt('Let\'s catch up over coffee next week.')}\n"
-            f"\tResponse to the email:{self._format_for_prompt('That sounds great! Let me know your available times.')}\n"
-            f"4. Email:{self._format_for_prompt('I have attached the report for your review.')}\n"
-            f"\tResponse to the email:{self._format_for_prompt('Thank you for sharing the report. I will review it and get back to you soon.')}\n"
-            f"5. Email:{self._format_for_prompt('Hey, just want an update on the project\'s progress')}\n"
-            f"\tResponse to the email:{self._format_for_prompt('Sure! The project is on track and we are making good progress. I will send you a detailed update by the end of the day.')}\n"
-            f"6. Email:{self._format_for_prompt('I appreciate your help with this matter.')}\n"
-            f"\tResponse to the email:{self._format_for_prompt('You are welcome! I am glad I could assist you.')}\n"
-            f"7. Email:{self._format_for_prompt('Can we schedule a meeting to discuss this further?')}\n"
-            f"\tResponse to the email:{self._format_for_prompt('Absolutely! Please let me know your available times and I will arrange the meeting.')}\n"
-        )
         super().__init__(
-            model_id="deepseek-r1:1.5b",
+            model_id=self.MODEL_ID,
             system_behavior=(
                 "You are an AI assistant that generates content for an email, that will serve as a response, based on the provided content of the email for which a response is requested."
-                f"The tone of the response should be adjusted based on the specified tone: {tone.value}\n"
-                "Refer to these examples as a baseline to start with:\n"
-                f"{examples}"
-                "Your response should contain ONLY the new response and nothing more.\n\n"
-            )
+                "Refer to the examples of emails and responses that precede the request as a baseline to start with.\n"
+                "Your response should contain ONLY the new response and nothing more.\n"
+                f"The tone of the response should be adjusted based on the specified tone: {tone.value}\n\n"
+            ),
+            stateless=True
         )
 
+    @property
+    def _few_shot_examples(self) -> list[tuple[str, str]]:
+        return [(self._build_prompt(email), response) for email, response in self.FEW_SHOT_EXAMPLES]
+
     def ask(self, request: str) -> str:
-        prompt: str = (
+        self._add_user_message(self._build_prompt(request))
+        return self._query()
+
+    def _build_prompt(self, request: str) -> str:
+        return (
             f"Email:{self._format_for_prompt(request)}"
             "\tResponse to the email:\n"
         )
-        self._add_user_message(prompt)
-        return self._query()
 
-if __name__ == "__main__":
-    email_generator = AIEmailResponseGenerator(tone=EmailTone.FRIENDLY)
-    email_generator_interface = gr.Interface(
-        fn=email_generator.ask,
+def email_generator_interface() -> gr.Blocks:
+    """Builds the UI of the email response generator. The connector is stateless, so every session shares one."""
+    email_sessions: SessionManager[AIEmailResponseGenerator] = SessionManager(AIEmailResponseGenerator, factory=lambda: AIEmailResponseGenerator(tone=EmailTone.FRIENDLY), shared=True)
+    interface: gr.Interface = gr.Interface(
+        fn=email_sessions.handler("ask_stream_async"),
         inputs=gr.Textbox(label="Email Content", placeholder="Enter the email content you want to respond to..."),
         outputs=gr.Textbox(label="Generated Email Response", placeholder="The generated email response will appear here..."),
         title="AI Email Response Generator",
         description="This application uses the DeepSeek R1 model to generate email responses. Enter the email content you want to respond to in the input box and click 'Submit' to get the generated response.",
     )
-    email_generator_interface.launch()
\ No newline at end of file
+    return email_sessions.attach(interface)
+
+if __name__ == "__main__":
+    interface = email_generator_interface()
+    model_manager.preload()
+    interface.launch()
\ No newline at end of file
@@ -1,106 +1,102 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 from deepseek_connector import DeepSeekR1LocalConnector
-import gradio as gr
+from document_preprocessing import html_to_text
+from request_scheduler import Priority
+from requests.adapters import HTTPAdapter
 import requests
 
 class LinkedInCrawler(DeepSeekR1LocalConnector):
-    def __init__(self) -> None:
-        """Initializes the LinkedInCrawler with a system behavior for extracting LinkedIn profile information."""
+    """
+    Extracts a LinkedIn profile in a pipeline: the profile, skills and certifications pages are fetched concurrently
+    over one pooled HTTP session, every section is extracted in parallel in a conversation of its own, and only the
+    condensed sections reach the final summary. The latency is bound by the slowest section instead of the sum of all of them.
+    """
+    DEFAULT_TIMEOUT: tuple[float, float] = (5.0, 30.0)
+    # a crawl sends a dozen extraction requests - they must not hold up interactive tools.
+    PRIORITY: Priority = Priority.BULK
+    # page of the profile (appended to its URL) for each page fetched.
+    __PAGES: dict[str, str] = {
+        "profile": "",
+        "skills": "/details/skills",
+        "certifications": "/details/certifications",
+    }
+    # section name, the page it is extracted from, the keyword of its part of the page, and the extraction prompt.
+    __SECTIONS: list[tuple[str, str, str | None, str]] = [
+        ("Profile", "profile", None, "Extract the general information from this text of a LinkedIn profile page:{text}Respond ONLY with the general information, nothing more."),
+        ("Education", "profile", "education", "Extract the information about education from this text of a LinkedIn profile page:{text}Respond ONLY with the information of education, nothing more."),
+        ("Experience", "profile", "experience", "Extract the information about experience from this text of a LinkedIn profile page:{text}Respond ONLY with the information of experience, nothing more."),
+        ("Skills", "skills", "skills", "Extract the information about skills from this text of a LinkedIn skills page:{text}Respond ONLY with the information of skills, nothing more."),
+        ("Certifications", "certifications", "certifications", "Extract the information about certifications from this text of a LinkedIn certifications page:{text}Respond ONLY with the information of certifications, nothing more."),
+    ]
+    __COMBINE_PROMPT: str = "Combine these partial extractions of the {name} section of a LinkedIn profile into one, without duplicates:{text}Respond ONLY with the combined information, nothing more."
+
+    def __init__(self, session: requests.Session | None = None, timeout: tuple[float, float] = DEFAULT_TIMEOUT) -> None:
+        """
+        Initializes the LinkedInCrawler with a system behavior for extracting LinkedIn profile information.
+
+        Args:
+            session (requests.Session | None): The HTTP session to fetch pages with. A pooled one is created if None.
+            timeout (tuple[float, float]): The connect and read timeouts of a page request, in seconds.
+        """
         super().__init__(system_behavior=(
             "You are a helpful assistant specialized in crawling LinkedIn profiles."
             "Your goal is to help users extract relevant information from LinkedIn profiles."
             "Before you can create resume - you will need to extract all relevant information from the LinkedIn profile."
             "The mentioned information includes general information, education, experience, skills, and certifications."
-            "It will accumulated in the chat history."
+            "Each section is extracted separately, and the extracted sections are summarized at the end."
             "If some information from mentioned sections is not available, you will stop immediately."
             "Your response will be ONLY the extracted information in Markdown format."
         ))
+        self.__session = session or self.__create_session()
+        self.__timeout = timeout
 
-    def __get_general_information(self, profile_url: str) -> None:
-        """Fetches and extracts general information from the given LinkedIn profile URL."""
-
-        #Such call is only for demonstration purposes, as LinkedIn does not allow scraping.
-        #In a real-world scenario, you would need to handle authentication and scraping more carefully.
-        response: requests.Response = requests.get(profile_url)
-        
-        if response.status_code == 200:
-            general_page: str = response.text
-            prompt: str = (
-                f"Clean this page of LinkedIn profile from HTML:{self._format_for_prompt(general_page)}"
-                "Respond ONLY with the general information, nothing more."
-            )
-            self._add_user_message(prompt)
-            general_information: str = self._query()
-            self._add_assistant_message(f"Profile:{self._format_for_prompt(general_information)}")
-        else:
-            self._add_assistant_message("No general information available.")
-
-    def __get_skills_information(self, profile_url: str) -> None:
-        """Fetches and extracts skills information from the LinkedIn profile's skills page."""
-
-        #Such call is only for demonstration purposes, as LinkedIn does not allow scraping.
-        #In a real-world scenario, you would need to handle authentication and scraping more carefully.
-        response: requests.Response = requests.get(f"{profile_url}/details/skills")
-        
-        if response.status_code == 200:
-            skills_page: str = response.text
-            prompt: str = (
-                f"Extract the information about skills from this LinkedIn skills page:{self._format_for_prompt(skills_page)}"
-                "Respond ONLY with the information of skills, nothing more."
-            )
-            self._add_user_message(prompt)
-            skills_information: str = self._query()
-            self._add_assistant_message(f"Skills:{self._format_for_prompt(skills_information)}")
-        else:
-            self._add_assistant_message("No skills information available.")
+    @staticmethod
+    def __create_session() -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=len(LinkedInCrawler.__PAGES))
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
 
-    def __get_certifications_information(self, profile_url: str) -> None:
-        """Fetches and extracts certifications information from the LinkedIn profile's certifications page."""
+    def __fetch_page(self, url: str) -> str | None:
+        """Fetches a page of the profile. Returns None if it is not available."""
 
         #Such call is only for demonstration purposes, as LinkedIn does not allow scraping.
         #In a real-world scenario, you would need to handle authentication and scraping more carefully.
-        response: requests.Response = requests.get(f"{profile_url}/details/certifications")
-
-        if response.status_code == 200:
-            certifications_page: str = response.text
-            prompt: str = (
-                f"Extract the information about certifications from this LinkedIn certifications page:{self._format_for_prompt(certifications_page)}"
-                "Respond ONLY with the information of certifications, nothing more."
-            )
-            self._add_user_message(prompt)
-            certifications_information: str = self._query()
-            self._add_assistant_message(f"Certifications:{self._format_for_prompt(certifications_information)}")
-        else:
-            self._add_assistant_message("No certifications information available.")
-
-    def __get_experience_information(self) -> None:
-        """Extracts experience information from the LinkedIn profile data stored in the chat history."""
-        prompt: str = (
-            f"Extract the information about experience from the LinkedIn profile, stored in this chat.\n"
-            "Respond ONLY with the information of experience, nothing more."
-        )
-        self._add_user_message(prompt)
-        experience_information: str = self._query()
-        self._add_assistant_message(f"Experience:{self._format_for_prompt(experience_information)}")
+        try:
+            response: requests.Response = self.__session.get(url, timeout=self.__timeout)
+        except requests.RequestException:
+            return None
+        return response.text if response.status_code == 200 else None
 
-    def __get_education_information(self) -> None:
-        """Extracts education information from the LinkedIn profile data stored in the chat history."""
-        prompt: str = (
-            "Extract the information about education from the LinkedIn profile, stored in this chat.\n"
-            "Respond ONLY with the information of education, nothing more."
-        )
-        self._add_user_message(prompt)
-        education_information: str = self._query()
-        self._add_assistant_message(f"Education:{self._format_for_prompt(education_information)}")
+    def __extract_section(self, name: str, page: Future, keyword: str | None, prompt_template: str) -> str:
+        """
+        Waits for the page of a section and extracts the section from its visible text, in isolated conversations.
+        Markup, scripts and page chrome never reach the prompt, and a section too long for the context is processed in chunks.
+        """
+        page_content: str | None = page.result()
+        if page_content is None:
+            return f"No {name.lower()} information available."
+        text: str = html_to_text(page_content, section=keyword)
+        if not text:
+            return f"No {name.lower()} information available."
+        return self._map_reduce(text, prompt_template, self.__COMBINE_PROMPT.replace("{name}", name.lower()))
 
     def ask(self, request: str) -> str:
         """Orchestrates the extraction of all relevant LinkedIn profile information and returns a summary."""
-        self.__get_general_information(request)
-        self.__get_education_information()
-        self.__get_experience_information()
-        self.__get_skills_information(request)
-        self.__get_certifications_information(request)
+        profile_url: str = request.rstrip("/")
+        with ThreadPoolExecutor(max_workers=len(self.__PAGES) + len(self.__SECTIONS), thread_name_prefix="linkedin") as executor:
+            pages: dict[str, Future] = {
+                page: executor.submit(self.__fetch_page, f"{profile_url}{suffix}") for page, suffix in self.__PAGES.items()
+            }
+            # each extraction starts as soon as its own page has arrived.
+            sections: list[tuple[str, Future]] = [
+                (name, executor.submit(self.__extract_section, name, pages[page], keyword, prompt_template))
+                for name, page, keyword, prompt_template in self.__SECTIONS
+            ]
+            extracted: str = "".join(f"{name}:{self._format_for_prompt(section.result())}" for name, section in sections)
 
-        prompt: str = f"Basing on the history in this chat, summarize the information in this profile."
+        prompt: str = f"Summarize the information in this LinkedIn profile:{extracted}"
         self._add_user_message(prompt)
         general_information = self._query()
         return general_information
@@ -114,10 +110,12 @@ class AIResumeGenerator(DeepSeekR1LocalConnector):
         ))
 
     def ask(self, request: str) -> str:
-        prompt: str = f"Generate a professional resume based on the following information:{self._format_for_prompt(request)}"
-        self._add_user_message(prompt)
+        self._add_user_message(self._build_prompt(request))
         return self._query()
 
+    def _build_prompt(self, request: str) -> str:
+        return f"Generate a professional resume based on the following information:{self._format_for_prompt(request)}"
+
 if __name__ == "__main__":
     crawler: LinkedInCrawler = LinkedInCrawler()
     info: str = crawler.ask("<put URL of LinkedIn profile here>")
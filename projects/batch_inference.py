@@ -0,0 +1,270 @@
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Container, Generic, Iterable, Iterator, NamedTuple, TextIO, TypeVar
+import httpx
+from ollama import ResponseError
+from request_scheduler import QueueFullError
+
+T = TypeVar("T")
+
+class BatchResult(NamedTuple, Generic[T]):
+    """The outcome of a single item of a batch."""
+    index: int
+    item: T
+    response: str | None
+    error: str | None
+    attempts: int
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Tells whether a failure may go away on a retry: the server failing or overloaded, the connection dropping or timing out,
+    or the queue of the scheduler being full. Anything else, e.g. a bad record or an empty response, fails the same way again.
+
+    Args:
+        error (BaseException): The error raised by the handler.
+
+    Returns:
+        bool: Whether the item is worth retrying.
+    """
+    if isinstance(error, ResponseError):
+        return error.status_code >= 500 or error.status_code == 429
+    # the Ollama client raises ConnectionError when the server cannot be reached.
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError, QueueFullError))
+
+def run_batch(items: Iterable[T],
+              handler: Callable[[T], str],
+              concurrency: int = 4,
+              ordered: bool = True,
+              retries: int = 2,
+              backoff: float = 1.0,
+              skip: Container[int] = (),
+              retry_on: Callable[[BaseException], bool] = is_transient) -> Iterator[BatchResult[T]]:
+    """
+    Runs `handler` over `items` with bounded concurrency, pulling items lazily so the input is never held in memory at once.
+
+    Args:
+        items (Iterable[T]): The items to process. Consumed lazily.
+        handler (Callable[[T], str]): Processes a single item. Must be safe to call from several threads.
+        concurrency (int): The maximum number of items processed at the same time.
+        ordered (bool): Whether results are yielded in input order. Unordered results are yielded as soon as they complete.
+        retries (int): How many times an item failing with a transient error is retried before its error is reported.
+        backoff (float): The delay before the first retry, in seconds. Doubles with every following retry.
+        skip (Container[int]): Indices of items to skip, e.g. the ones completed before a checkpoint.
+        retry_on (Callable[[BaseException], bool]): Tells the errors worth retrying. Other errors fail the item at once.
+
+    Yields:
+        BatchResult[T]: The result of each processed item. Failed items are reported with their error instead of raising.
+    """
+    if concurrency < 1:
+        raise ValueError("Concurrency must be at least 1.")
+
+    def attempt(index: int, item: T) -> BatchResult[T]:
+        for attempt_number in range(1, retries + 2):
+            try:
+                return BatchResult(index, item, handler(item), None, attempt_number)
+            except Exception as error:
+                if attempt_number > retries or not retry_on(error):
+                    return BatchResult(index, item, None, f"{type(error).__name__}: {error}", attempt_number)
+                time.sleep(backoff * 2 ** (attempt_number - 1))
+        raise AssertionError("unreachable")
+
+    pending_items = ((index, item) for index, item in enumerate(items) if index not in skip)
+    # ordered output waits for the oldest item, so a longer window keeps the workers busy meanwhile.
+    window = concurrency * 2 if ordered else concurrency
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+        in_flight: deque[Future[BatchResult[T]]] = deque()
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < window:
+                next_item = next(pending_items, None)
+                if next_item is None:
+                    exhausted = True
+                else:
+                    in_flight.append(executor.submit(attempt, *next_item))
+            if not in_flight:
+                return
+            if ordered:
+                yield in_flight.popleft().result()
+            else:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.remove(future)
+                    yield future.result()
+
+class BatchCheckpoint:
+    """
+    Append-only record of the completed item indices of a batch job, used to resume an interrupted job.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.__path = path
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def completed(self) -> set[int]:
+        """
+        Returns:
+            set[int]: The indices recorded as completed so far. Empty if the checkpoint does not exist yet.
+        """
+        if not os.path.exists(self.__path):
+            return set()
+        with open(self.__path, "r", encoding="utf-8") as checkpoint:
+            return {int(line) for line in checkpoint if line.strip()}
+
+    def open(self) -> TextIO:
+        return open(self.__path, "a", encoding="utf-8")
+
+    def reset(self) -> None:
+        """Forgets every completed index, e.g. when the output they were written to is gone."""
+        if os.path.exists(self.__path):
+            os.remove(self.__path)
+
+#region Command Line Interface
+TASKS: dict[str, tuple[str, str]] = {
+    "sentiment": ("sentiment-analysis.py", "DeepSeekR1SentimentAnalyzer"),
+    "ner": ("ner_extractor.py", "DeepSeekR1NERExtractor"),
+    "grammar": ("grammar_checker.py", "DeepSeekR1GrammarChecker"),
+    "summarize": ("summarizer.py", "DeepSeekR1Summarizer"),
+}
+
+def load_module(file_name: str):
+    """
+    Imports a module of this directory by its file name - some of them are not valid module names. Imported once per process.
+
+    Args:
+        file_name (str): The file name, e.g. "sentiment-analysis.py".
+
+    Returns:
+        ModuleType: The module.
+    """
+    module_name = os.path.splitext(file_name)[0].replace("-", "_")
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name)
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Cannot load {path}.")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
+
+def load_connector(task: str):
+    """
+    Imports the module of a task and constructs its connector.
+
+    Args:
+        task (str): One of the keys of TASKS.
+
+    Returns:
+        DeepSeekR1LocalConnector: The connector of the task.
+    """
+    file_name, class_name = TASKS[task]
+    return getattr(load_module(file_name), class_name)()
+
+def read_records(stream: TextIO, input_format: str, field: str = "text") -> Iterator[dict[str, str]]:
+    """
+    Args:
+        stream (TextIO): The input.
+        input_format (str): 'jsonl' or 'csv'.
+        field (str): The field JSONL lines that are not objects, e.g. a bare string, are wrapped in.
+
+    Yields:
+        dict[str, str]: The records of the input.
+    """
+    if input_format == "csv":
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                record = json.loads(line)
+                yield record if isinstance(record, dict) else {field: record}
+
+def detect_format(path: str, requested: str | None) -> str:
+    if requested:
+        return requested
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Runs a DeepSeek R1 task over a JSONL or CSV file, streaming records in and out.")
+    parser.add_argument("task", choices=sorted(TASKS))
+    parser.add_argument("input", help="Input file, JSONL or CSV. '-' reads JSONL from stdin.")
+    parser.add_argument("output", help="Output file, JSONL or CSV. Appended to when resuming.")
+    parser.add_argument("--field", default="text", help="The field of a record holding the text to process.")
+    parser.add_argument("--input-format", choices=["jsonl", "csv"])
+    parser.add_argument("--output-format", choices=["jsonl", "csv"])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--unordered", action="store_true", help="Write results as soon as they complete.")
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--checkpoint", help="Checkpoint file. Completed records listed in it are skipped, failed ones are retried.")
+    args = parser.parse_args(argv)
+
+    from ollama_client_pool import client_pool
+    if client_pool.max_in_flight < args.concurrency:
+        client_pool.configure(max_in_flight=args.concurrency)
+
+    connector = load_connector(args.task)
+    checkpoint = BatchCheckpoint(args.checkpoint) if args.checkpoint else None
+    completed = checkpoint.completed() if checkpoint else set()
+    if checkpoint and completed and not os.path.exists(args.output):
+        # the records of the completed indices are gone with the output, so they have to be processed again.
+        print(f"Warning: {args.output} does not exist, the checkpoint is ignored and the whole input processed.", file=sys.stderr)
+        checkpoint.reset()
+        completed = set()
+    input_format = detect_format(args.input, args.input_format)
+    output_format = detect_format(args.output, args.output_format)
+
+    source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8", newline="")
+    resuming = bool(completed)
+    failures = 0
+    with source, open(args.output, "a" if resuming else "w", encoding="utf-8", newline="") as sink, \
+            (checkpoint.open() if checkpoint else open(os.devnull, "w")) as checkpoint_sink:
+        csv_writer: csv.DictWriter | None = None
+        results = connector.ask_many(read_records(source, input_format, args.field),
+                                     key=lambda record: record[args.field],
+                                     concurrency=args.concurrency,
+                                     ordered=not args.unordered,
+                                     retries=args.retries,
+                                     skip=completed)
+        for result in results:
+            if not result.ok:
+                failures += 1
+                if checkpoint is not None:
+                    # left out of the output, as they are not in the checkpoint either: a resumed run retries them.
+                    print(f"Record {result.index} failed and will be retried on resume: {result.error}", file=sys.stderr)
+                    continue
+            row = {**result.item, "index": result.index, "response": result.response, "error": result.error}
+            if output_format == "csv":
+                if csv_writer is None:
+                    csv_writer = csv.DictWriter(sink, fieldnames=list(row), extrasaction="ignore")
+                    if not resuming:
+                        csv_writer.writeheader()
+                csv_writer.writerow(row)
+            else:
+                sink.write(json.dumps(row, ensure_ascii=False) + "\n")
+            sink.flush()
+            if result.ok:
+                checkpoint_sink.write(f"{result.index}\n")
+                checkpoint_sink.flush()
+    return 1 if failures else 0
+#endregion
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, NamedTuple
+import numpy as np
+from batch_inference import load_module
+from mock_ollama_server import MockOllamaServer
+from ollama_client_pool import client_pool
+from telemetry import RequestRecord, telemetry
+
+# connector name: (file, class, how a request is made from a text, its size in words, and the URL of the mock).
+CONNECTORS: dict[str, tuple[str, str, Callable[[str, int, str], str]]] = {
+    "sentiment": ("sentiment-analysis.py", "DeepSeekR1SentimentAnalyzer", lambda text, words, url: text),
+    "ner": ("ner_extractor.py", "DeepSeekR1NERExtractor", lambda text, words, url: text),
+    "grammar": ("grammar_checker.py", "DeepSeekR1GrammarChecker", lambda text, words, url: text),
+    "summarize": ("summarizer.py", "DeepSeekR1Summarizer", lambda text, words, url: text),
+    "text": ("text_generator.py", "DeepSeekR1TextGenerator", lambda text, words, url: text),
+    "email": ("ai-email-response-generator.py", "AIEmailResponseGenerator", lambda text, words, url: text),
+    "support": ("customer_support.py", "CustomerSupportBot", lambda text, words, url: text),
+    "assistant": ("personal-assistant.py", "PersonalAIAssistant", lambda text, words, url: text),
+    "resume": ("ai-resume-generator.py", "AIResumeGenerator", lambda text, words, url: text),
+    "linkedin": ("ai-resume-generator.py", "LinkedInCrawler", lambda text, words, url: f"{url}/in/{words}"),
+}
+# input size profile: words per request.
+SIZES: dict[str, int] = {"small": 30, "medium": 300, "large": 3000}
+
+class ScenarioResult(NamedTuple):
+    """The measurements of one connector at one input size and concurrency."""
+    connector: str
+    size: str
+    concurrency: int
+    requests: int
+    errors: int
+    model_calls: int
+    p50: float
+    p95: float
+    p99: float
+    throughput: float
+    overhead_p50: float
+    peak_memory_mb: float
+
+    @property
+    def key(self) -> str:
+        return f"{self.connector}/{self.size}/c{self.concurrency}"
+
+def make_text(words: int, seed: int) -> str:
+    """Builds a deterministic text of sentences and paragraphs, of the given number of words."""
+    generator = random.Random(seed)
+    vocabulary = MockOllamaServer.WORDS
+    sentences: list[str] = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, generator.randint(6, 18))
+        sentence = " ".join(generator.choice(vocabulary) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        remaining -= length
+    return "\n\n".join(" ".join(sentences[start:start + 5]) for start in range(0, len(sentences), 5))
+
+def run_scenario(name: str, size: str, concurrency: int, requests: int, mock_url: str) -> ScenarioResult:
+    """
+    Sends `requests` requests of one input size to a connector from `concurrency` threads, each with a connector of its own
+    (connectors keep a conversation, so an instance is not shared between concurrent users), and measures them.
+    """
+    file_name, class_name, make_request = CONNECTORS[name]
+    connector_class = getattr(load_module(file_name), class_name)
+    local = threading.local()
+    overheads: list[float] = []
+    calls = 0
+    calls_lock = threading.Lock()
+
+    def on_call(record: RequestRecord) -> None:
+        nonlocal calls
+        with calls_lock:
+            calls += 1
+            # time spent outside the model: client pool, HTTP, parsing and stripping.
+            overheads.append(max(record.latency_seconds - record.total_seconds, 0.0))
+
+    def send(index: int) -> tuple[float, bool]:
+        if not hasattr(local, "connector"):
+            local.connector = connector_class()
+        request = make_request(make_text(SIZES[size], index), SIZES[size], mock_url)
+        started = time.perf_counter()
+        try:
+            local.connector.ask(request)
+            return time.perf_counter() - started, True
+        except Exception as error:
+            print(f"{name}: request {index} failed: {error}", file=sys.stderr)
+            return time.perf_counter() - started, False
+
+    telemetry.add_hook(on_call)
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="benchmark") as executor:
+            outcomes = list(executor.map(send, range(requests)))
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        telemetry.remove_hook(on_call)
+    latencies = np.array([latency for latency, _ in outcomes])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return ScenarioResult(
+        connector=name,
+        size=size,
+        concurrency=concurrency,
+        requests=requests,
+        errors=sum(1 for _, ok in outcomes if not ok),
+        model_calls=calls,
+        p50=float(p50),
+        p95=float(p95),
+        p99=float(p99),
+        throughput=requests / elapsed,
+        overhead_p50=float(np.percentile(overheads, 50)) if overheads else 0.0,
+        peak_memory_mb=peak / 2 ** 20,
+    )
+
+def compare(results: list[ScenarioResult], baseline: dict[str, dict[str, Any]], tolerance: float) -> list[str]:
+    """
+    Compares results with a stored baseline.
+
+    Args:
+        results (list[ScenarioResult]): The results of this run.
+        baseline (dict[str, dict[str, Any]]): The stored results, by scenario key.
+        tolerance (float): The relative change tolerated before a change counts as a regression, e.g. 0.2 for 20%.
+
+    Returns:
+        list[str]: A description of every regression. Empty if there are none.
+    """
+    regressions: list[str] = []
+    for result in results:
+        stored = baseline.get(result.key)
+        if stored is None:
+            continue
+        for metric, higher_is_worse in (("p95", True), ("throughput", False), ("peak_memory_mb", True)):
+            current, previous = getattr(result, metric), stored[metric]
+            if previous <= 0:
+                continue
+            change = (current - previous) / previous
+            if (change > tolerance) if higher_is_worse else (change < -tolerance):
+                regressions.append(f"{result.key}: {metric} {previous:.3f} -> {current:.3f} ({change:+.0%})")
+        if result.errors > stored.get("errors", 0):
+            regressions.append(f"{result.key}: errors {stored.get('errors', 0)} -> {result.errors}")
+    return regressions
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Measures the connectors against a deterministic mock of the Ollama server.")
+    parser.add_argument("--connectors", nargs="+", choices=sorted(CONNECTORS), default=sorted(CONNECTORS))
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4])
+    parser.add_argument("--requests", type=int, default=16, help="Requests per scenario.")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Tokens per second generated by the mock.")
+    parser.add_argument("--ttft", type=float, default=0.05, help="Time to first token of the mock, in seconds.")
+    parser.add_argument("--think-tokens", type=int, default=32, help="Words of the <think> block of every response.")
+    parser.add_argument("--response-tokens", type=int, default=32, help="Words of the visible part of every response.")
+    parser.add_argument("--baseline", help="JSON file of stored results to compare with. Exits with 1 on a regression.")
+    parser.add_argument("--save-baseline", help="Stores the results of this run as a baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change tolerated before a regression is reported.")
+    args = parser.parse_args(argv)
+
+    results: list[ScenarioResult] = []
+    with MockOllamaServer(args.token_rate, args.ttft, args.think_tokens, args.response_tokens) as mock:
+        client_pool.configure(host=mock.url)
+        print(f"{'scenario':<28}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'req/s':>8}{'calls':>7}{'ovh ms':>8}{'mem MB':>8}{'err':>5}")
+        for name in args.connectors:
+            for size in args.sizes:
+                for concurrency in args.concurrency:
+                    result = run_scenario(name, size, concurrency, args.requests, mock.url)
+                    results.append(result)
+                    print(f"{result.key:<28}{result.p50:>8.3f}{result.p95:>8.3f}{result.p99:>8.3f}{result.throughput:>8.2f}"
+                          f"{result.model_calls:>7}{result.overhead_p50 * 1000:>8.2f}{result.peak_memory_mb:>8.2f}{result.errors:>5}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump({result.key: result._asdict() for result in results}, baseline_file, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
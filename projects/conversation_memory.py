@@ -0,0 +1,196 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable, Iterable, NamedTuple
+
+CHARS_PER_TOKEN: int = 4
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate used for context budgeting, when the real tokenizer is not available.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The approximate number of tokens in the text (roughly 4 characters per token for English prose).
+    """
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def count_characters(text: str) -> int:
+    """
+    Measures the text in characters, for character-based budgets.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The number of characters in the text.
+    """
+    return len(text or "")
+
+class ConversationTurn(NamedTuple):
+    """A single non-system message stored in the conversation, together with its measured size."""
+    role: str
+    content: str
+    size: int
+
+    def as_message(self) -> dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+class EvictionPolicy(ABC):
+    """
+    Decides which turns are dropped from a conversation when it exceeds its budget.
+    The system prompt is never passed to a policy - it is always pinned by the memory itself.
+    """
+
+    @abstractmethod
+    def evict(self, turns: deque[ConversationTurn], used: int, budget: int | None) -> int:
+        """
+        Drops turns from the left side of `turns` in place until the conversation fits the budget.
+
+        Args:
+            turns (deque[ConversationTurn]): The stored turns, oldest first.
+            used (int): The current total size of the stored turns.
+            budget (int | None): The size the turns must fit in, or None if unbounded.
+
+        Returns:
+            int: The total size of the turns remaining after eviction.
+        """
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+class SlidingWindowEviction(EvictionPolicy):
+    """
+    Keeps the most recent turns that fit the budget, dropping the oldest ones first.
+    The latest turn is always kept, even if it alone exceeds the budget, so the current request is never lost.
+    """
+
+    def evict(self, turns: deque[ConversationTurn], used: int, budget: int | None) -> int:
+        if budget is None or used <= budget:
+            return used
+        while len(turns) > 1 and used > budget:
+            used -= turns.popleft().size
+        # an assistant answer without the question that produced it only confuses the model.
+        while len(turns) > 1 and turns[0].role == "assistant":
+            used -= turns.popleft().size
+        return used
+
+class LastTurnsEviction(SlidingWindowEviction):
+    """Sliding window that additionally caps the number of retained turns."""
+
+    def __init__(self, max_turns: int) -> None:
+        if max_turns < 1:
+            raise ValueError("max_turns must be at least 1.")
+        self.__max_turns = max_turns
+
+    @property
+    def max_turns(self) -> int:
+        return self.__max_turns
+
+    def evict(self, turns: deque[ConversationTurn], used: int, budget: int | None) -> int:
+        if len(turns) <= self.__max_turns:
+            return super().evict(turns, used, budget)
+        while len(turns) > self.__max_turns:
+            used -= turns.popleft().size
+        while len(turns) > 1 and turns[0].role == "assistant":
+            used -= turns.popleft().size
+        return super().evict(turns, used, budget)
+
+class ConversationMemory:
+    """
+    Per-connector conversation store with a pinned system prompt and a bounded window of turns.
+
+    The budget is expressed in the units of `measure` - estimated tokens by default, or characters when
+    `count_characters` is passed. Every append is checked against the budget, so the memory never grows
+    past it, and the messages sent to the model stay bounded as well.
+    """
+    DEFAULT_MAX_TOKENS: int = 8192
+
+    def __init__(self,
+                 system_prompt: str = "",
+                 budget: int | None = DEFAULT_MAX_TOKENS,
+                 measure: Callable[[str], int] = estimate_tokens,
+                 eviction: EvictionPolicy | None = None) -> None:
+        if budget is not None and budget < 1:
+            raise ValueError("Budget must be a positive number or None.")
+        self.__system_prompt = system_prompt
+        self.__budget = budget
+        self.__measure = measure
+        self.__eviction = eviction or SlidingWindowEviction()
+        self.__turns: deque[ConversationTurn] = deque()
+        self.__used: int = 0
+
+    #region Properties
+    @property
+    def system_prompt(self) -> str:
+        return self.__system_prompt
+
+    @system_prompt.setter
+    def system_prompt(self, value: str) -> None:
+        self.__system_prompt = value or ""
+        self.__enforce_budget()
+
+    @property
+    def budget(self) -> int | None:
+        """The budget available to the turns, the system prompt excluded."""
+        if self.__budget is None:
+            return None
+        return max(self.__budget - self.__measure(self.__system_prompt), 1)
+
+    @property
+    def used(self) -> int:
+        """The total size of the stored turns, the system prompt excluded."""
+        return self.__used
+
+    @property
+    def eviction(self) -> EvictionPolicy:
+        return self.__eviction
+    #endregion
+
+    def append(self, role: str, content: str) -> None:
+        """
+        Appends a turn to the conversation and evicts older turns if the budget is exceeded.
+
+        Args:
+            role (str): The role of the message sender ('user' or 'assistant').
+            content (str): The content of the message.
+        """
+        turn = ConversationTurn(role, content, self.__measure(content))
+        self.__turns.append(turn)
+        self.__used += turn.size
+        self.__enforce_budget()
+
+    def extend(self, messages: Iterable[dict[str, str]]) -> None:
+        """
+        Appends several messages to the conversation. System messages are ignored, as the system prompt is pinned.
+
+        Args:
+            messages (Iterable[dict[str, str]]): Messages with 'role' and 'content' keys.
+        """
+        for message in messages:
+            role = str(message["role"]).lower().strip()
+            if role != "system":
+                self.append(role, message["content"])
+
+    def clear(self) -> None:
+        """Drops every turn, keeping only the system prompt."""
+        self.__turns.clear()
+        self.__used = 0
+
+    def messages(self) -> list[dict[str, str]]:
+        """
+        Returns the messages to send to the model: the system prompt followed by the retained turns.
+
+        Returns:
+            list[dict[str, str]]: The messages with roles and content.
+        """
+        messages = [{"role": "system", "content": self.__system_prompt}] if self.__system_prompt else []
+        messages.extend(turn.as_message() for turn in self.__turns)
+        return messages
+
+    def __len__(self) -> int:
+        return len(self.__turns)
+
+    def __enforce_budget(self) -> None:
+        self.__used = self.__eviction.evict(self.__turns, self.__used, self.budget)
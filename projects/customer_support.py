@@ -1,59 +1,138 @@
+from contextvars import ContextVar
+from enum import Enum
 from deepseek_connector import DeepSeekR1LocalConnector
+from generation_profile import GenerationProfile, label_schema, read_label
+from model_manager import model_manager
+from faq_knowledge_base import FAQKnowledgeBase
+from model_cascade import CascadeConfig, ConfidenceMethod
+from request_scheduler import Priority
+from session_manager import SessionManager
 import gradio as gr
+import json
+import os
+
+# the candidate categories shown in the prompt of the current request. A context variable, as concurrent requests may share a bot.
+_shown_candidates: ContextVar[list[str] | None] = ContextVar("shown_candidates", default=None)
 
 class CustomerSupportBot(DeepSeekR1LocalConnector):
-    __FAQ_DATABASE: dict[str, str] = {
-        "return_policy": "Our return policy allows you to return items within 30 days of purchase for a full refund.",
-        "shipping_info": "We offer free shipping on orders over $50. Standard shipping takes 5-7 business days.",
-        "product_warranty": "All our products come with a one-year warranty covering manufacturing defects.",
-        "customer_service_hours": "Our customer service is available Monday to Friday from 9 AM to 5 PM EST.",
-        "payment_methods": "We accept all major credit cards, PayPal, and Apple Pay.",
-        "technical_support": "For technical support, please visit our help center or contact us via email at support@example.com",
-        "account_management": "You can manage your account settings, including password changes and email preferences, in the account section of our website.",
-        "privacy_policy": "We take your privacy seriously. Please read our privacy policy on our website for more information.",
-        "product_availability": "You can check product availability on our website. If an item is out of stock, you can sign up for restock notifications.",
-    }
-
-    def __init__(self):
-        categories = "\n".join(self.__FAQ_DATABASE.keys())
-        examples = (
-            '"""\n'
-            'Example 1:\n'
-            'Question: What is your return policy?\n'
-            'Matching category: return_policy\n\n'
-            'Example 2:\n'
-            'Question: What are your customer service hours?\n'
-            'Matching category: customer_service_hours\n\n'
-            'Example 3:\n'
-            'Question: How can I manage my account settings?\n'
-            'Matching category: account_management\n\n'
-            'Example 4:\n'
-            'Question: could you please tell me about shipping?\n'
-            'Matching category: shipping_info\n'
-            '"""'
-        )
+    MODEL_ID: str = "deepseek-r1:1.5b"
+    # a chat user waits for the answer: better to say the service is busy than to leave them waiting for a minute.
+    PRIORITY: Priority = Priority.INTERACTIVE
+    DEADLINE_SECONDS: float | None = 15.0
+    # the 8b model is only asked when the 1.5b one answers with something that is not a category of the FAQ.
+    CASCADE: CascadeConfig | None = CascadeConfig(small_model=MODEL_ID, method=ConfidenceMethod.LABEL)
+    DEFAULT_FAQ_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "faq.json")
+    NO_ANSWER: str = "Sorry, I can't assist with that."
+    # the label the model answers with when none of the categories fits.
+    NO_CATEGORY: str = "none"
+    # the answer is a single category: no reasoning, a few tokens of JSON restricted to the candidates, see `_response_format`.
+    GENERATION_PROFILE: GenerationProfile = GenerationProfile(num_predict=24, temperature=0.0, think=False)
+    # candidate categories, question, and matching category - sent as conversation turns after the system prompt.
+    FEW_SHOT_EXAMPLES: list[tuple[list[str], str, str]] = [
+        (["return_policy", "shipping_info", "product_warranty"], "What is your return policy?", "return_policy"),
+        (["customer_service_hours", "technical_support"], "What are your customer service hours?", "customer_service_hours"),
+        (["privacy_policy", "account_management"], "How can I manage my account settings?", "account_management"),
+        (["product_availability", "shipping_info", "payment_methods"], "could you please tell me about shipping?", "shipping_info"),
+    ]
+
+    def __init__(self, faq_path: str = DEFAULT_FAQ_PATH, top_k: int = FAQKnowledgeBase.DEFAULT_TOP_K):
+        """
+        Args:
+            faq_path (str): The FAQ file, JSON, CSV or SQLite. Reloaded automatically when it changes.
+                Indexed once per process, bots of the same file share its knowledge base.
+            top_k (int): The number of candidate categories injected into the prompt of a question.
+        """
+        self.__knowledge_base = FAQKnowledgeBase.shared(faq_path, top_k=top_k)
+        # the categories are not listed here - only the candidates of each question are, so the prompt does not grow with the FAQ.
         system_behavior = (
             "You are a customer support agent. You will find a most appropriate category present currently in the FAQ database. "
-            "Categories of questions include strictly the following:\n"
-            f"{categories}\n"
+            "Each question comes with the candidate categories of the FAQ database, and you will choose strictly one of them.\n"
             "You will respond only with the most appropriate category, nothing more.\n"
-            "Here are some examples of response:\n"
-            f"{examples}"
+            "Follow the examples of questions and responses that precede the request."
         )
-        super().__init__(model_id="deepseek-r1:1.5b", system_behavior=system_behavior)
+        super().__init__(model_id=self.MODEL_ID, system_behavior=system_behavior, stateless=True)
+
+    @property
+    def _knowledge_base(self) -> FAQKnowledgeBase:
+        return self.__knowledge_base
+
+    @property
+    def _few_shot_examples(self) -> list[tuple[str, str]]:
+        return [(self.__format_question(candidates, question), self.__format_category(category))
+                for candidates, question, category in self.FEW_SHOT_EXAMPLES]
+
+    @property
+    def _response_format(self) -> dict:
+        # restricted to the candidates shown in the prompt of the request, so the schema does not grow with the FAQ.
+        candidates = _shown_candidates.get()
+        return label_schema([*(candidates if candidates is not None else self.__knowledge_base.categories), self.NO_CATEGORY], key="category")
+
+    def classify(self, question: str) -> Enum | None:
+        """
+        Args:
+            question (str): The question of the user.
+
+        Returns:
+            Enum | None: The category of the question, a member of `FAQKnowledgeBase.category_type`, or None if none fits.
+        """
+        match = self.__knowledge_base.route(question)
+        if match is not None and match.confident:
+            return self.__knowledge_base.category_type(match.category)
+        self._add_user_message(self._build_prompt(question))
+        category = self.__category_of(self._query())
+        return self.__knowledge_base.category_type(category) if category is not None else None
 
     def ask(self, request: str) -> str:
-        prompt = (
-            f"Question: {request}\n"
+        local_answer = self._answer_without_model(request)
+        if local_answer is not None:
+            return local_answer
+        self._add_user_message(self._build_prompt(request))
+        return self._parse_response(self._query())
+
+    def _answer_without_model(self, request: str) -> str | None:
+        match = self.__knowledge_base.route(request)
+        return self.__knowledge_base.answer(match.category) if match is not None and match.confident else None
+
+    def _build_prompt(self, request: str) -> str:
+        candidates = self.__knowledge_base.candidates(request)
+        _shown_candidates.set(candidates)
+        return self.__format_question(candidates, request)
+
+    @staticmethod
+    def __format_category(category: str) -> str:
+        # the examples answer in the format of the responses, so they do not teach the model a different one.
+        return json.dumps({"category": category})
+
+    @staticmethod
+    def __format_question(candidates: list[str], question: str) -> str:
+        candidate_lines = "\n".join(candidates)
+        return (
+            f"Candidate categories:\n{candidate_lines}\n"
+            f"Question: {question}\n"
             "Matching category: "
         )
-        self._add_user_message(prompt)
-        category_of_question: str = self._query().strip().lower()
-        return self.__FAQ_DATABASE.get(category_of_question, "Sorry, I can't assist with that.")
 
+    def _is_valid_response(self, response: str) -> bool:
+        # a small model giving up on the question is worth escalating too.
+        return self.__category_of(response) is not None
+
+    def __category_of(self, response: str) -> str | None:
+        label = read_label(response, "category")
+        if not label or label == self.NO_CATEGORY:
+            return None
+        # the candidates the model was shown come first, the rest of the FAQ only if the output names none of them.
+        return self.__knowledge_base.snap(label, candidates=_shown_candidates.get())
 
-def customer_support_interface():
-    chatbot = CustomerSupportBot()
+    def _parse_response(self, response: str) -> str:
+        category_of_question: str | None = self.__category_of(response)
+        if category_of_question is None:
+            return self.NO_ANSWER
+        return self.__knowledge_base.answer(category_of_question) or self.NO_ANSWER
+
+
+def customer_support_interface() -> gr.Blocks:
+    """Builds the UI of the customer support chatbot. The connector is stateless, so every session shares one."""
+    chatbot_sessions: SessionManager[CustomerSupportBot] = SessionManager(CustomerSupportBot, shared=True)
     with gr.Blocks() as demo:
         gr.Markdown("## Customer Support Chatbot")
         with gr.Row():
@@ -63,9 +142,11 @@ def customer_support_interface():
             with gr.Column():
                 chatbot_output = gr.Markdown("")
 
-        submit_btn.click(fn=chatbot.ask, inputs=user_input, outputs=chatbot_output)
+        submit_btn.click(fn=chatbot_sessions.handler("ask_async"), inputs=user_input, outputs=chatbot_output)
 
-    demo.launch()
+    return chatbot_sessions.attach(demo)
 
 if __name__ == "__main__":
-    customer_support_interface()
+    demo = customer_support_interface()
+    model_manager.preload()
+    demo.launch()
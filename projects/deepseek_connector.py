@@ -1,6 +1,28 @@
 from abc import ABC, abstractmethod
-from ollama import chat, ChatResponse
-import re
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Container, Iterable, Iterator, TypeVar
+from ollama import ChatResponse
+import asyncio
+import itertools
+import time
+from batch_inference import BatchResult, run_batch
+from conversation_memory import ConversationMemory, estimate_tokens
+from document_preprocessing import iter_chunks
+from generation_profile import GenerationProfile
+from model_cascade import CascadeConfig, ConfidenceMethod, cascade_stats, score
+from model_manager import model_manager
+from ollama_client_pool import client_pool
+from prompt_layout import PromptPrefix, estimate_message_tokens, estimate_prompt_tokens, prompt_eval_stats
+from reasoning_filter import ThinkBlockFilter
+from request_scheduler import Priority, effective_priority, priority, request_scheduler
+from response_cache import ResponseCache
+from telemetry import telemetry
+
+# the turns of the current request of every stateless connector. A context variable, so concurrent requests - e.g. of
+# several sessions - can share a stateless connector. Replaced rather than mutated, as copied contexts share the value.
+_request_turns: ContextVar["dict[DeepSeekR1LocalConnector, list[dict[str, str]]]"] = ContextVar("request_turns", default={})
+
+T = TypeVar("T")
 
 class DeepSeekR1LocalConnector(ABC):
     """
@@ -19,20 +41,62 @@ class DeepSeekR1LocalConnector(ABC):
     @_system_behavior.setter
     def _system_behavior(self, value: str):
         self.__system_behavior = value
+
+    __prompt_prefix: PromptPrefix | None = None
+
+    @property
+    def _few_shot_examples(self) -> list[tuple[str, str]]:
+        """
+        Returns the few-shot examples of the task, as (user prompt, assistant response) pairs in the format of real requests.
+        They are sent as conversation turns right after the system prompt. None by default.
+        """
+        return []
+
+    @property
+    def _prompt_prefix(self) -> PromptPrefix:
+        """
+        Returns the byte-stable beginning of every request: the system prompt and the few-shot examples.
+        It is built once and only rebuilt if the system behavior changes, so the server can reuse its evaluation across requests.
+        """
+        if self.__prompt_prefix is None or self.__prompt_prefix.system_prompt != self._system_behavior:
+            self.__prompt_prefix = PromptPrefix(self._system_behavior, self._few_shot_examples)
+        return self.__prompt_prefix
     
     #endregion
 
     #region Chat History
-    __chat_history: list[dict[str, str]] = []
+    __memory: ConversationMemory
+    __stateless: bool = False
+    __response_cache: ResponseCache | None = None
+
+    @property
+    def _memory(self) -> ConversationMemory:
+        """
+        Returns the conversation memory of this connector.
+        Returns:
+            ConversationMemory: The per-instance store of the system prompt and the retained turns.
+        """
+        return self.__memory
+
+    @property
+    def _stateless(self) -> bool:
+        """
+        Returns whether the connector is stateless.
+        Stateless connectors send only the system prompt and the current message, and keep no turns between requests.
+        The turns of a request are kept in the context of the request, so a stateless connector can serve concurrent requests.
+        """
+        return self.__stateless
 
     @property
     def _chat_history(self) -> list[dict[str, str]]:
         """
-        Returns the chat history.
+        Returns the chat history, starting with the prompt prefix. Turns are only ever appended after it.
         Returns:
             list[dict[str, str]]: The chat history containing messages with roles and content.
         """
-        return self.__chat_history
+        if self.__stateless:
+            return self._prompt_prefix.messages() + _request_turns.get().get(self, [])
+        return self._prompt_prefix.messages() + [message for message in self.__memory.messages() if message["role"] != "system"]
 
     @_chat_history.setter
     def _chat_history(self, value: list[dict[str, str]]):
@@ -41,11 +105,25 @@ class DeepSeekR1LocalConnector(ABC):
         Args:
             value (list[dict[str, str]]): The new chat history to set.
         """
-        # remove the system behavior from value if it exists.
-        if any(str(msg['role']).lower() == 'system' for msg in value):
-            value = [msg for msg in value if str(msg['role'].lower()) != 'system']
-        
-        self.__chat_history.extend(value)
+        # the system behavior is pinned by the memory, so system messages in value are skipped.
+        self.__memory.extend(value)
+
+    def export_history(self) -> list[dict[str, str]]:
+        """
+        Returns the retained turns of the conversation, without the prompt prefix, e.g. to store an idle session.
+        Returns:
+            list[dict[str, str]]: The user and assistant messages, oldest first.
+        """
+        return [message for message in self.__memory.messages() if message["role"] != "system"]
+
+    def restore_history(self, messages: Iterable[dict[str, str]]) -> None:
+        """
+        Replaces the retained turns of the conversation, e.g. with the ones of a stored session.
+        Args:
+            messages (Iterable[dict[str, str]]): The user and assistant messages, oldest first. System messages are skipped.
+        """
+        self.__memory.clear()
+        self.__memory.extend(messages)
 
     def _add_to_chat_history(self, role: str, content: str) -> None:
         """
@@ -58,7 +136,13 @@ class DeepSeekR1LocalConnector(ABC):
         if role not in ["system", "user", "assistant"]:
             raise ValueError("Role must be one of 'system', 'user', or 'assistant'.")
 
-        self.__chat_history.append({"role": role, "content": content})
+        if role == "system":
+            self.__memory.system_prompt = content
+        elif self.__stateless:
+            turns = _request_turns.get()
+            _request_turns.set({**turns, self: [*turns.get(self, []), {"role": role, "content": content}]})
+        else:
+            self.__memory.append(role, content)
 
     def _add_user_message(self, content: str) -> str:
         """
@@ -70,6 +154,8 @@ class DeepSeekR1LocalConnector(ABC):
         Returns:
             str: The same content that was added.
         """
+        if self.__stateless:
+            self.__end_request()
         self._add_to_chat_history("user", content)
         return content
 
@@ -90,6 +176,12 @@ class DeepSeekR1LocalConnector(ABC):
         self._add_to_chat_history("assistant", content)
         return content
 
+    def __end_request(self) -> None:
+        """Drops the turns of the current request of a stateless connector."""
+        turns = _request_turns.get()
+        if self in turns:
+            _request_turns.set({connector: messages for connector, messages in turns.items() if connector is not self})
+
     def __strip_special_characters(self, content: str) -> str:
         """
         Strips special characters from the content, specifically the <think> tags used by DeepSeek R1.
@@ -101,8 +193,12 @@ class DeepSeekR1LocalConnector(ABC):
             str: The cleaned content without special characters.
         """
         # as per 8th of June, 2025 - the DeepSeek R1 still returns the reasoning process in the response, enclosed in <think></think> pair of tags.
-        # For now we need explicitly strip them out.
-        return re.sub(r'<think>\s+(?:\w|\W)*?\s+</think>', '', content, flags=re.IGNORECASE | re.MULTILINE).strip()
+        # For now we need explicitly strip them out - in a single pass, as reasoning traces run to thousands of tokens.
+        started = time.perf_counter()
+        think_filter = ThinkBlockFilter()
+        stripped = (think_filter.feed(content) + think_filter.flush()).strip()
+        telemetry.observe_strip(type(self).__name__, self._model_id, time.perf_counter() - started, think_filter.reasoning_length)
+        return stripped
 
     #endregion
 
@@ -115,6 +211,19 @@ class DeepSeekR1LocalConnector(ABC):
     __model_id: str = MODEL_ID
     NEWLINE_SEPARATOR: str = "\n\n"
     NEWLINE_SYNTACTIC_SEPARATOR_FOR_PROMPT: str = "\n\"\"\"\n"
+    # the context window of the model, registered with the model manager and sent with every request, and assumed for
+    # document chunking - together with the part of it kept free for the response and the prompt wording.
+    CONTEXT_TOKENS: int = 4096
+    RESPONSE_TOKENS: int = 1024
+    PROMPT_OVERHEAD_TOKENS: int = 128
+    CHUNK_OVERLAP_TOKENS: int = 64
+    # the scheduling class of the requests of the connector, and how long they may wait for a slot of the model before being rejected.
+    PRIORITY: Priority = Priority.STANDARD
+    DEADLINE_SECONDS: float | None = None
+    # answers with a small model first and escalates to a larger one when unsure. Every request goes to `_model_id` if None.
+    CASCADE: CascadeConfig | None = None
+    # the generation settings of the task. The server defaults apply to whatever the profile leaves unset.
+    GENERATION_PROFILE: GenerationProfile = GenerationProfile()
     #endregion
 
     @property
@@ -125,12 +234,88 @@ class DeepSeekR1LocalConnector(ABC):
     def _model_id(self, value: str):
         cleaned = (value or "").strip()
         self.__model_id = cleaned or self.MODEL_ID
+        model_manager.register(self.__model_id, self.CONTEXT_TOKENS)
+
+    @classmethod
+    def models(cls, model_id: str | None = None) -> list[str]:
+        """
+        Returns the models the requests of the connector go to: its own, followed by the ones of its cascade.
+
+        Args:
+            model_id (str | None): The model of the connector. `MODEL_ID` if None.
+        """
+        model_ids = [model_id or cls.MODEL_ID]
+        if cls.CASCADE is not None:
+            model_ids += [cls.CASCADE.small_model, cls.CASCADE.large_model]
+        return list(dict.fromkeys(model_ids))
+
+    @property
+    def _context_window(self) -> int:
+        """
+        Returns the context window the requests of the connector are sent with, in tokens: the one the model manager holds
+        for its models, the smallest of them with a cascade. `CONTEXT_TOKENS` for a model the manager has no window for.
+        """
+        return min(model_manager.context_window(model_id) or self.CONTEXT_TOKENS for model_id in self.models(self._model_id))
+
+    @property
+    def _memory_budget(self) -> int:
+        """
+        Returns the budget of the default conversation memory, system prompt included: the context window without the
+        response, the wording of the prompt and the few-shot examples, so a full conversation still fits the window.
+        """
+        examples = self._prompt_prefix.tokens - (estimate_message_tokens(self._system_behavior) if self._system_behavior else 0)
+        return max(self._context_window - self.RESPONSE_TOKENS - self.PROMPT_OVERHEAD_TOKENS - examples, 1)
+
+    @property
+    def _generation_profile(self) -> GenerationProfile:
+        return self.GENERATION_PROFILE
+
+    @property
+    def _generation_options(self) -> dict[str, object]:
+        """
+        Returns the Ollama generation options sent with every request, those of the generation profile.
+        Empty by default, leaving the server defaults in place.
+        """
+        return self._generation_profile.options()
+
+    @property
+    def _response_format(self) -> str | dict | None:
+        """
+        Returns the format the output of requests without one of their own is constrained to. Free text if None.
+        """
+        return self._generation_profile.response_format
+
+    @property
+    def _response_cache(self) -> ResponseCache | None:
+        return self.__response_cache
 
-    def __init__(self, system_behavior: str = "", model_id: str = MODEL_ID) -> None:
+    @_response_cache.setter
+    def _response_cache(self, value: ResponseCache | None):
+        self.__response_cache = value
+
+    def __init__(self,
+                 system_behavior: str = "",
+                 model_id: str = MODEL_ID,
+                 memory: ConversationMemory | None = None,
+                 stateless: bool = False,
+                 response_cache: ResponseCache | None = None) -> None:
+        """
+        Args:
+            system_behavior (str): The system prompt. The class default is used if empty.
+            model_id (str): The Ollama model to query.
+            memory (ConversationMemory | None): The conversation store to use. If None, a new one sized by `_memory_budget`.
+            stateless (bool): Whether each request should be sent with the system prompt only, without previous turns.
+            response_cache (ResponseCache | None): The cache of responses to consult before querying the model. Disabled if None.
+        """
         # no need to set the system behavior if it is not provided. Default one will do fine, as set in the class variable.
         self._model_id = model_id
+        for cascade_model_id in self.models(self._model_id)[1:]:
+            model_manager.register(cascade_model_id, self.CONTEXT_TOKENS)
         if system_behavior:
             self._system_behavior = system_behavior
+        self.__memory = memory if memory is not None else ConversationMemory(budget=self._memory_budget, measure=estimate_message_tokens)
+        self.__stateless = stateless
+        self.__response_cache = response_cache
         self._add_to_chat_history("system", self._system_behavior)
 
     @abstractmethod
@@ -146,12 +331,644 @@ class DeepSeekR1LocalConnector(ABC):
         """
         raise NotImplementedError("This method should be implemented by subclasses.")
 
+    def _build_prompt(self, request: str) -> str:
+        """
+        Builds the user prompt for a single request. Subclasses that answer a request with a single prompt
+        override it, and gain the streaming variant of `ask` for free.
+
+        Args:
+            request (str): The request of the user.
+
+        Returns:
+            str: The prompt to send to the LLM.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not build single-prompt requests.")
+
+    def _answer_without_model(self, request: str) -> str | None:
+        """
+        Gives subclasses a chance to answer a request locally, before any prompt is sent to the LLM.
+
+        Args:
+            request (str): The request of the user.
+
+        Returns:
+            str | None: The answer, or None if the request has to go to the LLM.
+        """
+        return None
+
+    def _is_long(self, request: str, isolated: bool = False) -> bool:
+        """
+        Tells whether a request is too long to be sent as a single prompt, and has to be answered by `_answer_long` instead.
+
+        Args:
+            request (str): The request of the user.
+            isolated (bool): Whether the request is sent without the chat history, as the ones of `ask_many` are.
+
+        Returns:
+            bool: Whether the request is too long. Never, by default.
+        """
+        return False
+
+    def _answer_long(self, request: str) -> str:
+        """
+        Answers a request too long for a single prompt, e.g. by map-reduce over its parts. Blocking, and safe to run in a
+        worker thread.
+
+        Args:
+            request (str): The request of the user, one `_is_long` holds too long.
+
+        Returns:
+            str: The answer.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not answer requests longer than a single prompt.")
+
+    def _parse_response(self, response: str) -> str:
+        """
+        Turns the cleaned response of the LLM into the answer returned to the user. Identity by default.
+
+        Args:
+            response (str): The response of the LLM, without the reasoning.
+
+        Returns:
+            str: The answer to return.
+        """
+        return response
+
+    def _is_valid_response(self, response: str) -> bool:
+        """
+        Tells whether a response is one the task accepts, e.g. one of its labels. The cascade escalates invalid responses.
+
+        Args:
+            response (str): The response of the model, without its reasoning.
+
+        Returns:
+            bool: Whether the response is acceptable. Any non-empty response is, by default.
+        """
+        return bool(response.strip())
+
+    def ask_stream(self, request: str) -> Iterator[str]:
+        """
+        Sends a request to the LLM and streams the response, with the reasoning of the model left out.
+        Suitable as a Gradio generator handler.
+
+        Args:
+            request (str): The message to send to the LLM.
+
+        Yields:
+            str: The visible response accumulated so far.
+        """
+        local_answer = self._answer_without_model(request)
+        if local_answer is not None:
+            yield local_answer
+            return
+        if self._is_long(request):
+            yield self._answer_long(request)
+            return
+        self._add_user_message(self._build_prompt(request))
+        yield from self._accumulate(self._query_stream())
+
+    async def ask_async(self, request: str) -> str:
+        """
+        Asynchronous variant of `ask`, that does not hold a thread while the model generates the response.
+        Subclasses that do not build single-prompt requests fall back to running `ask` in a worker thread.
+
+        Args:
+            request (str): The message to send to the LLM.
+
+        Returns:
+            str: The response from the LLM.
+        """
+        if not self.__builds_single_prompt():
+            return await asyncio.to_thread(self.ask, request)
+        local_answer = self._answer_without_model(request)
+        if local_answer is not None:
+            return local_answer
+        if self._is_long(request):
+            return await asyncio.to_thread(self._answer_long, request)
+        self._add_user_message(self._build_prompt(request))
+        return self._parse_response(await self._query_async())
+
+    async def ask_stream_async(self, request: str) -> AsyncIterator[str]:
+        """
+        Asynchronous variant of `ask_stream`. Suitable as a Gradio async generator handler.
+
+        Args:
+            request (str): The message to send to the LLM.
+
+        Yields:
+            str: The visible response accumulated so far.
+        """
+        if not self.__builds_single_prompt():
+            yield await asyncio.to_thread(self.ask, request)
+            return
+        local_answer = self._answer_without_model(request)
+        if local_answer is not None:
+            yield local_answer
+            return
+        if self._is_long(request):
+            yield await asyncio.to_thread(self._answer_long, request)
+            return
+        self._add_user_message(self._build_prompt(request))
+        async for text in self._accumulate_async(self._query_stream_async()):
+            yield text
+
+    def ask_many(self,
+                 requests: Iterable[T],
+                 key: Callable[[T], str] | None = None,
+                 concurrency: int = 4,
+                 ordered: bool = True,
+                 retries: int = 2,
+                 skip: Container[int] = ()) -> Iterator[BatchResult[T]]:
+        """
+        Answers many independent requests with bounded concurrency.
+        Each request is sent in a conversation of its own, so the chat history of the connector is neither used nor changed.
+
+        Args:
+            requests (Iterable[T]): The requests, or records holding them. Consumed lazily.
+            key (Callable[[T], str] | None): Extracts the request from a record. The records are the requests themselves if None.
+            concurrency (int): The maximum number of requests sent at the same time.
+            ordered (bool): Whether results are yielded in input order.
+            retries (int): How many times a request failing with a transient error is retried, see `is_transient`.
+            skip (Container[int]): Indices of requests to skip, e.g. the ones completed before a checkpoint.
+
+        Returns:
+            Iterator[BatchResult[T]]: The results, with the original record and its index.
+        """
+        if not self.__builds_single_prompt():
+            raise NotImplementedError(f"{type(self).__name__} does not build single-prompt requests.")
+        extract: Callable[[T], str] = key or (lambda request: request)  # type: ignore[assignment, return-value]
+
+        def answer(record: T) -> str:
+            request = extract(record)
+            # a batch only gets the capacity interactive requests leave over.
+            with priority(Priority.BULK):
+                local_answer = self._answer_without_model(request)
+                if local_answer is not None:
+                    return local_answer
+                if self._is_long(request, isolated=True):
+                    return self._answer_long(request)
+                return self._complete(self._build_prompt(request))
+
+        return run_batch(requests,
+                         answer,
+                         concurrency=concurrency,
+                         ordered=ordered,
+                         retries=retries,
+                         skip=skip)
+
+    def __builds_single_prompt(self) -> bool:
+        return type(self)._build_prompt is not DeepSeekR1LocalConnector._build_prompt
+
+    #region Model Calls
+    def _chat(self,
+              messages: list[dict[str, str]],
+              response_format: str | dict | None = None,
+              model_id: str | None = None,
+              options: dict[str, object] | None = None,
+              logprobs: bool = False,
+              prefix: PromptPrefix | None = None) -> ChatResponse:
+        """
+        Sends the messages to the model through the shared client pool.
+
+        Args:
+            messages (list[dict[str, str]]): The messages to send.
+            response_format (str | dict | None): Constrains the output to "json" or to a JSON schema. Free text if None.
+            model_id (str | None): The model to query. `_model_id` if None.
+            options (dict[str, object] | None): The generation options. `_generation_options` if None.
+            logprobs (bool): Whether the server should return the log-probabilities of the generated tokens.
+            prefix (PromptPrefix | None): The prefix the messages start with, for the prompt evaluation stats. `_prompt_prefix` if None.
+
+        Returns:
+            ChatResponse: The complete response of the model.
+        """
+        model_id = model_id or self._model_id
+        with telemetry.track(type(self).__name__, model_id) as call:
+            with request_scheduler.slot(model_id, *self.__schedule()), client_pool.slot():
+                call.dispatched()
+                response = client_pool.sync_client().chat(model=model_id,
+                                                          messages=messages,
+                                                          stream=False,
+                                                          format=response_format,
+                                                          think=self._generation_profile.think,
+                                                          logprobs=logprobs or None,
+                                                          options=self.__request_options(model_id, options),
+                                                          keep_alive=model_manager.keep_alive)
+            call.completed(response)
+        self.__observe(messages, response, model_id, prefix)
+        return response
+
+    def _chat_stream(self, messages: list[dict[str, str]]) -> Iterator[ChatResponse]:
+        """
+        Sends the messages to the model through the shared client pool and streams the response.
+
+        Args:
+            messages (list[dict[str, str]]): The messages to send.
+
+        Yields:
+            ChatResponse: The parts of the response, as they are generated.
+        """
+        with telemetry.track(type(self).__name__, self._model_id, stream=True) as call:
+            with request_scheduler.slot(self._model_id, *self.__schedule()), client_pool.slot():
+                call.dispatched()
+                for part in client_pool.sync_client().chat(model=self._model_id,
+                                                           messages=messages,
+                                                           stream=True,
+                                                           format=self._response_format,
+                                                           think=self._generation_profile.think,
+                                                           options=self.__request_options(self._model_id),
+                                                           keep_alive=model_manager.keep_alive):
+                    if part.done:
+                        call.completed(part)
+                        self.__observe(messages, part, self._model_id)
+                    yield part
+
+    async def _chat_async(self,
+                          messages: list[dict[str, str]],
+                          response_format: str | dict | None = None,
+                          model_id: str | None = None,
+                          options: dict[str, object] | None = None,
+                          logprobs: bool = False,
+                          prefix: PromptPrefix | None = None) -> ChatResponse:
+        """
+        Asynchronous variant of `_chat`.
+        """
+        model_id = model_id or self._model_id
+        with telemetry.track(type(self).__name__, model_id) as call:
+            async with request_scheduler.async_slot(model_id, *self.__schedule()), client_pool.async_slot():
+                call.dispatched()
+                response = await client_pool.async_client().chat(model=model_id,
+                                                                 messages=messages,
+                                                                 stream=False,
+                                                                 format=response_format,
+                                                                 think=self._generation_profile.think,
+                                                                 logprobs=logprobs or None,
+                                                                 options=self.__request_options(model_id, options),
+                                                                 keep_alive=model_manager.keep_alive)
+            call.completed(response)
+        self.__observe(messages, response, model_id, prefix)
+        return response
+
+    async def _chat_stream_async(self, messages: list[dict[str, str]]) -> AsyncIterator[ChatResponse]:
+        """
+        Asynchronous variant of `_chat_stream`.
+        """
+        with telemetry.track(type(self).__name__, self._model_id, stream=True) as call:
+            async with request_scheduler.async_slot(self._model_id, *self.__schedule()), client_pool.async_slot():
+                call.dispatched()
+                async for part in await client_pool.async_client().chat(model=self._model_id,
+                                                                        messages=messages,
+                                                                        stream=True,
+                                                                        format=self._response_format,
+                                                                        think=self._generation_profile.think,
+                                                                        options=self.__request_options(self._model_id),
+                                                                        keep_alive=model_manager.keep_alive):
+                    if part.done:
+                        call.completed(part)
+                        self.__observe(messages, part, self._model_id)
+                    yield part
+
+    def __schedule(self) -> tuple[Priority, float | None]:
+        """Returns the priority class and the deadline of a request about to be queued for the model."""
+        deadline = time.monotonic() + self.DEADLINE_SECONDS if self.DEADLINE_SECONDS is not None else None
+        return effective_priority(self.PRIORITY), deadline
+
+    def __request_options(self, model_id: str, options: dict[str, object] | None = None) -> dict[str, object] | None:
+        """Returns the generation options of a request, `_generation_options` by default, with the context window of the model."""
+        options = dict(self._generation_options if options is None else options)
+        num_ctx = model_manager.context_window(model_id)
+        if num_ctx is not None:
+            options.setdefault("num_ctx", num_ctx)
+        return options or None
+
+    def _generate(self,
+                  messages: list[dict[str, str]],
+                  response_format: str | dict | None = None,
+                  prefix: PromptPrefix | None = None) -> str | None:
+        """
+        Answers the messages through the cascade of the connector, or with `_model_id` alone if it has none.
+        The small model answers first, and the large one is only queried when the answers of the small one score under
+        the confidence threshold. Streamed requests always go to `_model_id`, as a stream cannot be taken back.
+
+        Args:
+            messages (list[dict[str, str]]): The messages to send.
+            response_format (str | dict | None): Constrains the output to "json" or to a JSON schema. Free text if None.
+            prefix (PromptPrefix | None): The prefix the messages start with. `_prompt_prefix` if None.
+
+        Returns:
+            str | None: The raw content of the answer kept, reasoning included.
+        """
+        cascade = self.CASCADE
+        if cascade is None:
+            return self._chat(messages, response_format, prefix=prefix).message.content
+        started = time.perf_counter()
+        responses = [self._chat(messages, response_format, cascade.small_model, options, cascade.method is ConfidenceMethod.LOGPROBS, prefix)
+                     for options in self.__sample_options(cascade)]
+        chosen, confidence = score(responses, self.__is_valid_content, cascade.method)
+        small_seconds = time.perf_counter() - started
+        if confidence >= cascade.threshold:
+            cascade_stats.record(type(self).__name__, small_seconds, None)
+            return responses[chosen].message.content
+        started = time.perf_counter()
+        response = self._chat(messages, response_format, cascade.large_model, prefix=prefix)
+        cascade_stats.record(type(self).__name__, small_seconds, time.perf_counter() - started)
+        return response.message.content
+
+    async def _generate_async(self,
+                              messages: list[dict[str, str]],
+                              response_format: str | dict | None = None,
+                              prefix: PromptPrefix | None = None) -> str | None:
+        """
+        Asynchronous variant of `_generate`. The samples of self-consistency are requested concurrently.
+        """
+        cascade = self.CASCADE
+        if cascade is None:
+            return (await self._chat_async(messages, response_format, prefix=prefix)).message.content
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            self._chat_async(messages, response_format, cascade.small_model, options, cascade.method is ConfidenceMethod.LOGPROBS, prefix)
+            for options in self.__sample_options(cascade)
+        ))
+        chosen, confidence = score(responses, self.__is_valid_content, cascade.method)
+        small_seconds = time.perf_counter() - started
+        if confidence >= cascade.threshold:
+            cascade_stats.record(type(self).__name__, small_seconds, None)
+            return responses[chosen].message.content
+        started = time.perf_counter()
+        response = await self._chat_async(messages, response_format, cascade.large_model, prefix=prefix)
+        cascade_stats.record(type(self).__name__, small_seconds, time.perf_counter() - started)
+        return response.message.content
+
+    def __sample_options(self, cascade: CascadeConfig) -> list[dict[str, object] | None]:
+        """Returns the generation options of every answer requested from the small model: sampled ones for self-consistency."""
+        if cascade.method is not ConfidenceMethod.SELF_CONSISTENCY:
+            return [None]
+        return [{**self._generation_options, "temperature": cascade.sample_temperature}] * cascade.sample_count
+
+    def __is_valid_content(self, response: str) -> bool:
+        try:
+            return self._is_valid_response(response)
+        except ValueError:
+            return False
+    #endregion
+
+    def _isolated_messages(self, prompt: str, prefix: PromptPrefix | None = None) -> list[dict[str, str]]:
+        """
+        Returns the messages of a conversation made of the prompt prefix and a single prompt.
+
+        Args:
+            prompt (str): The user prompt.
+            prefix (PromptPrefix | None): The prefix to put before the prompt. `_prompt_prefix` if None.
+
+        Returns:
+            list[dict[str, str]]: The messages to send.
+        """
+        return (prefix or self._prompt_prefix).messages() + [{"role": "user", "content": prompt}]
+
+    def _complete(self, prompt: str, response_format: str | dict | None = None, prefix: PromptPrefix | None = None) -> str:
+        """
+        Answers a single prompt in an isolated conversation, without reading or changing the chat history.
+        Safe to call from several threads at once.
+
+        Args:
+            prompt (str): The user prompt.
+            response_format (str | dict | None): Constrains the output to "json" or to a JSON schema. `_response_format` if None.
+            prefix (PromptPrefix | None): The prefix to put before the prompt, e.g. one with examples in the shape of the format.
+                `_prompt_prefix` if None.
+
+        Returns:
+            str: The parsed response of the model.
+        """
+        messages = self._isolated_messages(prompt, prefix)
+        response_format = response_format if response_format is not None else self._response_format
+        key, content = self.__lookup_cache(messages, response_format)
+        if content is None:
+            content = self._generate(messages, response_format, prefix)
+            if not content or not content.strip():
+                raise ValueError("No content in the response from the model.")
+            content = self.__strip_special_characters(content)
+            self.__store_cache(key, content)
+        return self._parse_response(content)
+
     def _query(self) -> str:
-        response: ChatResponse = chat(model=self._model_id, messages=self._chat_history, stream=False)
-        if response.message.content:
-            return self._add_assistant_message(response.message.content)
-        else:
+        try:
+            messages = self._chat_history
+            key, content = self.__lookup_cache(messages, self._response_format)
+            if content is not None:
+                return self._add_assistant_message(content)
+            return self.__store_cache(key, self.__accept_response(self._generate(messages, self._response_format)))
+        finally:
+            if self.__stateless:
+                self.__end_request()
+
+    async def _query_async(self) -> str:
+        """
+        Asynchronous variant of `_query`.
+
+        Returns:
+            str: The cleaned response of the model, also added to the chat history.
+        """
+        try:
+            messages = self._chat_history
+            key, content = self.__lookup_cache(messages, self._response_format)
+            if content is not None:
+                return self._add_assistant_message(content)
+            return self.__store_cache(key, self.__accept_response(await self._generate_async(messages, self._response_format)))
+        finally:
+            if self.__stateless:
+                self.__end_request()
+
+    def _query_stream(self) -> Iterator[str]:
+        """
+        Queries the LLM with the chat history and yields the visible response as it is generated.
+        Reasoning blocks are filtered out incrementally, so the first visible token is yielded as soon as the model produces it.
+
+        Yields:
+            str: The next visible chunk of the response.
+        """
+        think_filter = ThinkBlockFilter()
+        chunks: list[str] = []
+        try:
+            messages = self._chat_history
+            key, content = self.__lookup_cache(messages, self._response_format)
+            if content is not None:
+                yield self._add_assistant_message(content)
+                return
+            strip_seconds = 0.0
+            for part in self._chat_stream(messages):
+                started = time.perf_counter()
+                visible = think_filter.feed(part.message.content or "")
+                strip_seconds += time.perf_counter() - started
+                if visible:
+                    chunks.append(visible)
+                    yield visible
+            visible = think_filter.flush()
+            if visible:
+                chunks.append(visible)
+                yield visible
+            telemetry.observe_strip(type(self).__name__, self._model_id, strip_seconds, think_filter.reasoning_length)
+            self.__store_cache(key, self.__accept_response("".join(chunks)))
+        finally:
+            if self.__stateless:
+                self.__end_request()
+
+    async def _query_stream_async(self) -> AsyncIterator[str]:
+        """
+        Asynchronous variant of `_query_stream`.
+
+        Yields:
+            str: The next visible chunk of the response.
+        """
+        think_filter = ThinkBlockFilter()
+        chunks: list[str] = []
+        try:
+            messages = self._chat_history
+            key, content = self.__lookup_cache(messages, self._response_format)
+            if content is not None:
+                yield self._add_assistant_message(content)
+                return
+            strip_seconds = 0.0
+            async for part in self._chat_stream_async(messages):
+                started = time.perf_counter()
+                visible = think_filter.feed(part.message.content or "")
+                strip_seconds += time.perf_counter() - started
+                if visible:
+                    chunks.append(visible)
+                    yield visible
+            visible = think_filter.flush()
+            if visible:
+                chunks.append(visible)
+                yield visible
+            telemetry.observe_strip(type(self).__name__, self._model_id, strip_seconds, think_filter.reasoning_length)
+            self.__store_cache(key, self.__accept_response("".join(chunks)))
+        finally:
+            if self.__stateless:
+                self.__end_request()
+
+    def __accept_response(self, content: str | None) -> str:
+        if not content or not content.strip():
             raise ValueError("No content in the response from the model.")
+        return self._add_assistant_message(content)
+
+    def __observe(self, messages: list[dict[str, str]], response: ChatResponse, model_id: str, prefix: PromptPrefix | None = None) -> None:
+        """Records the load and prompt evaluation metrics of a completed request, under the prefix it was sent with."""
+        model_manager.observe(model_id, response)
+        prefix = prefix or self._prompt_prefix
+        # a named prefix is counted as a task of its own, so requests alternating between prefixes are not taken for changes.
+        task = f"{type(self).__name__}/{prefix.name}" if prefix.name else type(self).__name__
+        prompt_eval_stats.record(task, prefix.fingerprint, estimate_prompt_tokens(messages), response)
+
+    def __lookup_cache(self, messages: list[dict[str, str]], response_format: str | dict | None = None) -> tuple[str | None, str | None]:
+        """Returns the cache key of the messages and the cached response, both None when the cache is disabled."""
+        if self.__response_cache is None:
+            return None, None
+        key = ResponseCache.make_key(self._model_id, messages, self._generation_options, response_format)
+        cached = self.__response_cache.get(key)
+        if cached is not None:
+            telemetry.observe_cache_hit(type(self).__name__, self._model_id)
+        return key, cached
+
+    def __store_cache(self, key: str | None, content: str) -> str:
+        if key is not None and self.__response_cache is not None:
+            self.__response_cache.put(key, content)
+        return content
+
+    @staticmethod
+    def _accumulate(chunks: Iterator[str]) -> Iterator[str]:
+        """
+        Turns a stream of chunks into a stream of the text accumulated so far, as Gradio expects from generator handlers.
+
+        Args:
+            chunks (Iterator[str]): The incremental chunks.
+
+        Yields:
+            str: The text accumulated so far.
+        """
+        text = ""
+        for chunk in chunks:
+            text += chunk
+            yield text
+
+    @staticmethod
+    async def _accumulate_async(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Asynchronous variant of `_accumulate`.
+        """
+        text = ""
+        async for chunk in chunks:
+            text += chunk
+            yield text
+
+    @property
+    def _chunk_token_budget(self) -> int:
+        """
+        Returns the number of tokens a document chunk may take in a single prompt:
+        the context window minus the system prompt, the response and the wording of the prompt.
+        """
+        return max(self.CONTEXT_TOKENS - estimate_tokens(self._system_behavior) - self.RESPONSE_TOKENS - self.PROMPT_OVERHEAD_TOKENS,
+                   self.CHUNK_OVERLAP_TOKENS * 4)
+
+    def _map_reduce(self,
+                    document: str | Iterable[str],
+                    map_template: str,
+                    reduce_template: str,
+                    concurrency: int = 4,
+                    final_template: str | None = None,
+                    whole_template: str | None = None) -> str:
+        """
+        Processes a document that may not fit the context window: it is split into overlapping chunks that are processed
+        in parallel with `map_template`, and the partial results are combined with `reduce_template`.
+        When the partial results do not fit a single prompt either, they are combined in groups, level by level, until they do.
+        A document that fits is processed with a single prompt.
+
+        Args:
+            document (str | Iterable[str]): The document, preferably pre-processed to plain text,
+                or its pieces (e.g. the lines of a file), which are read lazily and never held in memory at once.
+            map_template (str): The prompt for a chunk, with a {text} placeholder.
+            reduce_template (str): The prompt combining partial results, with a {text} placeholder.
+            concurrency (int): The maximum number of prompts processed at the same time.
+            final_template (str | None): The prompt producing the final result from the last partial results. `reduce_template` if None.
+            whole_template (str | None): The prompt for a document that fits a single chunk. `map_template` if None.
+
+        Returns:
+            str: The combined result.
+        """
+        budget = self._chunk_token_budget
+        chunks = iter_chunks([document] if isinstance(document, str) else document, budget, self.CHUNK_OVERLAP_TOKENS)
+        first, second = next(chunks, None), next(chunks, None)
+        if first is None:
+            raise ValueError("Document cannot be empty.")
+        if second is None:
+            return self._complete((whole_template or map_template).format(text=self._format_for_prompt(first)))
+        partials = self.__run_prompts((self._format_for_prompt(chunk) for chunk in itertools.chain((first, second), chunks)),
+                                      map_template,
+                                      concurrency)
+        while sum(estimate_tokens(partial) for partial in partials) > budget and len(partials) > 1:
+            partials = self.__run_prompts(self.__group_to_budget(partials, budget), reduce_template, concurrency)
+        combined = "".join(self._format_for_prompt(partial) for partial in partials)
+        return self._complete((final_template or reduce_template).format(text=combined))
+
+    def __run_prompts(self, texts: Iterable[str], template: str, concurrency: int) -> list[str]:
+        """Completes `template` for every formatted text in parallel, in isolated conversations, and fails if any of them fails."""
+        responses: list[str] = []
+        for result in run_batch(texts, lambda text: self._complete(template.format(text=text)), concurrency=concurrency):
+            if not result.ok:
+                raise RuntimeError(f"Processing part {result.index + 1} of the document failed: {result.error}")
+            responses.append(result.response or "")
+        return responses
+
+    def __group_to_budget(self, partials: list[str], budget: int) -> Iterator[str]:
+        """Groups consecutive partial results into prompt texts that fit the budget, at least two per group so every level shrinks."""
+        group: list[str] = []
+        used = 0
+        for partial in partials:
+            size = estimate_tokens(partial)
+            if len(group) >= 2 and used + size > budget:
+                yield "".join(self._format_for_prompt(text) for text in group)
+                group, used = [], 0
+            group.append(partial)
+            used += size
+        if group:
+            yield "".join(self._format_for_prompt(text) for text in group)
 
     def _format_for_prompt(self, content: str) -> str:
         return f"{self.NEWLINE_SYNTACTIC_SEPARATOR_FOR_PROMPT}{content}{self.NEWLINE_SYNTACTIC_SEPARATOR_FOR_PROMPT}"
@@ -163,5 +980,5 @@ class DeepSeekR1LocalConnector(ABC):
         Returns:
             None
         """
-        self._chat_history = []
+        self.__memory.clear()
         self._add_to_chat_history("system", self._system_behavior)
@@ -0,0 +1,256 @@
+import os
+import re
+from html.parser import HTMLParser
+from typing import Callable, Iterable, Iterator, TextIO
+from conversation_memory import estimate_tokens
+
+class VisibleTextExtractor(HTMLParser):
+    """
+    Collects the text of an HTML page a reader would see, leaving out scripts, styles, markup and page chrome
+    (navigation, headers, footers, forms). Optionally keeps only the elements whose id, class or aria-label mention a section.
+    """
+    HIDDEN_TAGS: frozenset[str] = frozenset({"script", "style", "noscript", "svg", "template", "head", "iframe", "canvas", "object"})
+    BOILERPLATE_TAGS: frozenset[str] = frozenset({"nav", "footer", "header", "aside", "form", "button", "dialog"})
+    BLOCK_TAGS: frozenset[str] = frozenset({
+        "p", "div", "section", "article", "main", "li", "ul", "ol", "tr", "table", "br", "hr",
+        "h1", "h2", "h3", "h4", "h5", "h6", "dd", "dt", "blockquote", "pre",
+    })
+    VOID_TAGS: frozenset[str] = frozenset({"br", "hr", "img", "input", "meta", "link", "source", "wbr", "area", "base", "col", "embed", "track"})
+
+    def __init__(self, section: str | None = None) -> None:
+        super().__init__(convert_charrefs=True)
+        self.__section = section.lower() if section else None
+        self.__stack: list[tuple[str, bool, bool]] = []
+        self.__skipping = 0
+        self.__in_section = 0
+        self.__all_parts: list[str] = []
+        self.__section_parts: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag in self.VOID_TAGS:
+            if tag in self.BLOCK_TAGS:
+                self.__append("\n")
+            return
+        skipped = tag in self.HIDDEN_TAGS or tag in self.BOILERPLATE_TAGS
+        matches = self.__section is not None and any(
+            name in ("id", "class", "aria-label") and value and self.__section in value.lower() for name, value in attrs
+        )
+        self.__stack.append((tag, skipped, matches))
+        self.__skipping += skipped
+        self.__in_section += matches
+        if tag in self.BLOCK_TAGS:
+            self.__append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.VOID_TAGS:
+            return
+        # tolerate unclosed elements: unwind to the matching start tag, if there is one.
+        if not any(open_tag == tag for open_tag, _, _ in self.__stack):
+            return
+        while self.__stack:
+            open_tag, skipped, matches = self.__stack.pop()
+            self.__skipping -= skipped
+            self.__in_section -= matches
+            if open_tag == tag:
+                break
+        if tag in self.BLOCK_TAGS:
+            self.__append("\n")
+
+    def handle_data(self, data: str) -> None:
+        if not self.__skipping:
+            self.__append(data)
+
+    def text(self) -> str:
+        """
+        Returns:
+            str: The visible text of the section, or of the whole page if no element matched the section.
+        """
+        parts = self.__section_parts if self.__section_parts and any(part.strip() for part in self.__section_parts) else self.__all_parts
+        return normalize_text("".join(parts))
+
+    def __append(self, text: str) -> None:
+        self.__all_parts.append(text)
+        if self.__in_section:
+            self.__section_parts.append(text)
+
+def normalize_text(text: str) -> str:
+    """
+    Collapses whitespace, drops empty lines and repeated lines (menus and labels that occur many times on a page).
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The normalized text, one block per line.
+    """
+    seen: set[str] = set()
+    lines: list[str] = []
+    for line in text.splitlines():
+        line = re.sub(r"\s+", " ", line).strip()
+        if line and line not in seen:
+            seen.add(line)
+            lines.append(line)
+    return "\n".join(lines)
+
+def html_to_text(html: str, section: str | None = None) -> str:
+    """
+    Extracts the visible text of an HTML page.
+
+    Args:
+        html (str): The page.
+        section (str | None): A keyword identifying the relevant part of the page by id, class or aria-label, e.g. 'experience'.
+
+    Returns:
+        str: The visible text of the section, or of the whole page if the section is not found.
+    """
+    extractor = VisibleTextExtractor(section)
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+def iter_text_file(source: str | os.PathLike | TextIO, encoding: str = "utf-8") -> Iterator[str]:
+    """
+    Reads a text file lazily, line by line, so a large document never has to be held in memory at once.
+
+    Args:
+        source (str | os.PathLike | TextIO): The path of the file (e.g. an upload of `gr.File`), or an open text stream.
+        encoding (str): The encoding of the file, when a path is given.
+
+    Yields:
+        str: The lines of the file.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "r", encoding=encoding, errors="replace") as text_file:
+            yield from text_file
+    else:
+        yield from source
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def _split_units(text: str, max_tokens: int, measure: Callable[[str], int]) -> Iterator[str]:
+    """Splits text into paragraphs, paragraphs that are too long into sentences, and sentences that are too long into hard cuts."""
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if measure(paragraph) <= max_tokens:
+            yield paragraph
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            if measure(sentence) <= max_tokens:
+                yield sentence
+                continue
+            # no boundary to respect - cut proportionally to the measured size.
+            step = max(int(len(sentence) * max_tokens / measure(sentence)), 1)
+            for start in range(0, len(sentence), step):
+                yield sentence[start:start + step]
+
+def iter_chunks(pieces: Iterable[str],
+                max_tokens: int,
+                overlap_tokens: int = 0,
+                measure: Callable[[str], int] = estimate_tokens) -> Iterator[str]:
+    """
+    Packs text into chunks that fit a token budget, splitting on paragraph and sentence boundaries where possible.
+    Consecutive chunks share up to `overlap_tokens` of text, so nothing said across a boundary is lost.
+
+    Args:
+        pieces (Iterable[str]): The text, as a whole string in a list or as pieces (e.g. lines of a file) consumed lazily.
+            Pieces are joined by paragraph, so each piece should end on a line boundary.
+        max_tokens (int): The budget of a chunk.
+        overlap_tokens (int): The budget of the text repeated at the start of the next chunk.
+        measure (Callable[[str], int]): Measures the size of a text.
+
+    Yields:
+        str: The chunks, in order.
+    """
+    if max_tokens < 1:
+        raise ValueError("max_tokens must be at least 1.")
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("overlap_tokens must be between 0 and max_tokens.")
+    chunk: list[tuple[str, int]] = []
+    used = 0
+    for piece in pieces:
+        for unit in _split_units(piece, max_tokens, measure):
+            size = measure(unit) + 1
+            if chunk and used + size > max_tokens:
+                yield "\n".join(text for text, _ in chunk)
+                # carry the tail of the chunk over, up to the overlap budget.
+                carried: list[tuple[str, int]] = []
+                carried_size = 0
+                for text, text_size in reversed(chunk):
+                    if carried_size + text_size > overlap_tokens or carried_size + text_size + size > max_tokens:
+                        break
+                    carried.insert(0, (text, text_size))
+                    carried_size += text_size
+                chunk, used = carried, carried_size
+            chunk.append((unit, size))
+            used += size
+    if chunk:
+        yield "\n".join(text for text, _ in chunk)
+
+def split_into_chunks(text: str,
+                      max_tokens: int,
+                      overlap_tokens: int = 0,
+                      measure: Callable[[str], int] = estimate_tokens) -> list[str]:
+    """
+    Splits a text into chunks that fit a token budget. See `iter_chunks`.
+
+    Returns:
+        list[str]: The chunks, in order. A text that fits the budget is returned as a single chunk.
+    """
+    return list(iter_chunks([text], max_tokens, overlap_tokens, measure))
+
+_SENTENCE_BOUNDARY = re.compile(r"[.!?…]+[\"')\]]*\s+|\n\s*")
+
+def iter_spans(text: str,
+               max_tokens: int,
+               overlap_tokens: int = 0,
+               measure: Callable[[str], int] = estimate_tokens) -> Iterator[tuple[int, int]]:
+    """
+    Splits a text into shards that fit a token budget, on sentence boundaries where possible, and reports them
+    by their character offsets, so results found in a shard can be mapped back onto the whole text.
+    Consecutive shards share up to `overlap_tokens` of whole sentences.
+
+    Args:
+        text (str): The text.
+        max_tokens (int): The budget of a shard.
+        overlap_tokens (int): The budget of the sentences repeated at the start of the next shard.
+        measure (Callable[[str], int]): Measures the size of a text.
+
+    Yields:
+        tuple[int, int]: The start and end offsets of the shards, in order.
+    """
+    if max_tokens < 1:
+        raise ValueError("max_tokens must be at least 1.")
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("overlap_tokens must be between 0 and max_tokens.")
+    sentences: list[tuple[int, int, int]] = []
+    start = 0
+    for end in [boundary.end() for boundary in _SENTENCE_BOUNDARY.finditer(text)] + [len(text)]:
+        if end <= start:
+            continue
+        size = measure(text[start:end])
+        if size <= max_tokens:
+            sentences.append((start, end, size))
+        else:
+            # no boundary to respect - cut proportionally to the measured size.
+            step = max(int((end - start) * max_tokens / size), 1)
+            for cut in range(start, end, step):
+                sentences.append((cut, min(cut + step, end), measure(text[cut:min(cut + step, end)])))
+        start = end
+    first = 0
+    while first < len(sentences):
+        last, used = first, 0
+        while last < len(sentences) and (last == first or used + sentences[last][2] <= max_tokens):
+            used += sentences[last][2]
+            last += 1
+        yield sentences[first][0], sentences[last - 1][1]
+        if last == len(sentences):
+            return
+        # start the next shard with the trailing sentences that fit the overlap, but always move forward.
+        carried = 0
+        next_first = last
+        while next_first - 1 > first and carried + sentences[next_first - 1][2] <= overlap_tokens:
+            next_first -= 1
+            carried += sentences[next_first][2]
+        first = next_first
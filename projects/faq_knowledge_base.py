@@ -0,0 +1,293 @@
+import csv
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from enum import Enum
+from typing import NamedTuple
+import numpy as np
+from intent_router import IntentMatch, IntentRouter
+
+class FAQEntry(NamedTuple):
+    """A single entry of the FAQ: its category key, the answer, and example questions."""
+    category: str
+    answer: str
+    questions: tuple[str, ...]
+
+def load_faq_entries(path: str) -> list[FAQEntry]:
+    """
+    Loads FAQ entries from a JSON, CSV or SQLite file.
+
+    JSON files hold either a list of {"category", "answer", "questions"} objects or a {category: answer} object.
+    CSV files have "category", "answer" and optional "questions" columns, with questions separated by "|".
+    SQLite files have a "faq" table with the same columns as the CSV files.
+
+    Args:
+        path (str): The file to load.
+
+    Returns:
+        list[FAQEntry]: The entries, in file order.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        with open(path, "r", encoding="utf-8") as faq_file:
+            data = json.load(faq_file)
+        if isinstance(data, dict):
+            return [FAQEntry(str(category).strip().lower(), str(answer), ()) for category, answer in data.items()]
+        return [
+            FAQEntry(str(item["category"]).strip().lower(), str(item["answer"]), tuple(item.get("questions", ())))
+            for item in data
+        ]
+    if extension == ".csv":
+        with open(path, "r", encoding="utf-8", newline="") as faq_file:
+            rows = list(csv.DictReader(faq_file))
+    elif extension in (".sqlite", ".sqlite3", ".db"):
+        with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as connection:
+            connection.row_factory = sqlite3.Row
+            rows = [dict(row) for row in connection.execute("SELECT * FROM faq")]
+    else:
+        raise ValueError(f"Unsupported FAQ file type: {extension}")
+    return [
+        FAQEntry(row["category"].strip().lower(),
+                 row["answer"],
+                 tuple(question.strip() for question in (row.get("questions") or "").split("|") if question.strip()))
+        for row in rows
+    ]
+
+class InvertedIndex:
+    """
+    BM25 inverted index over the words of a set of documents.
+    Each word keeps arrays of the documents containing it and its frequency in them, so a query only touches the postings of its own words.
+    """
+    __WORD = re.compile(r"\w+", re.UNICODE)
+    K1: float = 1.2
+    B: float = 0.75
+
+    def __init__(self, documents: list[str]) -> None:
+        self.__size = len(documents)
+        counts = [Counter(self.tokenize(document)) for document in documents]
+        lengths = np.array([sum(count.values()) for count in counts], dtype=np.float32)
+        self.__length_norm = self.K1 * (1 - self.B + self.B * lengths / max(float(lengths.mean()) if self.__size else 0.0, 1.0))
+        postings: dict[str, tuple[list[int], list[int]]] = {}
+        for document, count in enumerate(counts):
+            for word, frequency in count.items():
+                documents_of_word, frequencies = postings.setdefault(word, ([], []))
+                documents_of_word.append(document)
+                frequencies.append(frequency)
+        self.__postings: dict[str, tuple[np.ndarray, np.ndarray, float]] = {
+            word: (np.array(documents_of_word, dtype=np.int32),
+                   np.array(frequencies, dtype=np.float32),
+                   math.log(1 + (self.__size - len(documents_of_word) + 0.5) / (len(documents_of_word) + 0.5)))
+            for word, (documents_of_word, frequencies) in postings.items()
+        }
+
+    @classmethod
+    def tokenize(cls, text: str) -> list[str]:
+        return cls.__WORD.findall(text.lower().replace("_", " "))
+
+    def scores(self, text: str) -> np.ndarray:
+        """
+        Args:
+            text (str): The query.
+
+        Returns:
+            np.ndarray: The BM25 score of every document.
+        """
+        scores = np.zeros(self.__size, dtype=np.float32)
+        for word in set(self.tokenize(text)):
+            posting = self.__postings.get(word)
+            if posting is None:
+                continue
+            documents, frequencies, idf = posting
+            scores[documents] += idf * frequencies * (self.K1 + 1) / (frequencies + self.__length_norm[documents])
+        return scores
+
+class _FAQSnapshot:
+    """An immutable, fully indexed version of the FAQ. Reloading builds a new snapshot and swaps it in."""
+
+    def __init__(self, entries: list[FAQEntry], use_vector_index: bool) -> None:
+        self.entries: dict[str, FAQEntry] = {entry.category: entry for entry in entries}
+        self.categories: list[str] = list(self.entries)
+        # the categories as a typed result, e.g. FAQCategory.RETURN_POLICY with the value 'return_policy'.
+        self.category_type: type[Enum] = Enum("FAQCategory", {category.upper(): category for category in self.categories})
+        self.inverted_index = InvertedIndex(
+            [" ".join((entry.category, entry.answer, *entry.questions)) for entry in self.entries.values()]
+        )
+        self.router: IntentRouter | None = IntentRouter(
+            {entry.category: [*entry.questions, entry.answer] for entry in self.entries.values()}
+        ) if use_vector_index and self.entries else None
+
+class FAQKnowledgeBase:
+    """
+    FAQ loaded from a JSON, CSV or SQLite file and indexed for retrieval.
+
+    Questions are matched against an inverted word index and, optionally, against the character n-gram vector index
+    of `IntentRouter`. Only the top-k candidate categories of a question are meant to reach the prompt, so the prompt size
+    does not depend on the size of the FAQ. The file is reloaded in the background when it changes on disk.
+    """
+    DEFAULT_TOP_K: int = 5
+    DEFAULT_RELOAD_INTERVAL: float = 2.0
+    # reciprocal rank fusion constant - dampens the influence of the exact rank in each index.
+    RANK_FUSION_K: int = 60
+    # (absolute path, top_k) -> the knowledge base shared by the whole process.
+    __shared: "dict[tuple[str, int], FAQKnowledgeBase]" = {}
+    __shared_lock = threading.Lock()
+
+    def __init__(self,
+                 path: str,
+                 top_k: int = DEFAULT_TOP_K,
+                 use_vector_index: bool = True,
+                 reload_interval: float | None = DEFAULT_RELOAD_INTERVAL) -> None:
+        """
+        Args:
+            path (str): The FAQ file.
+            top_k (int): The number of candidate categories returned for a question.
+            use_vector_index (bool): Whether to build the character n-gram index as well. Required for answering without the LLM.
+            reload_interval (float | None): How often the file is checked for changes, in seconds. Never if None.
+        """
+        if top_k < 1:
+            raise ValueError("top_k must be at least 1.")
+        self.__path = path
+        self.__top_k = top_k
+        self.__use_vector_index = use_vector_index
+        self.__reload_interval = reload_interval
+        self.__reload_lock = threading.Lock()
+        self.__modified = os.stat(path).st_mtime_ns
+        self.__checked = time.monotonic()
+        self.__snapshot = _FAQSnapshot(load_faq_entries(path), use_vector_index)
+
+    @classmethod
+    def shared(cls, path: str, top_k: int = DEFAULT_TOP_K) -> "FAQKnowledgeBase":
+        """
+        Returns the knowledge base of a file shared by the whole process, creating it on first use, so the file is indexed
+        and watched once however many bots answer from it. Built under a lock: concurrent first users wait for a single build.
+        """
+        key = (os.path.abspath(path), top_k)
+        with cls.__shared_lock:
+            knowledge_base = cls.__shared.get(key)
+            if knowledge_base is None:
+                knowledge_base = cls.__shared[key] = cls(path, top_k=top_k)
+            return knowledge_base
+
+    #region Properties
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def top_k(self) -> int:
+        return self.__top_k
+
+    @property
+    def categories(self) -> list[str]:
+        return list(self.__current().categories)
+
+    @property
+    def category_type(self) -> type[Enum]:
+        """The Enum of the current categories. Rebuilt whenever the file is reloaded."""
+        return self.__current().category_type
+    #endregion
+
+    def __len__(self) -> int:
+        return len(self.__current().entries)
+
+    def answer(self, category: str) -> str | None:
+        """
+        Args:
+            category (str): The category key.
+
+        Returns:
+            str | None: The answer of the category, or None if there is no such category.
+        """
+        entry = self.__current().entries.get(category)
+        return entry.answer if entry else None
+
+    def candidates(self, question: str, k: int | None = None) -> list[str]:
+        """
+        Retrieves the categories most likely to answer the question.
+
+        Args:
+            question (str): The question of the user.
+            k (int | None): The number of categories to return. `top_k` if None.
+
+        Returns:
+            list[str]: The candidate categories, best first.
+        """
+        snapshot = self.__current()
+        count = min(k or self.__top_k, len(snapshot.categories))
+        if not count:
+            return []
+        fused: dict[str, float] = {}
+        word_scores = snapshot.inverted_index.scores(question)
+        ranked = [position for position in np.argsort(-word_scores, kind="stable")[:count] if word_scores[position] > 0]
+        for rank, position in enumerate(ranked):
+            category = snapshot.categories[position]
+            fused[category] = fused.get(category, 0.0) + 1.0 / (self.RANK_FUSION_K + rank)
+        if snapshot.router is not None:
+            for rank, (category, _) in enumerate(snapshot.router.rank(question, count)):
+                fused[category] = fused.get(category, 0.0) + 1.0 / (self.RANK_FUSION_K + rank)
+        return sorted(fused, key=lambda category: -fused[category])[:count]
+
+    def route(self, question: str) -> IntentMatch | None:
+        """
+        Args:
+            question (str): The question of the user.
+
+        Returns:
+            IntentMatch | None: The best category of the vector index, or None if it is disabled.
+        """
+        router = self.__current().router
+        return router.route(question) if router is not None else None
+
+    def snap(self, output: str, candidates: list[str] | None = None) -> str | None:
+        """
+        Maps an output of the LLM to a valid category, preferring the candidates the model was shown.
+
+        Args:
+            output (str): The output of the model.
+            candidates (list[str] | None): The categories that were injected into the prompt.
+
+        Returns:
+            str | None: The category, or None if the output names none of them.
+        """
+        snapshot = self.__current()
+        normalized = output.strip().strip("\"'`.").lower()
+        for scope in (candidates or [], snapshot.categories):
+            if normalized in scope:
+                return normalized
+            mentioned = [category for category in scope if category in normalized]
+            if mentioned:
+                return max(mentioned, key=len)
+        return snapshot.router.snap(output) if snapshot.router is not None else None
+
+    def reload(self) -> None:
+        """Reloads the file right away, regardless of its modification time."""
+        with self.__reload_lock:
+            self.__modified = os.stat(self.__path).st_mtime_ns
+            self.__snapshot = _FAQSnapshot(load_faq_entries(self.__path), self.__use_vector_index)
+
+    def __current(self) -> _FAQSnapshot:
+        """Returns the current snapshot, and starts a background reload if the file is due for a check."""
+        if self.__reload_interval is not None and time.monotonic() - self.__checked >= self.__reload_interval:
+            if self.__reload_lock.acquire(blocking=False):
+                self.__checked = time.monotonic()
+                # indexing a large FAQ takes seconds, so requests keep using the old snapshot meanwhile.
+                threading.Thread(target=self.__reload_if_changed, name="faq-reload", daemon=True).start()
+        return self.__snapshot
+
+    def __reload_if_changed(self) -> None:
+        """Reloads the file if it changed. Runs with the reload lock held, and releases it."""
+        try:
+            modified = os.stat(self.__path).st_mtime_ns
+            if modified != self.__modified:
+                self.__snapshot = _FAQSnapshot(load_faq_entries(self.__path), self.__use_vector_index)
+                self.__modified = modified
+        except (OSError, ValueError, KeyError):
+            # a half-written file must not take the bot down - the previous snapshot keeps serving.
+            pass
+        finally:
+            self.__reload_lock.release()
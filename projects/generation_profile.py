@@ -0,0 +1,86 @@
+import json
+from enum import Enum
+from typing import Iterable, NamedTuple, TypeVar
+
+E = TypeVar("E", bound=Enum)
+
+class GenerationProfile(NamedTuple):
+    """
+    The generation settings of a task, sent with every request of its connector. Fields left None keep the server defaults.
+    The context window is not one of them: it is a setting of the model, shared by every task using it, see `ModelManager`.
+    """
+    # the most tokens generated per response, reasoning included.
+    num_predict: int | None = None
+    temperature: float | None = None
+    stop: tuple[str, ...] = ()
+    # constrains the output to "json" or to a JSON schema, for requests that do not pass a format of their own.
+    response_format: str | dict | None = None
+    # False asks the server to leave out the reasoning of R1. None leaves it to the server.
+    think: bool | None = None
+
+    def options(self) -> dict[str, object]:
+        """
+        Returns:
+            dict[str, object]: The Ollama options of the profile.
+        """
+        options: dict[str, object] = {}
+        if self.num_predict is not None:
+            options["num_predict"] = self.num_predict
+        if self.temperature is not None:
+            options["temperature"] = self.temperature
+        if self.stop:
+            options["stop"] = list(self.stop)
+        return options
+
+def label_schema(labels: Iterable[str] | type[Enum], key: str = "label") -> dict:
+    """
+    Args:
+        labels (Iterable[str] | type[Enum]): The allowed labels, or an Enum whose values are the labels.
+        key (str): The name of the property holding the label.
+
+    Returns:
+        dict: The JSON schema of an object with a single property, restricted to the labels.
+    """
+    values = [member.value for member in labels] if isinstance(labels, type) else list(labels)
+    return {"type": "object", "properties": {key: {"type": "string", "enum": values}}, "required": [key]}
+
+def read_label(response: str, key: str = "label") -> str:
+    """
+    Reads the label of a response constrained by `label_schema`. Plain text responses, e.g. of a server ignoring the
+    format or cached before it was set, are read as the label themselves.
+
+    Args:
+        response (str): The response of the model, without its reasoning.
+        key (str): The name of the property holding the label.
+
+    Returns:
+        str: The label, lowercase and without surrounding quotes or punctuation.
+    """
+    text = response.strip()
+    if text.startswith("{"):
+        try:
+            document = json.loads(text)
+        except json.JSONDecodeError:
+            document = None
+        if isinstance(document, dict) and isinstance(document.get(key), str):
+            text = document[key]
+    return text.strip().strip("\"'`.").lower()
+
+def parse_label(response: str, labels: type[E], key: str = "label") -> E:
+    """
+    Args:
+        response (str): The response of the model, without its reasoning.
+        labels (type[E]): The Enum whose values are the allowed labels.
+        key (str): The name of the property holding the label.
+
+    Returns:
+        E: The label of the response.
+
+    Raises:
+        ValueError: If the response holds none of the labels.
+    """
+    label = read_label(response, key)
+    try:
+        return labels(label)
+    except ValueError:
+        raise ValueError(f"The response of the model is not a {labels.__name__}: {response.strip()[:80]!r}") from None
@@ -1,15 +1,51 @@
+import difflib
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+from batch_inference import run_batch
 from deepseek_connector import DeepSeekR1LocalConnector
+from model_manager import model_manager
+from session_manager import SessionManager
 from ollama import chat, ChatResponse
 import gradio as gr
 
+class DocumentCheck(NamedTuple):
+    """The outcome of an incremental grammar check of a document."""
+    text: str
+    diff: str
+    checked: int
+    reused: int
+
+def split_paragraphs(text: str) -> list[str]:
+    """
+    Splits a text into paragraphs and the blank lines between them, so that joining the parts restores the text exactly.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list[str]: Paragraphs at even positions, separators at odd positions.
+    """
+    return re.split(r"(\n[ \t]*\n\s*)", text)
+
 class DeepSeekR1GrammarChecker(DeepSeekR1LocalConnector):
-    """DeepSeek R1 Grammar Checker that corrects grammar mistakes in provided text."""
+    """
+    DeepSeek R1 Grammar Checker that corrects grammar mistakes in provided text.
+    Documents can be checked incrementally: corrections are cached per paragraph, so only new or edited paragraphs reach the model.
+    """
+    MAX_CACHED_PARAGRAPHS: int = 10_000
+    # every checker corrects a paragraph the same way, so the cache is shared by all of them.
+    __corrections: OrderedDict[str, str] = OrderedDict()
+    __corrections_lock = threading.Lock()
 
     def __init__(self):
         super().__init__(system_behavior=("You are an editor that checks the grammar of the text."
                                           "You will correct the grammar mistakes in the text provided by the user."
                                           "Your response will contain ONLY the corrected text, without explanations, maintaining the original meaning and context."
-                                          "If there are no mistakes, your response will contain ONLY the original text without changes."))
+                                          "If there are no mistakes, your response will contain ONLY the original text without changes."),
+                         stateless=True)
 
     def ask(self, request: str) -> str:
         """Checks grammar of the provided text.
@@ -23,18 +59,120 @@ class DeepSeekR1GrammarChecker(DeepSeekR1LocalConnector):
         Raises:
             ValueError: If the request is empty.
         """
+        self._add_user_message(self._build_prompt(request))
+        return self._query()
+
+    def _build_prompt(self, request: str) -> str:
         if not request or request.strip() == "":
             raise ValueError("Request cannot be empty.")
-        prompt = f"Check the grammar of the following text:\n\n{request}\n\n"
-        self._add_user_message(prompt)
-        return self._query()
+        return f"Check the grammar of the following text:\n\n{request}\n\n"
+
+    def check_document(self, document: str, concurrency: int = 4) -> DocumentCheck:
+        """
+        Checks the grammar of a document paragraph by paragraph. Paragraphs whose correction is cached from a previous check
+        (by the hash of their text) are not sent again, and the remaining ones are checked concurrently.
+
+        Args:
+            document (str): The document, with paragraphs separated by blank lines.
+            concurrency (int): The maximum number of paragraphs checked at the same time.
+
+        Returns:
+            DocumentCheck: The corrected document, a unified diff of the edits, and how many paragraphs were checked and reused.
+
+        Raises:
+            ValueError: If the document is empty.
+        """
+        if not document or document.strip() == "":
+            raise ValueError("Request cannot be empty.")
+        parts = split_paragraphs(document)
+        corrected = list(parts)
+        pending: dict[str, list[int]] = {}
+        reused = 0
+        for position in range(0, len(parts), 2):
+            paragraph = parts[position].strip()
+            if not paragraph:
+                continue
+            correction = self.__cached_correction(paragraph)
+            if correction is None:
+                pending.setdefault(paragraph, []).append(position)
+            else:
+                corrected[position] = self.__keep_padding(parts[position], correction)
+                reused += 1
+        for result in run_batch(list(pending), lambda paragraph: self._complete(self._build_prompt(paragraph)), concurrency=concurrency):
+            if not result.ok:
+                raise RuntimeError(f"Checking paragraph {result.index + 1} of {len(pending)} failed: {result.error}")
+            correction = (result.response or "").strip() or result.item
+            self.__cache_correction(result.item, correction)
+            for position in pending[result.item]:
+                corrected[position] = self.__keep_padding(parts[position], correction)
+        text = "".join(corrected)
+        diff = "".join(difflib.unified_diff(document.splitlines(keepends=True), text.splitlines(keepends=True),
+                                            fromfile="original", tofile="corrected"))
+        return DocumentCheck(text, diff, sum(len(positions) for positions in pending.values()), reused)
+
+    def check_document_for_display(self, document: str) -> tuple[str, str, str]:
+        """
+        Runs `check_document` and returns its outcome in the form of the interface outputs.
+        """
+        check = self.check_document(document)
+        return check.text, check.diff or "No changes.", f"Checked {check.checked} paragraph(s), reused {check.reused} cached correction(s)."
+
+    @staticmethod
+    def __hash(paragraph: str) -> str:
+        return hashlib.sha256(paragraph.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def __keep_padding(original: str, correction: str) -> str:
+        """Puts the correction in place of the paragraph, keeping the whitespace around it."""
+        leading = original[:len(original) - len(original.lstrip())]
+        trailing = original[len(original.rstrip()):]
+        return f"{leading}{correction}{trailing}"
+
+    def __cached_correction(self, paragraph: str) -> str | None:
+        with self.__corrections_lock:
+            key = self.__hash(paragraph)
+            correction = self.__corrections.get(key)
+            if correction is not None:
+                self.__corrections.move_to_end(key)
+            return correction
+
+    def __cache_correction(self, paragraph: str, correction: str) -> None:
+        with self.__corrections_lock:
+            self.__corrections[self.__hash(paragraph)] = correction
+            # a corrected paragraph pasted back into the document needs no check either.
+            self.__corrections[self.__hash(correction)] = correction
+            while len(self.__corrections) > self.MAX_CACHED_PARAGRAPHS:
+                self.__corrections.popitem(last=False)
+
+def grammar_checker_interface() -> gr.Blocks:
+    """Builds the UI of the grammar checker. The connector is stateless, so every session shares one."""
+    grammar_checker_sessions: SessionManager[DeepSeekR1GrammarChecker] = SessionManager(DeepSeekR1GrammarChecker, shared=True)
+    interface: gr.TabbedInterface = gr.TabbedInterface(
+        [
+            gr.Interface(
+                fn=grammar_checker_sessions.handler("ask_async"),
+                inputs=gr.Textbox(label="Text to Check", placeholder="Enter the text you want to check for grammar..."),
+                outputs=gr.Textbox(label="Corrected Text"),
+                title="DeepSeek R1 Grammar Checker",
+                description="This tool checks the grammar of the provided text and returns the corrected version."
+            ),
+            gr.Interface(
+                fn=grammar_checker_sessions.handler("check_document_for_display"),
+                inputs=gr.Textbox(label="Document to Check", placeholder="Enter or paste the document you want to check for grammar...", lines=15),
+                outputs=[
+                    gr.Textbox(label="Corrected Document"),
+                    gr.Code(label="Changes"),
+                    gr.Textbox(label="Statistics"),
+                ],
+                title="DeepSeek R1 Document Grammar Checker",
+                description="Checks long documents paragraph by paragraph. After an edit, only the changed paragraphs are checked again."
+            ),
+        ],
+        tab_names=["Text", "Document"],
+    )
+    return grammar_checker_sessions.attach(interface)
 
-grammar_checker_interface: gr.Interface = gr.Interface(
-    fn=DeepSeekR1GrammarChecker().ask,
-    inputs=gr.Textbox(label="Text to Check", placeholder="Enter the text you want to check for grammar..."),
-    outputs=gr.Textbox(label="Corrected Text"),
-    title="DeepSeek R1 Grammar Checker",
-    description="This tool checks the grammar of the provided text and returns the corrected version."
-)
 if __name__ == "__main__":
-    grammar_checker_interface.launch()
\ No newline at end of file
+    interface = grammar_checker_interface()
+    model_manager.preload()
+    interface.launch()
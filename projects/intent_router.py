@@ -0,0 +1,193 @@
+import math
+import re
+from collections import Counter
+from typing import Mapping, NamedTuple, Sequence
+import numpy as np
+
+class IntentMatch(NamedTuple):
+    """The best category for a text, with its similarity score and the margin over the runner-up."""
+    category: str
+    score: float
+    margin: float
+    confident: bool
+
+class CharNGramIndex:
+    """
+    TF-IDF index over character n-grams, stored as per-feature posting arrays.
+
+    Scoring a query gathers the postings of its n-grams and sums them with a single `np.bincount`,
+    so the cost depends on the query length and the matching postings, not on the size of the whole index.
+    """
+    __NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+    def __init__(self, documents: Sequence[str], min_n: int = 2, max_n: int = 4) -> None:
+        """
+        Args:
+            documents (Sequence[str]): The documents to index. Scores are reported per document, in the same order.
+            min_n (int): The shortest n-gram.
+            max_n (int): The longest n-gram.
+        """
+        self.__min_n = min_n
+        self.__max_n = max_n
+        # the postings of all documents, flattened: their n-grams, occurrences, and the number of them per document.
+        features: list[str] = []
+        occurrences: list[int] = []
+        lengths: list[int] = []
+        for document in documents:
+            count = self.__count(document)
+            features.extend(count)
+            occurrences.extend(count.values())
+            lengths.append(len(count))
+        # features are numbered in the order they first appear in.
+        self.__features: dict[str, int] = {feature: column for column, feature in enumerate(dict.fromkeys(features))}
+        row_array = np.repeat(np.arange(len(documents), dtype=np.int64), lengths)
+        column_array = np.fromiter(map(self.__features.__getitem__, features), dtype=np.int64, count=len(features))
+        # every feature occurs at most once per document, so its postings count the documents it appears in.
+        document_frequency = np.bincount(column_array, minlength=len(self.__features))
+        self.__idf = (np.log((1 + len(documents)) / (1 + document_frequency)) + 1.0).astype(np.float32)
+
+        # sublinear TF-IDF of every posting at once, then L2-normalized per document.
+        weights = (1.0 + np.log(np.array(occurrences, dtype=np.float64))) * self.__idf[column_array]
+        norms = np.sqrt(np.bincount(row_array, weights=weights * weights, minlength=len(documents)))
+        if len(weights):
+            weights /= norms[row_array]
+        order = np.argsort(column_array, kind="stable")
+        self.__posting_rows = row_array[order].astype(np.int32)
+        self.__posting_weights = weights[order].astype(np.float32)
+        self.__posting_starts = np.concatenate(([0], np.cumsum(document_frequency))).astype(np.int64)
+        self.__size = len(documents)
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def scores(self, text: str) -> np.ndarray:
+        """
+        Computes the cosine similarity of the text to every indexed document.
+
+        Args:
+            text (str): The query text.
+
+        Returns:
+            np.ndarray: The similarity of each document, between 0 and 1.
+        """
+        vector = self.__weigh(self.__count(text))
+        if not vector or not self.__size:
+            return np.zeros(self.__size, dtype=np.float32)
+        row_slices = [self.__posting_rows[self.__posting_starts[column]:self.__posting_starts[column + 1]] for column in vector]
+        weight_slices = [
+            self.__posting_weights[self.__posting_starts[column]:self.__posting_starts[column + 1]] * weight
+            for column, weight in vector.items()
+        ]
+        return np.bincount(np.concatenate(row_slices), weights=np.concatenate(weight_slices), minlength=self.__size).astype(np.float32)
+
+    def __count(self, text: str) -> Counter[str]:
+        normalized = f" {self.__NON_WORD.sub(' ', text.lower()).strip()} "
+        count: Counter[str] = Counter()
+        for n in range(self.__min_n, self.__max_n + 1):
+            count.update(normalized[i:i + n] for i in range(len(normalized) - n + 1))
+        return count
+
+    def __weigh(self, count: Counter[str]) -> dict[int, float]:
+        """Turns raw n-gram counts into an L2-normalized sublinear TF-IDF vector over the known features."""
+        vector: dict[int, float] = {}
+        for feature, occurrences in count.items():
+            column = self.__features.get(feature)
+            if column is not None:
+                vector[column] = (1.0 + math.log(occurrences)) * float(self.__idf[column])
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {column: weight / norm for column, weight in vector.items()} if norm else {}
+
+class IntentRouter:
+    """
+    Local classifier that maps a question to one of a fixed set of categories without querying the LLM.
+
+    Each category is described by a set of texts - its name, example questions, its answer - and is scored by
+    its best matching text. A match is confident when the best score is high enough and clearly ahead of the runner-up.
+    """
+    DEFAULT_MIN_SCORE: float = 0.45
+    DEFAULT_MIN_MARGIN: float = 0.1
+
+    def __init__(self,
+                 categories: Mapping[str, Sequence[str]],
+                 min_score: float = DEFAULT_MIN_SCORE,
+                 min_margin: float = DEFAULT_MIN_MARGIN) -> None:
+        """
+        Args:
+            categories (Mapping[str, Sequence[str]]): The texts describing each category. The name of the category is indexed too.
+            min_score (float): The similarity a match needs to be confident.
+            min_margin (float): The lead over the second best category a match needs to be confident.
+        """
+        if not categories:
+            raise ValueError("At least one category is required.")
+        self.__categories: list[str] = list(categories)
+        self.__min_score = min_score
+        self.__min_margin = min_margin
+        documents: list[str] = []
+        owners: list[int] = []
+        for position, (category, texts) in enumerate(categories.items()):
+            for text in (self.__readable(category), *texts):
+                documents.append(text)
+                owners.append(position)
+        self.__document_owners = np.array(owners, dtype=np.int64)
+        self.__index = CharNGramIndex(documents)
+        self.__names = CharNGramIndex([self.__readable(category) for category in self.__categories])
+
+    @property
+    def categories(self) -> list[str]:
+        return list(self.__categories)
+
+    def rank(self, text: str, k: int | None = None) -> list[tuple[str, float]]:
+        """
+        Ranks the categories by their similarity to the text.
+
+        Args:
+            text (str): The text to classify.
+            k (int | None): The number of categories to return. All of them if None.
+
+        Returns:
+            list[tuple[str, float]]: The categories with their scores, best first.
+        """
+        category_scores = np.zeros(len(self.__categories), dtype=np.float32)
+        np.maximum.at(category_scores, self.__document_owners, self.__index.scores(text))
+        count = len(self.__categories) if k is None else min(k, len(self.__categories))
+        best = np.argsort(-category_scores, kind="stable")[:count]
+        return [(self.__categories[position], float(category_scores[position])) for position in best]
+
+    def route(self, text: str) -> IntentMatch:
+        """
+        Classifies the text.
+
+        Args:
+            text (str): The text to classify.
+
+        Returns:
+            IntentMatch: The best category and whether it is confident enough to skip the LLM.
+        """
+        ranking = self.rank(text, 2)
+        category, score = ranking[0]
+        margin = score - (ranking[1][1] if len(ranking) > 1 else 0.0)
+        return IntentMatch(category, score, margin, score >= self.__min_score and margin >= self.__min_margin)
+
+    def snap(self, output: str) -> str | None:
+        """
+        Maps a free-form output of the LLM to the closest valid category.
+
+        Args:
+            output (str): The output of the model, expected to name a category.
+
+        Returns:
+            str | None: The category named by the output, or None if it resembles none of them.
+        """
+        normalized = output.strip().strip("\"'`.").lower()
+        if normalized in self.__categories:
+            return normalized
+        mentioned = [category for category in self.__categories if category in normalized]
+        if mentioned:
+            return max(mentioned, key=len)
+        scores = self.__names.scores(normalized)
+        best = int(np.argmax(scores))
+        return self.__categories[best] if scores[best] >= self.__min_score else None
+
+    @staticmethod
+    def __readable(category: str) -> str:
+        return category.replace("_", " ")
@@ -0,0 +1,169 @@
+import time
+# taken before anything else is imported, so the report covers the imports of the launcher too.
+PROCESS_STARTED: float = time.perf_counter()
+
+import argparse
+import json
+import sys
+from typing import Any, Callable, NamedTuple
+from batch_inference import load_module
+from model_manager import model_manager
+from ollama_client_pool import client_pool
+
+# tool name: (tab title, file, function building its UI). Tools are imported only when selected, in this order.
+TOOLS: dict[str, tuple[str, str, str]] = {
+    "text": ("Text Generator", "text_generator.py", "generator_interface"),
+    "summarizer": ("Summarizer", "summarizer.py", "summarizer_interface"),
+    "grammar": ("Grammar Checker", "grammar_checker.py", "grammar_checker_interface"),
+    "sentiment": ("Sentiment", "sentiment-analysis.py", "sentiment_analyzer_interface"),
+    "ner": ("Named Entities", "ner_extractor.py", "ner_extractor_interface"),
+    "email": ("Email Response", "ai-email-response-generator.py", "email_generator_interface"),
+    "support": ("Customer Support", "customer_support.py", "customer_support_interface"),
+    "assistant": ("Personal Assistant", "personal-assistant.py", "personal_ai_assistant_interface"),
+}
+
+class StartupStep(NamedTuple):
+    """A timed step of the startup."""
+    name: str
+    seconds: float
+    error: str | None = None
+
+class StartupReport:
+    """Times the steps of the startup, so cold-start regressions show up in the log, and in a stored report to compare with."""
+
+    def __init__(self, started: float) -> None:
+        """
+        Args:
+            started (float): The `time.perf_counter` reading the startup began at.
+        """
+        self.__started = started
+        self.__steps: list[StartupStep] = []
+
+    #region Properties
+    @property
+    def steps(self) -> list[StartupStep]:
+        return list(self.__steps)
+
+    @property
+    def total(self) -> float:
+        """The seconds from the beginning of the startup to now."""
+        return time.perf_counter() - self.__started
+    #endregion
+
+    def measure(self, name: str, action: Callable[[], Any]) -> Any:
+        """
+        Runs a step of the startup and records how long it took. A failing step is recorded with its error, and returns None.
+
+        Args:
+            name (str): The name of the step.
+            action (Callable[[], Any]): The step.
+
+        Returns:
+            Any: The result of the step, or None if it failed.
+        """
+        started = time.perf_counter()
+        try:
+            result = action()
+        except Exception as error:
+            self.__steps.append(StartupStep(name, time.perf_counter() - started, f"{type(error).__name__}: {error}"))
+            return None
+        self.__steps.append(StartupStep(name, time.perf_counter() - started))
+        return result
+
+    def as_dict(self) -> dict[str, float]:
+        return {**{step.name: step.seconds for step in self.__steps}, "total": self.total}
+
+    def render(self) -> str:
+        lines = [f"{'startup step':<32}{'seconds':>10}"]
+        for step in self.__steps:
+            lines.append(f"{step.name:<32}{step.seconds:>10.3f}" + (f"  FAILED {step.error}" if step.error else ""))
+        lines.append(f"{'total':<32}{self.total:>10.3f}")
+        return "\n".join(lines)
+
+    def compare(self, baseline: dict[str, float], tolerance: float) -> list[str]:
+        """
+        Args:
+            baseline (dict[str, float]): A stored report, as returned by `as_dict`.
+            tolerance (float): The relative slowdown tolerated before a step counts as a regression, e.g. 0.2 for 20%.
+
+        Returns:
+            list[str]: A description of every step that got slower. Empty if there are none.
+        """
+        regressions: list[str] = []
+        for name, seconds in self.as_dict().items():
+            previous = baseline.get(name)
+            # steps well under 50 ms are too noisy to compare.
+            if previous is None or max(previous, seconds) < 0.05:
+                continue
+            if seconds > previous * (1 + tolerance):
+                regressions.append(f"{name}: {previous:.3f} s -> {seconds:.3f} s ({(seconds - previous) / previous:+.0%})")
+        return regressions
+
+def build_app(tools: list[str], report: StartupReport) -> Any:
+    """
+    Imports the selected tools and mounts their UIs as tabs of a single app.
+    A tool that fails to import, e.g. for a missing optional dependency, is left out with a warning.
+
+    Args:
+        tools (list[str]): The names of the tools, keys of TOOLS.
+        report (StartupReport): The report the import and the build of every tool are timed into.
+
+    Returns:
+        gr.TabbedInterface: The app.
+    """
+    gr = report.measure("import gradio", lambda: __import__("gradio"))
+    interfaces: list[Any] = []
+    tab_names: list[str] = []
+    for name in tools:
+        title, file_name, builder = TOOLS[name]
+        module = report.measure(f"import {name}", lambda: load_module(file_name))
+        interface = report.measure(f"build {name}", lambda: getattr(module, builder)()) if module is not None else None
+        if interface is None:
+            print(f"Warning: the {name} tool is left out, as it could not be loaded.")
+            continue
+        interfaces.append(interface)
+        tab_names.append(title)
+    if not interfaces:
+        raise RuntimeError("None of the tools could be loaded.")
+    return report.measure("build tabs", lambda: gr.TabbedInterface(interfaces, tab_names=tab_names, title="DeepSeek R1 Tools"))
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Serves all the tools as tabs of a single app, in a single process.")
+    parser.add_argument("--tools", nargs="+", choices=list(TOOLS), default=list(TOOLS))
+    parser.add_argument("--host", help="URL of the Ollama server, shared by every tool. OLLAMA_HOST if omitted.")
+    parser.add_argument("--max-in-flight", type=int, help="Requests sent to the Ollama server at the same time, by all tools together.")
+    parser.add_argument("--server-name", default="127.0.0.1")
+    parser.add_argument("--server-port", type=int, default=7860)
+    parser.add_argument("--no-preload", action="store_true", help="Loads the models on first use instead of at startup.")
+    parser.add_argument("--report-only", action="store_true", help="Builds the app, prints the startup report and exits without serving.")
+    parser.add_argument("--save-report", help="Stores the startup report as JSON, to compare later runs with.")
+    parser.add_argument("--baseline", help="Stored startup report to compare with. Exits with 1 on a regression.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Relative slowdown tolerated before a regression is reported.")
+    args = parser.parse_args(argv)
+
+    report = StartupReport(PROCESS_STARTED)
+    # one pool of clients for every tool: the settings apply to all of them, and so does the in-flight limit.
+    client_pool.configure(host=args.host, max_in_flight=args.max_in_flight)
+    app = build_app(args.tools, report)
+    if not args.no_preload and not args.report_only:
+        model_manager.preload()
+    if not args.report_only:
+        report.measure("launch", lambda: app.queue().launch(server_name=args.server_name, server_port=args.server_port, prevent_thread_lock=True))
+    print(report.render())
+
+    if args.save_report:
+        with open(args.save_report, "w", encoding="utf-8") as report_file:
+            json.dump(report.as_dict(), report_file, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            regressions = report.compare(json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions and args.report_only:
+            return 1
+    if not args.report_only:
+        app.block_thread()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
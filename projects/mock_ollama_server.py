@@ -0,0 +1,239 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterable
+
+class MockOllamaServer:
+    """
+    Deterministic local stand-in for the Ollama chat API, for measuring the connectors on a machine without a model.
+
+    Responses are pseudo-random words seeded by the request, so the same request always gets the same response,
+    preceded by a <think> block as DeepSeek R1 produces unless `think` is false, and cut off at `num_predict` tokens.
+    Time to first token and the token rate are simulated with sleeps, and the timing fields of the responses are filled
+    in as Ollama does. Requests with a `format` get a minimal JSON document valid for the schema, and non-streamed
+    requests asking for `logprobs` get a log-probability for every token. Other GET requests are answered with a synthetic
+    profile page, whose sections hold as many words as the first number in the path (e.g. /in/300), for the LinkedIn crawler,
+    unless the path ends with one of `missing_pages`.
+    """
+    WORDS: tuple[str, ...] = (
+        "the", "model", "response", "token", "latency", "report", "quarter", "market", "customer", "support",
+        "project", "update", "summary", "analysis", "result", "context", "request", "answer", "system", "data",
+    )
+
+    def __init__(self,
+                 token_rate: float = 200.0,
+                 time_to_first_token: float = 0.05,
+                 think_tokens: int = 32,
+                 response_tokens: int = 32,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 missing_pages: Iterable[str] = ()) -> None:
+        """
+        Args:
+            token_rate (float): The generated tokens per second, think block included.
+            time_to_first_token (float): The delay before the first token, standing for prompt evaluation, in seconds.
+            think_tokens (int): The number of words of the <think> block. No block if 0.
+            response_tokens (int): The number of words of the visible response.
+            host (str): The interface to listen on.
+            port (int): The port to listen on. A free one is picked if 0.
+            missing_pages (Iterable[str]): Endings of page paths answered with 404, e.g. '/details/certifications'.
+        """
+        if token_rate <= 0:
+            raise ValueError("token_rate must be positive.")
+        self.token_rate = token_rate
+        self.time_to_first_token = time_to_first_token
+        self.think_tokens = think_tokens
+        self.response_tokens = response_tokens
+        self.missing_pages: tuple[str, ...] = tuple(missing_pages)
+        self.__lock = threading.Lock()
+        self.__requests = 0
+        self.__server = ThreadingHTTPServer((host, port), self.__handler())
+        self.__server.daemon_threads = True
+        self.__thread: threading.Thread | None = None
+
+    #region Properties
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self) -> int:
+        """The number of chat requests served so far."""
+        return self.__requests
+    #endregion
+
+    def start(self) -> "MockOllamaServer":
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__server.serve_forever, name="mock-ollama", daemon=True)
+            self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+        self.__thread = None
+
+    def __enter__(self) -> "MockOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def tokens_for(self, request: dict[str, Any]) -> list[str]:
+        """
+        Args:
+            request (dict[str, Any]): The body of a chat request.
+
+        Returns:
+            list[str]: The tokens of the response to the request, think block included.
+        """
+        seed = hashlib.sha256(json.dumps(request.get("messages", []), sort_keys=True).encode("utf-8")).digest()
+        generator = random.Random(seed)
+        response_format = request.get("format")
+        if response_format:
+            visible = [json.dumps(self.example_for_schema(response_format))]
+        else:
+            visible = [f"{generator.choice(self.WORDS)} " for _ in range(self.response_tokens)]
+            visible[-1] = visible[-1].strip() + "."
+        if not self.think_tokens or request.get("think") is False:
+            return visible
+        thinking = [f"{generator.choice(self.WORDS)} " for _ in range(self.think_tokens)]
+        return ["<think>\n", *thinking, "\n</think>\n\n", *visible]
+
+    @staticmethod
+    def logprobs_for(tokens: list[str]) -> list[dict[str, Any]]:
+        """Returns deterministic log-probabilities for the tokens of a response, seeded by the response."""
+        generator = random.Random("".join(tokens))
+        return [{"token": token, "logprob": -generator.random()} for token in tokens]
+
+    @classmethod
+    def example_for_schema(cls, schema: Any) -> Any:
+        """Returns a minimal value valid for a JSON schema, or an empty object for plain JSON mode."""
+        if not isinstance(schema, dict):
+            return {}
+        if "enum" in schema:
+            return schema["enum"][0]
+        kind = schema.get("type", "object")
+        if kind == "object":
+            properties = schema.get("properties", {})
+            return {name: cls.example_for_schema(properties.get(name, {})) for name in schema.get("required", properties)}
+        return {"array": [], "string": "text", "integer": 0, "number": 0, "boolean": False, "null": None}.get(kind, {})
+
+    def __handler(self) -> type[BaseHTTPRequestHandler]:
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately; without this, delayed acknowledgements add ~40 ms to every response.
+            disable_nagle_algorithm = True
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path.rstrip("/") != "/api/chat":
+                    self.send_json({"error": f"{self.path} is not supported by the mock"}, status=404)
+                    return
+                mock.answer(self, request)
+
+            def do_GET(self) -> None:
+                if self.path.startswith("/api/"):
+                    self.send_json({"models": []})
+                    return
+                if mock.missing_pages and self.path.rstrip("/").endswith(mock.missing_pages):
+                    self.send_json({"error": "page not found"}, status=404)
+                    return
+                words = next((int(part) for part in self.path.split("/") if part.isdigit()), 100)
+                body = mock.profile_page(self.path, words).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_json(self, payload: dict[str, Any], status: int = 200) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def profile_page(self, path: str, words: int) -> str:
+        """Builds a deterministic profile page with navigation, scripts and the sections the crawler looks for."""
+        generator = random.Random(path)
+        sections = "".join(
+            f'<section id="{name}"><h2>{name.title()}</h2><p>{" ".join(generator.choice(self.WORDS) for _ in range(words))}.</p></section>'
+            for name in ("about", "experience", "education", "skills", "certifications")
+        )
+        return (
+            "<html><head><title>Profile</title><script>var tracking = {};</script><style>body {}</style></head>"
+            f"<body><nav>Home Jobs Messaging</nav><main>{sections}</main><footer>About Privacy Terms</footer></body></html>"
+        )
+
+    def answer(self, handler: Any, request: dict[str, Any]) -> None:
+        """Answers a chat request on the connection of the handler, streamed or not, with the simulated timing."""
+        started = time.perf_counter()
+        with self.__lock:
+            self.__requests += 1
+        tokens = self.tokens_for(request)
+        num_predict = (request.get("options") or {}).get("num_predict")
+        if num_predict is not None and num_predict >= 0:
+            tokens = tokens[:num_predict]
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in request.get("messages", [])) // 4
+        base = {"model": request.get("model", ""), "created_at": datetime.now(timezone.utc).isoformat()}
+
+        def final(eval_started: float) -> dict[str, Any]:
+            finished = time.perf_counter()
+            return {
+                **base,
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int((finished - started) * 1e9),
+                "load_duration": 0,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int((eval_started - started) * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int((finished - eval_started) * 1e9),
+            }
+
+        time.sleep(self.time_to_first_token)
+        eval_started = time.perf_counter()
+        if not request.get("stream", True):
+            time.sleep(len(tokens) / self.token_rate)
+            payload = {**final(eval_started), "message": {"role": "assistant", "content": "".join(tokens)}}
+            if request.get("logprobs"):
+                payload["logprobs"] = self.logprobs_for(tokens)
+            handler.send_json(payload)
+            return
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def send_chunk(payload: dict[str, Any]) -> None:
+            data = (json.dumps(payload) + "\n").encode("utf-8")
+            handler.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            handler.wfile.flush()
+
+        try:
+            for position, token in enumerate(tokens):
+                # sleep until the token is due, so the rate does not drift with the time spent writing.
+                delay = eval_started + (position + 1) / self.token_rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                send_chunk({**base, "done": False, "message": {"role": "assistant", "content": token}})
+            final_part = final(eval_started)
+            send_chunk({**final_part, "message": {"role": "assistant", "content": ""}})
+            handler.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # the client stopped reading the stream.
+            pass
@@ -0,0 +1,178 @@
+import math
+import threading
+from collections import Counter
+from enum import Enum
+from typing import Any, Callable, NamedTuple, Sequence
+from reasoning_filter import strip_reasoning
+from telemetry import telemetry
+
+class ConfidenceMethod(Enum):
+    """How the answer of the small model of a cascade is judged."""
+    # the answer is one the task accepts, e.g. a known label.
+    LABEL = "label"
+    # the probability of the least likely token of the answer, as reported by the server. Falls back to LABEL without log-probs.
+    # The weakest token rather than the mean, as the tokens forced by a JSON schema are certain and would hide an unsure label.
+    LOGPROBS = "logprobs"
+    # the share of several sampled answers agreeing with the most common one.
+    SELF_CONSISTENCY = "self_consistency"
+
+class CascadeConfig(NamedTuple):
+    """
+    The cascade of a task: the small model answers first, and the large one only when the small one is not confident enough.
+    A valid answer is required by every method - an invalid one always escalates.
+    """
+    small_model: str = "deepseek-r1:1.5b"
+    large_model: str = "deepseek-r1:8b"
+    method: ConfidenceMethod = ConfidenceMethod.LABEL
+    threshold: float = 0.5
+    samples: int = 3
+    sample_temperature: float = 0.7
+
+    @property
+    def sample_count(self) -> int:
+        """The number of answers requested from the small model."""
+        return max(self.samples, 2) if self.method is ConfidenceMethod.SELF_CONSISTENCY else 1
+
+def visible_logprobs(logprobs: Sequence[Any]) -> list[float]:
+    """
+    Args:
+        logprobs (Sequence[Any]): The log-probs of the tokens of a response, with `token` and `logprob` attributes.
+
+    Returns:
+        list[float]: The log-probs of the tokens after the reasoning block, whitespace tokens excluded.
+    """
+    text = ""
+    visible: list[float] = []
+    # tokens before the end of the reasoning are left out, unless the response has no reasoning block at all.
+    reasoning_ended = not any("<think>" in (entry.token or "").lower() for entry in logprobs[:8])
+    for entry in logprobs:
+        if reasoning_ended and (entry.token or "").strip():
+            visible.append(entry.logprob)
+        text += entry.token or ""
+        if not reasoning_ended and "</think>" in text[-16:].lower():
+            reasoning_ended = True
+    return visible
+
+def score(responses: Sequence[Any], is_valid: Callable[[str], bool], method: ConfidenceMethod) -> tuple[int, float]:
+    """
+    Judges the answers of the small model of a cascade.
+
+    Args:
+        responses (Sequence[Any]): The ChatResponses of the small model. Several only for self-consistency.
+        is_valid (Callable[[str], bool]): Whether an answer, without its reasoning, is one the task accepts.
+        method (ConfidenceMethod): How confidence is measured.
+
+    Returns:
+        tuple[int, float]: The index of the response to keep, and the confidence in it, between 0 and 1.
+    """
+    answers = [strip_reasoning(response.message.content or "") for response in responses]
+    valid = [index for index, answer in enumerate(answers) if is_valid(answer)]
+    if not valid:
+        return 0, 0.0
+    if method is ConfidenceMethod.SELF_CONSISTENCY:
+        votes = Counter(" ".join(answers[index].lower().split()) for index in valid)
+        majority, count = votes.most_common(1)[0]
+        chosen = next(index for index in valid if " ".join(answers[index].lower().split()) == majority)
+        return chosen, count / len(responses)
+    if method is ConfidenceMethod.LOGPROBS and getattr(responses[0], "logprobs", None):
+        logprobs = visible_logprobs(responses[0].logprobs)
+        if logprobs:
+            return 0, math.exp(min(logprobs))
+    return (0, 1.0) if valid[0] == 0 else (0, 0.0)
+
+class CascadeReport(NamedTuple):
+    """How often the cascade of a task escalated, and how much latency answering with the small model saved."""
+    task: str
+    requests: int
+    escalations: int
+    small_seconds: float
+    large_seconds: float
+    saved_seconds: float
+
+    @property
+    def escalation_rate(self) -> float:
+        return self.escalations / self.requests if self.requests else 0.0
+
+class _CascadeTotals:
+    """The running totals of the cascade of a single task. Guarded by the lock of the stats."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.escalations = 0
+        self.small_seconds = 0.0
+        self.large_seconds = 0.0
+
+class CascadeStats:
+    """
+    Collects the outcome of every cascaded request per task. The latency saved is estimated from the mean latency of the
+    large model on the escalated requests of the task, against the time the small model took on all of them.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__tasks: dict[str, _CascadeTotals] = {}
+
+    def record(self, task: str, small_seconds: float, large_seconds: float | None) -> None:
+        """
+        Args:
+            task (str): The task, e.g. the name of the connector class.
+            small_seconds (float): The time the small model took.
+            large_seconds (float | None): The time the large model took, or None if the request did not escalate.
+        """
+        with self.__lock:
+            totals = self.__tasks.setdefault(task, _CascadeTotals())
+            totals.requests += 1
+            totals.small_seconds += small_seconds
+            if large_seconds is not None:
+                totals.escalations += 1
+                totals.large_seconds += large_seconds
+
+    def report(self) -> list[CascadeReport]:
+        """
+        Returns:
+            list[CascadeReport]: The totals of every task seen so far. Nothing is counted as saved before a first escalation.
+        """
+        with self.__lock:
+            reports: list[CascadeReport] = []
+            for task, totals in self.__tasks.items():
+                saved = 0.0
+                if totals.escalations:
+                    mean_large = totals.large_seconds / totals.escalations
+                    saved = (totals.requests - totals.escalations) * mean_large - totals.small_seconds
+                reports.append(CascadeReport(task, totals.requests, totals.escalations, totals.small_seconds, totals.large_seconds, saved))
+            return reports
+
+    def render(self) -> str:
+        lines = [f"{'task':<32}{'requests':>10}{'escalated':>11}{'small s':>10}{'large s':>10}{'saved s':>10}"]
+        for report in self.report():
+            lines.append(f"{report.task:<32}{report.requests:>10}{report.escalation_rate:>11.1%}"
+                         f"{report.small_seconds:>10.2f}{report.large_seconds:>10.2f}{report.saved_seconds:>10.2f}")
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        """
+        Returns:
+            str: The cascaded requests, escalations, time per model and estimated time saved per task, in the Prometheus text format.
+        """
+        prefix = f"{telemetry.PREFIX}_cascade"
+        reports = self.report()
+        lines: list[str] = []
+        for name, kind, description, value in (
+            ("requests_total", "counter", "Requests answered through a model cascade.", lambda report: report.requests),
+            ("escalations_total", "counter", "Cascaded requests the large model answered.", lambda report: report.escalations),
+            ("small_seconds_total", "counter", "Time spent on the small model of the cascade.", lambda report: report.small_seconds),
+            ("large_seconds_total", "counter", "Time spent on the large model of the cascade.", lambda report: report.large_seconds),
+            ("saved_seconds", "gauge", "Estimated time saved against sending every request to the large model.", lambda report: report.saved_seconds),
+        ):
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for report in reports:
+                lines.append(f'{prefix}_{name}{{task="{report.task}"}} {value(report)}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__tasks.clear()
+
+cascade_stats: CascadeStats = CascadeStats()
+telemetry.add_collector(cascade_stats.prometheus)
@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum
+from typing import Any, Iterable, NamedTuple
+from ollama_client_pool import client_pool
+
+class ModelState(Enum):
+    """The load state of a model, as far as this process knows."""
+    REGISTERED = "registered"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+class ModelStatus(NamedTuple):
+    """The load state and load metrics of a model."""
+    model_id: str
+    state: ModelState
+    load_seconds: float | None
+    warm_up_seconds: float | None
+    requests: int
+    cold_loads: int
+    error: str | None
+
+class _ModelRecord:
+    """The mutable state of a single model. Guarded by the lock of the manager."""
+
+    def __init__(self, model_id: str) -> None:
+        self.model_id = model_id
+        self.state = ModelState.REGISTERED
+        self.load_seconds: float | None = None
+        self.warm_up_seconds: float | None = None
+        self.requests = 0
+        self.cold_loads = 0
+        self.error: str | None = None
+        self.ready = threading.Event()
+        self.num_ctx: int | None = None
+
+    def status(self) -> ModelStatus:
+        return ModelStatus(self.model_id, self.state, self.load_seconds, self.warm_up_seconds, self.requests, self.cold_loads, self.error)
+
+class ModelManager:
+    """
+    Process-wide registry of the models used by the connectors, which keeps them loaded in Ollama.
+
+    Every connector registers its model. At application start `preload` warms all of them up with a one-token generation,
+    so the multi-second load happens before the first user arrives, and every request asks Ollama to keep its model loaded
+    for `keep_alive` (the OLLAMA_KEEP_ALIVE environment variable, 30 minutes by default; -1 pins the model until the server stops).
+    Requests that still hit a cold model are counted, from the load duration Ollama reports.
+
+    Ollama reloads a model whenever a request asks for another context window than the one it is loaded with, so every model
+    gets a single window, the largest its connectors register, and the warm-up and every request are sent with it.
+    """
+    DEFAULT_KEEP_ALIVE: str = "30m"
+    WARM_UP_PROMPT: str = "Hi"
+    # a load duration above this in a response means the model was not loaded when the request arrived.
+    COLD_LOAD_THRESHOLD: float = 0.5
+
+    def __init__(self, keep_alive: str | float | None = None) -> None:
+        """
+        Args:
+            keep_alive (str | float | None): How long Ollama keeps a model loaded after a request, e.g. "30m", 3600 or -1.
+                OLLAMA_KEEP_ALIVE or the default if None.
+        """
+        self.__lock = threading.Lock()
+        self.__models: dict[str, _ModelRecord] = {}
+        self.__keep_alive: str | float = keep_alive if keep_alive is not None else self.__parse_keep_alive(
+            os.getenv("OLLAMA_KEEP_ALIVE", self.DEFAULT_KEEP_ALIVE)
+        )
+
+    #region Properties
+    @property
+    def keep_alive(self) -> str | float:
+        return self.__keep_alive
+
+    @keep_alive.setter
+    def keep_alive(self, value: str | float) -> None:
+        self.__keep_alive = self.__parse_keep_alive(value)
+
+    @property
+    def models(self) -> list[str]:
+        with self.__lock:
+            return list(self.__models)
+    #endregion
+
+    def register(self, model_id: str, num_ctx: int | None = None) -> None:
+        """
+        Adds a model to the registry. Registering a model again only widens its context window, if a larger one is asked for.
+
+        Args:
+            model_id (str): The Ollama model.
+            num_ctx (int | None): The context window the caller needs. The server default is kept if no caller asks for one.
+        """
+        with self.__lock:
+            record = self.__models.get(model_id)
+            if record is None:
+                record = self.__models[model_id] = _ModelRecord(model_id)
+            if num_ctx is not None and (record.num_ctx is None or num_ctx > record.num_ctx):
+                record.num_ctx = num_ctx
+
+    def context_window(self, model_id: str) -> int | None:
+        """
+        Returns:
+            int | None: The context window every request to the model is sent with, or None for the server default.
+        """
+        with self.__lock:
+            record = self.__models.get(model_id)
+            return record.num_ctx if record is not None else None
+
+    def warm_up(self, model_id: str) -> ModelStatus:
+        """
+        Loads a model with its context window and generates a single token with it, so the model and its runner are ready
+        for the next request.
+
+        Args:
+            model_id (str): The Ollama model. Registered if it is not yet.
+
+        Returns:
+            ModelStatus: The state of the model after the warm-up.
+        """
+        self.register(model_id)
+        with self.__lock:
+            record = self.__models[model_id]
+            record.state = ModelState.LOADING
+            record.ready.clear()
+            # loaded with another window, the model would be loaded again by the first request.
+            options: dict[str, object] = {"num_predict": 1} if record.num_ctx is None else {"num_predict": 1, "num_ctx": record.num_ctx}
+        started = time.perf_counter()
+        try:
+            response = client_pool.sync_client().chat(model=model_id,
+                                                      messages=[{"role": "user", "content": self.WARM_UP_PROMPT}],
+                                                      stream=False,
+                                                      options=options,
+                                                      keep_alive=self.__keep_alive)
+        except Exception as error:
+            with self.__lock:
+                record.state = ModelState.FAILED
+                record.error = f"{type(error).__name__}: {error}"
+                record.ready.set()
+                return record.status()
+        with self.__lock:
+            record.state = ModelState.READY
+            record.error = None
+            record.warm_up_seconds = time.perf_counter() - started
+            record.load_seconds = (response.load_duration or 0) / 1e9
+            record.ready.set()
+            return record.status()
+
+    def preload(self, model_ids: Iterable[str] | None = None, wait: bool = False) -> list[Future[ModelStatus]]:
+        """
+        Warms up models concurrently, in the background.
+
+        Args:
+            model_ids (Iterable[str] | None): The models to warm up. Every registered model if None.
+            wait (bool): Whether to return only when all of them are ready or failed.
+
+        Returns:
+            list[Future[ModelStatus]]: The pending warm-ups.
+        """
+        model_ids = list(model_ids) if model_ids is not None else self.models
+        for model_id in model_ids:
+            self.register(model_id)
+        if not model_ids:
+            return []
+        executor = ThreadPoolExecutor(max_workers=len(model_ids), thread_name_prefix="warm-up")
+        futures = [executor.submit(self.warm_up, model_id) for model_id in model_ids]
+        executor.shutdown(wait=wait)
+        return futures
+
+    def wait_until_ready(self, model_id: str, timeout: float | None = None) -> bool:
+        """
+        Waits for a warm-up of the model in progress to finish.
+
+        Returns:
+            bool: Whether the model is ready. False if it failed to load, was never warmed up, or the timeout expired.
+        """
+        with self.__lock:
+            record = self.__models.get(model_id)
+        if record is None or record.state == ModelState.REGISTERED:
+            return False
+        return record.ready.wait(timeout) and record.state == ModelState.READY
+
+    def observe(self, model_id: str, response: Any) -> None:
+        """
+        Records a completed request, and whether the model had to be loaded for it.
+
+        Args:
+            model_id (str): The model queried.
+            response (Any): The ChatResponse, or the final part of a streamed one.
+        """
+        load_seconds = (getattr(response, "load_duration", None) or 0) / 1e9
+        with self.__lock:
+            record = self.__models.get(model_id)
+            if record is None:
+                record = self.__models[model_id] = _ModelRecord(model_id)
+            record.requests += 1
+            if load_seconds >= self.COLD_LOAD_THRESHOLD:
+                record.cold_loads += 1
+                record.load_seconds = load_seconds
+            if record.state != ModelState.LOADING:
+                record.state = ModelState.READY
+                record.ready.set()
+
+    def status(self) -> list[ModelStatus]:
+        """
+        Returns:
+            list[ModelStatus]: The state and load metrics of every registered model.
+        """
+        with self.__lock:
+            return [record.status() for record in self.__models.values()]
+
+    def loaded_models(self) -> dict[str, dict[str, Any]]:
+        """
+        Asks Ollama which models it holds in memory right now.
+
+        Returns:
+            dict[str, dict[str, Any]]: For every loaded model, when it will be unloaded and how much memory it takes.
+        """
+        return {
+            model.model or model.name or "": {"expires_at": model.expires_at, "size": model.size, "size_vram": model.size_vram}
+            for model in client_pool.sync_client().ps().models
+        }
+
+    @staticmethod
+    def __parse_keep_alive(value: str | float) -> str | float:
+        """Ollama accepts durations such as "30m" and numbers of seconds, where a negative number means forever."""
+        if isinstance(value, str):
+            try:
+                return float(value)
+            except ValueError:
+                return value.strip()
+        return value
+
+model_manager: ModelManager = ModelManager()
@@ -1,63 +1,263 @@
+import json
+import re
+from enum import Enum
+from typing import Any, NamedTuple
 import gradio as gr
+from batch_inference import run_batch
 from deepseek_connector import DeepSeekR1LocalConnector
+from model_manager import model_manager
+from prompt_layout import PromptPrefix
+from session_manager import SessionManager
+from document_preprocessing import iter_spans
+
+class EntityLabel(Enum):
+    """The entity labels of the spaCy English models."""
+    PERSON = "PERSON"
+    NORP = "NORP"
+    FAC = "FAC"
+    ORG = "ORG"
+    GPE = "GPE"
+    LOC = "LOC"
+    PRODUCT = "PRODUCT"
+    EVENT = "EVENT"
+    WORK_OF_ART = "WORK_OF_ART"
+    LAW = "LAW"
+    LANGUAGE = "LANGUAGE"
+    DATE = "DATE"
+    TIME = "TIME"
+    PERCENT = "PERCENT"
+    MONEY = "MONEY"
+    QUANTITY = "QUANTITY"
+    ORDINAL = "ORDINAL"
+    CARDINAL = "CARDINAL"
+
+class Entity(NamedTuple):
+    """A named entity, located by the character offsets of its mention in the whole text."""
+    start: int
+    end: int
+    label: EntityLabel
+    text: str
+
+def select_entities(entities: list[Entity]) -> list[Entity]:
+    """
+    Removes duplicate and overlapping entities (e.g. the same mention found by two overlapping shards),
+    preferring the longer span, as spaCy's `filter_spans` does. A spaCy `Doc` does not allow overlapping entities.
+
+    Args:
+        entities (list[Entity]): The entities, in any order.
+
+    Returns:
+        list[Entity]: Non-overlapping entities, ordered by their offsets.
+    """
+    selected: list[Entity] = []
+    taken: set[int] = set()
+    for entity in sorted(set(entities), key=lambda entity: (-(entity.end - entity.start), entity.start, entity.label.value)):
+        if not any(position in taken for position in range(entity.start, entity.end)):
+            selected.append(entity)
+            taken.update(range(entity.start, entity.end))
+    return sorted(selected)
+
+def to_spacy_json(text: str, entities: list[Entity]) -> dict[str, Any]:
+    """
+    Args:
+        text (str): The whole text.
+        entities (list[Entity]): Non-overlapping entities of the text.
+
+    Returns:
+        dict[str, Any]: The text and entities in the form of `spacy.tokens.Doc.to_json`, accepted by `Doc.from_json`.
+    """
+    return {
+        "text": text,
+        "ents": [{"start": entity.start, "end": entity.end, "label": entity.label.value} for entity in entities],
+    }
+
+def to_spacy_doc(nlp: Any, text: str, entities: list[Entity]) -> Any:
+    """
+    Builds a spaCy `Doc` with the entities set as `doc.ents`. Spans are expanded to token boundaries.
+
+    Args:
+        nlp (Any): A spaCy `Language`, e.g. `spacy.blank("en")`. spaCy itself is only needed by the caller.
+        text (str): The whole text.
+        entities (list[Entity]): Non-overlapping entities of the text.
+
+    Returns:
+        spacy.tokens.Doc: The document.
+    """
+    doc = nlp.make_doc(text)
+    spans = [doc.char_span(entity.start, entity.end, label=entity.label.value, alignment_mode="expand") for entity in entities]
+    doc.ents = select_spans([span for span in spans if span is not None])
+    return doc
+
+def select_spans(spans: list[Any]) -> list[Any]:
+    """Removes spaCy spans that overlap after expansion to token boundaries, preferring the longer ones."""
+    selected: list[Any] = []
+    taken: set[int] = set()
+    for span in sorted(spans, key=lambda span: (-(span.end - span.start), span.start)):
+        if not any(token in taken for token in range(span.start, span.end)):
+            selected.append(span)
+            taken.update(range(span.start, span.end))
+    return sorted(selected, key=lambda span: span.start)
 
 class DeepSeekR1NERExtractor(DeepSeekR1LocalConnector):
     SYSTEM_BEHAVIOR = (
         "You are assisting the user in extracting named entities from text. "
         "You will receive a text input and your task is to identify and extract named entities from it.\n"
         "You will respond ONLY with a bulleted list of named entities, compatible with SpaCy.\n"
-        "Here are some examples of text provided and named entities extracted to follow:\n"
-        "\"\"\""
-        "Example 1:\n"
-        "Text: 'Apple Inc. is looking at buying U.K. startup for $1 billion'\n"
-        "Named Entities:\n"
-        "- [ORG] Apple Inc.\n"
-        "- [GPE] U.K.\n"
-        "- [MONEY] $1 billion\n"
-        "Example 2:\n"
-        "Text: 'Barack Obama was the 44th President of the United States.'\n"
-        "Named Entities:\n"
-        "- [PERSON] Barack Obama\n"
-        "- [ORDINAL] 44th\n"
-        "- [ORG] President of the United States\n"
-        "Example 3:\n"
-        "Text: 'The Eiffel Tower is located in Paris.'\n"
-        "Named Entities:\n"
-        "- [LOC] Eiffel Tower\n"
-        "- [GPE] Paris\n"
-        "Example 4:\n"
-        "Text: 'On July 20, 1969, Neil Armstrong became the first person to walk on the moon.'\n"
-        "Named Entities:\n"
-        "- [DATE] July 20, 1969\n"
-        "- [PERSON] Neil Armstrong\n"
-        "- [ORDINAL] first\n"
-        "- [LOC] moon\n"
-        "Example 5:\n"
-        "Text: 'Microsoft Corporation announced its new product in Redmond, Washington.'\n"
-        "Named Entities:\n"
-        "- [ORG] Microsoft Corporation\n"
-        "- [GPE] Redmond\n"
-        "- [GPE] Washington\n"
-        "\"\"\""
+        "Follow the examples of texts provided and named entities extracted that precede the request."
+    )
+    # sent as conversation turns after the system prompt, in the exact format of the requests.
+    FEW_SHOT_EXAMPLES: list[tuple[str, str]] = [
+        ("Apple Inc. is looking at buying U.K. startup for $1 billion",
+         "- [ORG] Apple Inc.\n- [GPE] U.K.\n- [MONEY] $1 billion"),
+        ("Barack Obama was the 44th President of the United States.",
+         "- [PERSON] Barack Obama\n- [ORDINAL] 44th\n- [ORG] President of the United States"),
+        ("The Eiffel Tower is located in Paris.",
+         "- [LOC] Eiffel Tower\n- [GPE] Paris"),
+        ("On July 20, 1969, Neil Armstrong became the first person to walk on the moon.",
+         "- [DATE] July 20, 1969\n- [PERSON] Neil Armstrong\n- [ORDINAL] first\n- [LOC] moon"),
+        ("Microsoft Corporation announced its new product in Redmond, Washington.",
+         "- [ORG] Microsoft Corporation\n- [GPE] Redmond\n- [GPE] Washington"),
+    ]
+
+    # the JSON-constrained shard requests of `extract_entities` get a prefix of their own, with the examples above
+    # answered in the shape of ENTITIES_SCHEMA, so the prompt never shows two output formats.
+    SHARD_SYSTEM_BEHAVIOR = (
+        "You are assisting the user in extracting named entities from text. "
+        "You will receive a text input and your task is to identify and extract named entities from it.\n"
+        "You will respond ONLY with a JSON object whose 'entities' array lists every named entity "
+        "as an object with its 'text', as written in the text, and its SpaCy 'label'.\n"
+        "Follow the examples of texts provided and named entities extracted that precede the request."
     )
+    SHARD_PROMPT: str = "Text: {text}\nRespond ONLY with a JSON object listing the named entities of the text and their labels."
+
+    # shards are kept well below the context window: small shards are processed in parallel and keep the recall high.
+    SHARD_TOKENS: int = 512
+    SHARD_OVERLAP_TOKENS: int = 48
+    ENTITIES_SCHEMA: dict[str, Any] = {
+        "type": "object",
+        "properties": {
+            "entities": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "text": {"type": "string"},
+                        "label": {"type": "string", "enum": [label.value for label in EntityLabel]},
+                    },
+                    "required": ["text", "label"],
+                },
+            },
+        },
+        "required": ["entities"],
+    }
 
     def __init__(self):
-        super().__init__(system_behavior=self.SYSTEM_BEHAVIOR, model_id="deepseek-r1:8b")
+        super().__init__(system_behavior=self.SYSTEM_BEHAVIOR, model_id=self.MODEL_ID, stateless=True)
+        self.__shard_prefix = PromptPrefix(self.SHARD_SYSTEM_BEHAVIOR, [
+            (self.SHARD_PROMPT.format(text=text), self.__as_entities_json(entities)) for text, entities in self.FEW_SHOT_EXAMPLES
+        ], name="shard")
+
+    @property
+    def _few_shot_examples(self) -> list[tuple[str, str]]:
+        return [(self._build_prompt(text), entities) for text, entities in self.FEW_SHOT_EXAMPLES]
 
     def ask(self, request: str) -> str:
+        self._add_user_message(self._build_prompt(request))
+        return self._query()
+
+    def _build_prompt(self, request: str) -> str:
         if not request or request.strip() == "":
             raise ValueError("Request cannot be empty.")
-        prompt = f"Text: {request}\nNamed Entities:\n"
-        self._add_user_message(prompt)
-        return self._query()
+        return f"Text: {request}\nNamed Entities:\n"
 
-if __name__ == "__main__":
-    ner_extractor = DeepSeekR1NERExtractor()
-    ner_extractor_interface = gr.Interface(
-        fn=ner_extractor.ask,
-        inputs=gr.Textbox(label="Text Input", placeholder="Enter the text from which you want to extract named entities..."),
-        outputs=gr.Textbox(label="Extracted Named Entities", placeholder="The named entities will be listed here...", show_copy_button=True),
-        title="Named Entity Recognition Extractor",
-        description="This tool extracts named entities from the provided text. It identifies people, organizations, locations, dates, and other relevant information."
+    def extract_entities(self, text: str, concurrency: int = 4) -> list[Entity]:
+        """
+        Extracts the named entities of a text of any length. The text is sharded on sentence boundaries,
+        the shards are processed concurrently with JSON-constrained output, and every mention of an extracted entity
+        is located in its shard.
+
+        Args:
+            text (str): The text.
+            concurrency (int): The maximum number of shards processed at the same time.
+
+        Returns:
+            list[Entity]: Non-overlapping entities, ordered by their offsets.
+        """
+        if not text or text.strip() == "":
+            raise ValueError("Request cannot be empty.")
+        entities: list[Entity] = []
+        for result in run_batch(iter_spans(text, self.SHARD_TOKENS, self.SHARD_OVERLAP_TOKENS),
+                                lambda span: self.__extract_shard(text, *span),
+                                concurrency=concurrency):
+            if not result.ok:
+                raise RuntimeError(f"Extracting entities from shard {result.index + 1} failed: {result.error}")
+            entities.extend(Entity(start, end, EntityLabel(label), text[start:end])
+                            for start, end, label in json.loads(result.response or "[]"))
+        return select_entities(entities)
+
+    def extract_document(self, text: str, concurrency: int = 4) -> dict[str, Any]:
+        """
+        Extracts the named entities of a text in the spaCy `Doc` JSON form, ready for `Doc.from_json`.
+        See `extract_entities`.
+        """
+        return to_spacy_json(text, self.extract_entities(text, concurrency))
+
+    def __extract_shard(self, text: str, start: int, end: int) -> str:
+        """
+        Extracts the entities of a shard and locates their mentions.
+        The located entities are returned serialized as [start, end, label] triples, so they can be cached and retried as text.
+        """
+        shard = text[start:end]
+        response = self._complete(self.SHARD_PROMPT.format(text=shard), response_format=self.ENTITIES_SCHEMA, prefix=self.__shard_prefix)
+        try:
+            found = json.loads(response).get("entities", [])
+        except (json.JSONDecodeError, AttributeError) as error:
+            raise ValueError(f"The model did not respond with the entities object: {error}") from error
+        located: list[tuple[int, int, str]] = []
+        for item in found:
+            mention, label = str(item.get("text", "")).strip(), str(item.get("label", "")).upper()
+            if not mention or label not in EntityLabel.__members__:
+                continue
+            # a mention must stand on its own - "Paris" is not an entity inside "Parisian".
+            for match in re.finditer(rf"(?<!\w){re.escape(mention)}(?!\w)", shard):
+                located.append((start + match.start(), start + match.end(), label))
+        return json.dumps(located)
+
+    @staticmethod
+    def __as_entities_json(bullets: str) -> str:
+        """Turns the bulleted answer of a few-shot example, '- [LABEL] text' per line, into its ENTITIES_SCHEMA form."""
+        entities = []
+        for line in bullets.splitlines():
+            match = re.fullmatch(r"-\s*\[(\w+)\]\s*(.+)", line.strip())
+            if match:
+                entities.append({"text": match.group(2), "label": match.group(1)})
+        return json.dumps({"entities": entities}, ensure_ascii=False)
+
+def ner_extractor_interface() -> gr.Blocks:
+    """Builds the UI of the entity extractor. The connector is stateless, so every session shares one."""
+    ner_sessions: SessionManager[DeepSeekR1NERExtractor] = SessionManager(DeepSeekR1NERExtractor, shared=True)
+    interface: gr.TabbedInterface = gr.TabbedInterface(
+        [
+            gr.Interface(
+                fn=ner_sessions.handler("ask_stream_async"),
+                inputs=gr.Textbox(label="Text Input", placeholder="Enter the text from which you want to extract named entities..."),
+                outputs=gr.Textbox(label="Extracted Named Entities", placeholder="The named entities will be listed here...", buttons=["copy"]),
+                title="Named Entity Recognition Extractor",
+                description="This tool extracts named entities from the provided text. It identifies people, organizations, locations, dates, and other relevant information."
+            ),
+            gr.Interface(
+                fn=ner_sessions.handler("extract_document"),
+                inputs=gr.Textbox(label="Document", placeholder="Enter the document from which you want to extract named entities...", lines=12),
+                outputs=gr.JSON(label="spaCy Doc JSON"),
+                title="Document Named Entity Recognition",
+                description="Extracts named entities from long documents in parallel, with character offsets, in the JSON form of spaCy documents."
+            ),
+        ],
+        tab_names=["Text", "Document"],
     )
-    ner_extractor_interface.queue().launch()
\ No newline at end of file
+    return ner_sessions.attach(interface)
+
+if __name__ == "__main__":
+    interface = ner_extractor_interface()
+    model_manager.preload()
+    interface.queue().launch()
\ No newline at end of file
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
+import httpx
+from ollama import AsyncClient, Client
+
+class OllamaClientPool:
+    """
+    Process-wide pool of ollama clients shared by every connector.
+
+    A single synchronous client and one asynchronous client per event loop are created lazily, each backed by
+    a keep-alive connection pool, so requests reuse connections to the Ollama server instead of opening new ones.
+    The number of requests in flight is bounded separately for the synchronous and the asynchronous paths.
+    Defaults are read from the OLLAMA_HOST, OLLAMA_TIMEOUT, OLLAMA_CONNECT_TIMEOUT and OLLAMA_MAX_IN_FLIGHT environment variables.
+    """
+    DEFAULT_TIMEOUT: float = 300.0
+    DEFAULT_CONNECT_TIMEOUT: float = 5.0
+    DEFAULT_MAX_IN_FLIGHT: int = 8
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__host: str | None = os.getenv("OLLAMA_HOST") or None
+        self.__timeout: float = float(os.getenv("OLLAMA_TIMEOUT", self.DEFAULT_TIMEOUT))
+        self.__connect_timeout: float = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", self.DEFAULT_CONNECT_TIMEOUT))
+        self.__max_in_flight: int = int(os.getenv("OLLAMA_MAX_IN_FLIGHT", self.DEFAULT_MAX_IN_FLIGHT))
+        self.__sync_client: Client | None = None
+        self.__sync_slots = threading.BoundedSemaphore(self.__max_in_flight)
+        # httpx async clients and asyncio semaphores are bound to the loop they were first used on.
+        self.__async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncClient] = weakref.WeakKeyDictionary()
+        self.__async_slots: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = weakref.WeakKeyDictionary()
+
+    #region Properties
+    @property
+    def host(self) -> str | None:
+        return self.__host
+
+    @property
+    def timeout(self) -> float:
+        return self.__timeout
+
+    @property
+    def max_in_flight(self) -> int:
+        return self.__max_in_flight
+    #endregion
+
+    def configure(self,
+                  host: str | None = None,
+                  timeout: float | None = None,
+                  connect_timeout: float | None = None,
+                  max_in_flight: int | None = None) -> None:
+        """
+        Changes the settings of the pool. Clients created before are dropped, so the settings apply to the following requests.
+
+        Args:
+            host (str | None): The URL of the Ollama server.
+            timeout (float | None): The read timeout of a request, in seconds.
+            connect_timeout (float | None): The timeout of establishing a connection, in seconds.
+            max_in_flight (int | None): The maximum number of requests sent to the server at the same time.
+        """
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1.")
+        with self.__lock:
+            self.__host = host or self.__host
+            self.__timeout = timeout if timeout is not None else self.__timeout
+            self.__connect_timeout = connect_timeout if connect_timeout is not None else self.__connect_timeout
+            if max_in_flight is not None:
+                self.__max_in_flight = max_in_flight
+                self.__sync_slots = threading.BoundedSemaphore(max_in_flight)
+            self.__sync_client = None
+            self.__async_clients.clear()
+            self.__async_slots.clear()
+
+    def sync_client(self) -> Client:
+        """
+        Returns:
+            Client: The shared synchronous client.
+        """
+        with self.__lock:
+            if self.__sync_client is None:
+                self.__sync_client = Client(host=self.__host, timeout=self.__httpx_timeout(), limits=self.__httpx_limits())
+            return self.__sync_client
+
+    def async_client(self) -> AsyncClient:
+        """
+        Returns:
+            AsyncClient: The shared asynchronous client of the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self.__lock:
+            client = self.__async_clients.get(loop)
+            if client is None:
+                client = AsyncClient(host=self.__host, timeout=self.__httpx_timeout(), limits=self.__httpx_limits())
+                self.__async_clients[loop] = client
+            return client
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Holds one of the synchronous in-flight slots for the duration of a request."""
+        slots = self.__sync_slots
+        with slots:
+            yield
+
+    @asynccontextmanager
+    async def async_slot(self) -> AsyncIterator[None]:
+        """Holds one of the in-flight slots of the running event loop for the duration of a request."""
+        loop = asyncio.get_running_loop()
+        with self.__lock:
+            slots = self.__async_slots.get(loop)
+            if slots is None:
+                slots = asyncio.Semaphore(self.__max_in_flight)
+                self.__async_slots[loop] = slots
+        async with slots:
+            yield
+
+    def __httpx_timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.__timeout, connect=self.__connect_timeout)
+
+    def __httpx_limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.__max_in_flight, max_keepalive_connections=self.__max_in_flight)
+
+client_pool: OllamaClientPool = OllamaClientPool()
@@ -1,21 +1,37 @@
 from deepseek_connector import DeepSeekR1LocalConnector
+from model_manager import model_manager
 import gradio as gr
-import speech_recognition as sr
-import pyttsx3 as tts
-from typing import Any
-from speech_recognizer import SpeechRecognizer
-import numpy as np
+from typing import TYPE_CHECKING, Any, Iterator
+from request_scheduler import Priority
+from session_manager import SessionManager
+import sys
+
+# the speech stack (speech_recognition, pyttsx3 and their audio backends) is imported by the first assistant built,
+# so a process that only shows this tool among others does not pay for it at startup.
+if TYPE_CHECKING:
+    import numpy as np
+    import speech_recognition as sr
+    from speech_engines import TTSWorker
+    from speech_recognizer import SpeechRecognizer
+    from voice_pipeline import Endpointer, SentenceSpeaker
 
 class PersonalAIAssistant(DeepSeekR1LocalConnector):
-    __tts_engine: tts.Engine = None # type: ignore
-    __speech_recognizer: SpeechRecognizer = None # type: ignore
+    MODEL_ID: str = "deepseek-r1:8b"
+    PRIORITY: Priority = Priority.INTERACTIVE
+    __tts_worker: "TTSWorker" = None # type: ignore
+    __speech_recognizer: "SpeechRecognizer" = None # type: ignore
+    __speaker: "SentenceSpeaker" = None # type: ignore
+
+    @property
+    def _tts_worker(self) -> "TTSWorker":
+        return self.__tts_worker
 
     @property
-    def _tts_engine(self) -> tts.Engine:
-        return self.__tts_engine
+    def _speaker(self) -> "SentenceSpeaker":
+        return self.__speaker
 
     @property
-    def _speech_recognizer(self) -> SpeechRecognizer:
+    def _speech_recognizer(self) -> "SpeechRecognizer":
         return self.__speech_recognizer
 
     def __init__(self):
@@ -24,8 +40,15 @@ class PersonalAIAssistant(DeepSeekR1LocalConnector):
             "You will answer questions, provide information, and assist with tasks based on user requests."
             "Answer to the user only if you sure for 95%% about accuracy of your response."
         )
-        super().__init__(system_behavior=system_behavior, model_id="deepseek-r1:8b")
-        self.__tts_engine = tts.init()
+        super().__init__(system_behavior=system_behavior, model_id=self.MODEL_ID)
+        import pyttsx3 as tts
+        from speech_engines import TTSWorker
+        from speech_recognizer import SpeechRecognizer
+        from voice_pipeline import SentenceSpeaker
+        # the engine is owned by a single worker thread, so concurrent sessions only enqueue speech.
+        self.__tts_worker = TTSWorker.shared(tts.init)
+        # one speaker per assistant, so a new answer can drop what is left unspoken of the previous one.
+        self.__speaker = SentenceSpeaker(self.__tts_worker)
         self.__speech_recognizer = SpeechRecognizer()
 
     def listen_for_request_and_ask_assistant(self, mic_data: tuple) -> str:
@@ -34,26 +57,104 @@ class PersonalAIAssistant(DeepSeekR1LocalConnector):
         if not request:
             return "No request received."
         response: str = self.ask(request)
-        self._tts_engine.say(response)
-        self._tts_engine.runAndWait()
+        self.__speaker.interrupt()
+        self.__speaker.say(response)
         return response
 
-    def listen_for_request(self, audio: list[int] | tuple[int, np.ndarray] | sr.AudioData | None = None) -> str:
+    def collect_speech(self, mic_chunk: "tuple[int, np.ndarray] | None", endpointer: "Endpointer | None") -> "tuple[Any, Endpointer]":
+        """
+        Streaming microphone handler of the pipelined mode. Collects chunks until the user pauses, then transcribes the utterance.
+
+        Args:
+            mic_chunk (tuple[int, np.ndarray] | None): The next chunk of microphone audio.
+            endpointer (Endpointer | None): The utterance collected so far in this session.
+
+        Returns:
+            tuple[Any, Endpointer]: The transcript once the utterance has ended (no update before that), and the session state.
+        """
+        from voice_pipeline import Endpointer
+        endpointer = endpointer or Endpointer()
+        if mic_chunk is None or not endpointer.feed(*mic_chunk):
+            return gr.skip(), endpointer
+        request: str = self.listen_for_request(audio=endpointer.take())
+        return (request or gr.skip()), endpointer
+
+    def answer_and_speak(self, request: str) -> Iterator[str]:
+        """
+        Streams the response to a transcribed request, and queues every completed sentence for speech right away,
+        so the assistant starts talking after the first sentence instead of after the whole response.
+
+        Args:
+            request (str): The transcribed request.
+
+        Yields:
+            str: The response accumulated so far.
+        """
+        if not request:
+            return
+        from voice_pipeline import SentenceSplitter
+        # the previous answer is cut short rather than finished before this one.
+        self.__speaker.interrupt()
+        splitter = SentenceSplitter()
+        self._add_user_message(self._build_prompt(request))
+        response = ""
+        for chunk in self._query_stream():
+            response += chunk
+            for sentence in splitter.feed(chunk):
+                self.__speaker.say(sentence)
+            yield response
+        for sentence in splitter.flush():
+            self.__speaker.say(sentence)
+
+    def listen_for_request(self, audio: "list[int] | tuple[int, np.ndarray] | sr.AudioData | None" = None) -> str:
         return self.__speech_recognizer.listen_for_request(audio=audio)
 
     def ask(self, request: str) -> str:
-        prompt = f"User: {request}\nAssistant:"
-        self._add_user_message(prompt)
-        response: str = self._query().strip()
+        self._add_user_message(self._build_prompt(request))
+        response: str = self._parse_response(self._query())
         return response
 
-if __name__ == "__main__":
-    personal_ai_assistant: PersonalAIAssistant = PersonalAIAssistant()
-    personal_ai_assistant_interface: gr.Interface = gr.Interface(
-        fn=personal_ai_assistant.listen_for_request_and_ask_assistant,
+    def _build_prompt(self, request: str) -> str:
+        return f"User: {request}\nAssistant:"
+
+    def _parse_response(self, response: str) -> str:
+        return response.strip()
+
+def pipelined_interface(assistant_sessions: SessionManager[PersonalAIAssistant]) -> gr.Blocks:
+    """
+    Builds the pipelined UI: microphone audio streams in, the transcript is finalized when the user pauses,
+    and the response streams out while its sentences are already being spoken.
+    """
+    with gr.Blocks(title="Personal AI Assistant") as demo:
+        gr.Markdown("## Personal AI Assistant\nA personal AI assistant that listens to your requests and provides answers.")
+        endpointer = gr.State(None)
+        microphone = gr.Audio(sources="microphone", streaming=True)
+        transcript = gr.Textbox(label="Request")
+        response = gr.Textbox(label="Response")
+        microphone.stream(fn=assistant_sessions.handler("collect_speech"), inputs=[microphone, endpointer], outputs=[transcript, endpointer])
+        transcript.change(fn=assistant_sessions.handler("answer_and_speak"), inputs=transcript, outputs=response)
+    return assistant_sessions.attach(demo)
+
+def personal_ai_assistant_interface(pipelined: bool = False) -> gr.Blocks:
+    """
+    Builds the UI of the assistant. Every session gets its assistant on its first request.
+
+    Args:
+        pipelined (bool): Whether to build the pipelined UI, instead of the one answering a whole recording.
+    """
+    assistant_sessions: SessionManager[PersonalAIAssistant] = SessionManager(PersonalAIAssistant)
+    if pipelined:
+        return pipelined_interface(assistant_sessions)
+    interface: gr.Interface = gr.Interface(
+        fn=assistant_sessions.handler("listen_for_request_and_ask_assistant"),
         inputs=gr.Audio(sources="microphone"),
         outputs=gr.Textbox(),
         title="Personal AI Assistant",
         description="A personal AI assistant that listens to your requests and provides answers.",
     )
-    personal_ai_assistant_interface.launch()
\ No newline at end of file
+    return assistant_sessions.attach(interface)
+
+if __name__ == "__main__":
+    interface = personal_ai_assistant_interface(pipelined="--pipelined" in sys.argv)
+    model_manager.preload()
+    interface.launch()
\ No newline at end of file
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import threading
+from typing import Any, NamedTuple, Sequence
+from conversation_memory import estimate_tokens
+
+# the chat template adds a few tokens of role markers around every message.
+MESSAGE_OVERHEAD_TOKENS: int = 4
+
+def estimate_message_tokens(content: str) -> int:
+    """
+    Args:
+        content (str): The content of a message.
+
+    Returns:
+        int: The estimated number of prompt tokens the message takes, role markers included.
+    """
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+def estimate_prompt_tokens(messages: Sequence[dict[str, str]]) -> int:
+    """
+    Args:
+        messages (Sequence[dict[str, str]]): The messages of a request.
+
+    Returns:
+        int: The estimated number of prompt tokens of the request.
+    """
+    return sum(estimate_message_tokens(message.get("content", "")) for message in messages)
+
+class PromptPrefix:
+    """
+    The fixed beginning of every request of a task: the system prompt followed by the few-shot examples as user and assistant turns.
+
+    The Ollama server keeps the evaluated prompt of the previous request in its KV cache and only evaluates the part that differs,
+    so the prefix is built once, byte for byte, and the variable part of a request is only ever appended after it.
+    """
+
+    def __init__(self, system_prompt: str, examples: Sequence[tuple[str, str]] = (), name: str = "") -> None:
+        """
+        Args:
+            system_prompt (str): The system prompt.
+            examples (Sequence[tuple[str, str]]): The few-shot examples, as (user prompt, assistant response) pairs.
+            name (str): What the prefix is for, when a task sends more than one, e.g. 'shard'. Not part of the fingerprint.
+        """
+        messages: list[dict[str, str]] = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        for prompt, response in examples:
+            messages.append({"role": "user", "content": prompt})
+            messages.append({"role": "assistant", "content": response})
+        self.__system_prompt = system_prompt
+        self.__name = name
+        self.__messages: tuple[tuple[str, str], ...] = tuple((message["role"], message["content"]) for message in messages)
+        self.__fingerprint = hashlib.sha256(json.dumps(messages, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+        self.__tokens = estimate_prompt_tokens(messages)
+
+    #region Properties
+    @property
+    def system_prompt(self) -> str:
+        return self.__system_prompt
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def fingerprint(self) -> str:
+        """A short hash of the prefix. Changes whenever a single byte of the prefix does."""
+        return self.__fingerprint
+
+    @property
+    def tokens(self) -> int:
+        """The estimated number of tokens of the prefix."""
+        return self.__tokens
+    #endregion
+
+    def messages(self) -> list[dict[str, str]]:
+        """
+        Returns:
+            list[dict[str, str]]: New copies of the prefix messages, so callers cannot change the prefix.
+        """
+        return [{"role": role, "content": content} for role, content in self.__messages]
+
+    def __len__(self) -> int:
+        return len(self.__messages)
+
+class PromptEvalReport(NamedTuple):
+    """How much of the prompts of a task the server had to evaluate, against their total size."""
+    task: str
+    requests: int
+    prompt_tokens: int
+    evaluated_tokens: int
+    prompt_eval_seconds: float
+    prefix_changes: int
+
+    @property
+    def reused_ratio(self) -> float:
+        """The share of prompt tokens served from the KV cache of the server. An estimate, as prompt sizes are estimated."""
+        if not self.prompt_tokens:
+            return 0.0
+        return max(0.0, 1.0 - self.evaluated_tokens / self.prompt_tokens)
+
+class _TaskTotals:
+    """The running totals of a single task. Guarded by the lock of the stats."""
+
+    def __init__(self, fingerprint: str) -> None:
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.evaluated_tokens = 0
+        self.prompt_eval_seconds = 0.0
+        self.prefix_changes = 0
+        self.fingerprint = fingerprint
+
+class PromptEvalStats:
+    """
+    Collects `prompt_eval_count` and `prompt_eval_duration` of Ollama responses per task, against the estimated size of the prompts sent,
+    to confirm that stable prefixes actually cut prompt evaluation.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__tasks: dict[str, _TaskTotals] = {}
+
+    def record(self, task: str, fingerprint: str, prompt_tokens: int, response: Any) -> None:
+        """
+        Args:
+            task (str): The task, e.g. the name of the connector class.
+            fingerprint (str): The fingerprint of the prefix the prompt started with.
+            prompt_tokens (int): The estimated size of the prompt.
+            response (Any): The ChatResponse, or the final part of a streamed one.
+        """
+        evaluated = getattr(response, "prompt_eval_count", None) or 0
+        seconds = (getattr(response, "prompt_eval_duration", None) or 0) / 1e9
+        with self.__lock:
+            totals = self.__tasks.setdefault(task, _TaskTotals(fingerprint))
+            totals.requests += 1
+            totals.prompt_tokens += prompt_tokens
+            totals.evaluated_tokens += evaluated
+            totals.prompt_eval_seconds += seconds
+            if totals.fingerprint != fingerprint:
+                totals.prefix_changes += 1
+                totals.fingerprint = fingerprint
+
+    def report(self) -> list[PromptEvalReport]:
+        """
+        Returns:
+            list[PromptEvalReport]: The totals of every task seen so far.
+        """
+        with self.__lock:
+            return [
+                PromptEvalReport(task, totals.requests, totals.prompt_tokens, totals.evaluated_tokens, totals.prompt_eval_seconds, totals.prefix_changes)
+                for task, totals in self.__tasks.items()
+            ]
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__tasks.clear()
+
+prompt_eval_stats: PromptEvalStats = PromptEvalStats()
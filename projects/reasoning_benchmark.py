@@ -0,0 +1,84 @@
+import argparse
+import random
+import re
+import sys
+import time
+from typing import Callable
+from reasoning_filter import ThinkBlockFilter, split_reasoning, strip_reasoning
+
+# the lazy regex the connectors used before the streaming filter, kept as the reference to measure against.
+LEGACY_PATTERN: re.Pattern[str] = re.compile(r'<think>\s+(?:\w|\W)*?\s+</think>', flags=re.IGNORECASE | re.MULTILINE)
+
+WORDS: tuple[str, ...] = (
+    "okay", "so", "the", "user", "wants", "me", "to", "check", "whether", "this", "sentence", "is", "positive",
+    "hmm", "wait", "let", "think", "about", "tone", "context", "maybe", "answer", "should", "be", "<", ">", "a<b",
+)
+
+def legacy_strip(text: str) -> str:
+    return LEGACY_PATTERN.sub('', text).strip()
+
+def make_trace(think_words: int, answer_words: int, blocks: int, seed: int) -> str:
+    """Builds a deterministic DeepSeek R1 style response: reasoning blocks of `think_words` words each, then the answer."""
+    generator = random.Random(seed)
+
+    def words(count: int) -> str:
+        return " ".join(generator.choice(WORDS) for _ in range(count))
+
+    reasoning = "".join(f"<think>\n{words(think_words)}\n</think>\n\n" for _ in range(blocks))
+    return reasoning + words(answer_words) + "."
+
+def stream_strip(text: str, chunk_size: int) -> str:
+    """Strips the text as the connectors do with a streamed response, fed in chunks of `chunk_size` characters."""
+    think_filter = ThinkBlockFilter()
+    visible = [think_filter.feed(text[start:start + chunk_size]) for start in range(0, len(text), chunk_size)]
+    visible.append(think_filter.flush())
+    return "".join(visible).strip()
+
+def measure(function: Callable[[], object], runs: int) -> float:
+    """Returns the best time of `runs` calls, in seconds."""
+    best = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Measures the removal of <think> blocks from large synthetic reasoning traces.")
+    parser.add_argument("--think-words", nargs="+", type=int, default=[1000, 10000, 100000], help="Words of every reasoning block.")
+    parser.add_argument("--answer-words", type=int, default=200)
+    parser.add_argument("--blocks", type=int, default=1, help="Reasoning blocks per response.")
+    parser.add_argument("--chunk-size", type=int, default=8, help="Characters per streamed chunk, about two tokens.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'think words':>12}{'chars':>10}{'regex ms':>10}{'whole ms':>10}{'stream ms':>11}{'MB/s':>8}")
+    failures = 0
+    for think_words in args.think_words:
+        trace = make_trace(think_words, args.answer_words, args.blocks, seed=think_words)
+        expected = legacy_strip(trace)
+        visible, reasoning = split_reasoning(trace)
+        # the filter must agree with the regex on well-formed traces, whole and streamed, and account for all the reasoning.
+        if not (strip_reasoning(trace) == stream_strip(trace, args.chunk_size) == visible == expected):
+            print(f"MISMATCH with {think_words} think words", file=sys.stderr)
+            failures += 1
+        if len(reasoning.split()) != think_words * args.blocks:
+            print(f"REASONING LOST with {think_words} think words", file=sys.stderr)
+            failures += 1
+        regex = measure(lambda: legacy_strip(trace), args.runs)
+        whole = measure(lambda: strip_reasoning(trace), args.runs)
+        streamed = measure(lambda: stream_strip(trace, args.chunk_size), args.runs)
+        print(f"{think_words:>12}{len(trace):>10}{regex * 1000:>10.2f}{whole * 1000:>10.2f}{streamed * 1000:>11.2f}"
+              f"{len(trace) / whole / 2 ** 20:>8.1f}")
+
+    # malformed responses the regex gets wrong: tags without whitespace, a block cut off by num_predict,
+    # and a block opened by the chat template, of which only the closing tag is in the response.
+    for trace, expected in (("<think></think>Answer", "Answer"), ("<THINK>x</think>Answer", "Answer"), ("<think>\nreasoning cut off", ""),
+                            ("reasoning\n</think>\n\nAnswer", "Answer")):
+        if strip_reasoning(trace) != expected or stream_strip(trace, args.chunk_size) != expected:
+            print(f"MISMATCH on {trace!r}", file=sys.stderr)
+            failures += 1
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
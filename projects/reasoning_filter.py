@@ -0,0 +1,192 @@
+class ThinkBlockFilter:
+    """
+    Incremental filter that removes <think>...</think> reasoning blocks from a DeepSeek R1 response, streamed or whole.
+
+    Chunks are fed as they arrive from the model and the visible text is returned right away. Only a tail that
+    could be the beginning of a tag (e.g. "<thi") is held back until the next chunk decides what it is,
+    so each character is inspected a constant number of times and the whole response is processed in linear time.
+    Tags are matched regardless of case and of the whitespace around them. A closing tag before any opening one
+    (some chat templates open the block in the prompt) ends a reasoning block that started with the response, so
+    everything before it is dropped. To tell, the text before the first tag of the response is held back until that tag
+    shows up - a response without any tag is only released by `flush`. A stray closing tag after that is dropped, and so
+    is a block left unterminated by a truncated generation. The reasoning can be captured instead of discarded, for
+    debugging and metrics.
+    """
+    OPEN_TAG: str = "<think>"
+    CLOSE_TAG: str = "</think>"
+
+    def __init__(self, capture_reasoning: bool = False) -> None:
+        """
+        Args:
+            capture_reasoning (bool): Whether to keep the text of the reasoning blocks, available as `reasoning`.
+        """
+        self.__pending: str = ""
+        self.__in_reasoning: bool = False
+        self.__started: bool = False
+        # no tag seen yet: the text so far may turn out to be reasoning, and is held until it is decided.
+        self.__undecided: bool = True
+        self.__held: list[str] = []
+        self.__capture_reasoning = capture_reasoning
+        self.__reasoning: list[str] = []
+        self.__block: list[str] = []
+        self.__reasoning_length: int = 0
+
+    #region Properties
+    @property
+    def in_reasoning(self) -> bool:
+        """Whether the filter is currently inside a reasoning block."""
+        return self.__in_reasoning
+
+    @property
+    def reasoning(self) -> str:
+        """The text of the reasoning blocks seen so far, separated by blank lines. Empty unless captured."""
+        blocks = [*self.__reasoning, "".join(self.__block).strip()]
+        return "\n\n".join(block for block in blocks if block)
+
+    @property
+    def reasoning_length(self) -> int:
+        """The number of characters of reasoning seen so far, captured or not."""
+        return self.__reasoning_length
+    #endregion
+
+    def feed(self, chunk: str) -> str:
+        """
+        Consumes the next chunk of the response.
+
+        Args:
+            chunk (str): The next piece of the streamed response.
+
+        Returns:
+            str: The visible text that can be shown right away. May be empty.
+        """
+        if not chunk:
+            return ""
+        text = self.__pending + chunk
+        self.__pending = ""
+        visible: list[str] = []
+        if "<" not in text:
+            # most chunks are a token or two of plain text - no tag can start in them.
+            self.__consume(text, visible)
+            return self.__emit("".join(visible))
+        lowered = text.lower()
+        position = 0
+        while position < len(text):
+            if self.__in_reasoning:
+                found, tag = lowered.find(self.CLOSE_TAG, position), self.CLOSE_TAG
+            else:
+                found, tag = self.__find_tag(lowered, position)
+            if found < 0:
+                keep = self.__partial_tag_length(lowered, position)
+                self.__consume(text[position:len(text) - keep], visible)
+                self.__pending = text[len(text) - keep:]
+                break
+            self.__consume(text[position:found], visible)
+            if tag == self.OPEN_TAG:
+                self.__release(visible)
+                self.__in_reasoning = True
+            elif self.__in_reasoning:
+                self.__in_reasoning = False
+                self.__end_block()
+            elif self.__undecided:
+                self.__reclaim_held()
+            position = found + len(tag)
+        return self.__emit("".join(visible))
+
+    def flush(self) -> str:
+        """
+        Ends the stream and returns the text that was held back, including a response without any tag.
+        An unterminated reasoning block is dropped.
+
+        Returns:
+            str: The remaining visible text. May be empty.
+        """
+        pending, self.__pending = self.__pending, ""
+        visible: list[str] = []
+        self.__consume(pending, visible)
+        self.__release(visible)
+        self.__in_reasoning = False
+        self.__end_block()
+        return self.__emit("".join(visible))
+
+    def __consume(self, text: str, visible: list[str]) -> None:
+        """Routes text outside of tags to the visible output or to the reasoning."""
+        if not text:
+            return
+        if not self.__in_reasoning:
+            (self.__held if self.__undecided else visible).append(text)
+            return
+        self.__reasoning_length += len(text)
+        if self.__capture_reasoning:
+            self.__block.append(text)
+
+    def __release(self, visible: list[str]) -> None:
+        """Decides the held text is visible. Nothing else is visible while text is held, so it goes first."""
+        if self.__undecided:
+            self.__undecided = False
+            visible[:0] = self.__held
+            self.__held = []
+
+    def __reclaim_held(self) -> None:
+        """Decides the held text is reasoning, on a closing tag before any opening one."""
+        self.__undecided = False
+        held, self.__held = "".join(self.__held), []
+        self.__reasoning_length += len(held)
+        if self.__capture_reasoning:
+            self.__block.append(held)
+        self.__end_block()
+
+    def __end_block(self) -> None:
+        block, self.__block = "".join(self.__block).strip(), []
+        if block:
+            self.__reasoning.append(block)
+
+    def __emit(self, text: str) -> str:
+        # the answer usually follows the reasoning block after a couple of newlines - they are not worth showing.
+        if not self.__started:
+            text = text.lstrip()
+            self.__started = bool(text)
+        return text
+
+    def __find_tag(self, lowered: str, position: int) -> tuple[int, str]:
+        """Finds the nearest opening or stray closing tag outside of a reasoning block."""
+        opening = lowered.find(self.OPEN_TAG, position)
+        closing = lowered.find(self.CLOSE_TAG, position, opening if opening >= 0 else len(lowered))
+        if closing >= 0:
+            return closing, self.CLOSE_TAG
+        return opening, self.OPEN_TAG
+
+    def __partial_tag_length(self, lowered: str, position: int) -> int:
+        """Returns the length of the longest suffix of `lowered[position:]` that is a prefix of a tag expected next."""
+        tags = (self.CLOSE_TAG,) if self.__in_reasoning else (self.OPEN_TAG, self.CLOSE_TAG)
+        for length in range(min(len(self.CLOSE_TAG) - 1, len(lowered) - position), 0, -1):
+            suffix = lowered[len(lowered) - length:]
+            if any(tag.startswith(suffix) for tag in tags):
+                return length
+        return 0
+
+def split_reasoning(text: str) -> tuple[str, str]:
+    """
+    Separates a whole response into its visible text and its reasoning, in a single pass.
+
+    Args:
+        text (str): The response of the model.
+
+    Returns:
+        tuple[str, str]: The visible text, stripped, and the text of the reasoning blocks.
+    """
+    think_filter = ThinkBlockFilter(capture_reasoning=True)
+    visible = think_filter.feed(text) + think_filter.flush()
+    return visible.strip(), think_filter.reasoning
+
+def strip_reasoning(text: str) -> str:
+    """
+    Removes the reasoning blocks from a whole response, in a single pass.
+
+    Args:
+        text (str): The response of the model.
+
+    Returns:
+        str: The visible text, stripped.
+    """
+    think_filter = ThinkBlockFilter()
+    return (think_filter.feed(text) + think_filter.flush()).strip()
@@ -0,0 +1,342 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from typing import AsyncIterator, Iterator, NamedTuple
+from telemetry import Histogram, telemetry
+
+class Priority(Enum):
+    """The priority classes of model requests. A free slot always goes to the waiting request of the most urgent class."""
+    INTERACTIVE = 0
+    STANDARD = 1
+    BULK = 2
+
+class RequestRejected(RuntimeError):
+    """A request was turned away by the scheduler before reaching the model."""
+    # recorded by the telemetry as the outcome of the request.
+    outcome: str = "rejected"
+
+class QueueFullError(RequestRejected):
+    """The queue of the priority class is full. The caller should back off and retry later."""
+
+class DeadlineExceededError(RequestRejected):
+    """The request could not start before its deadline, or would not, judging by the current queue."""
+
+class QueueStats(NamedTuple):
+    """The queue of a model and priority class, as of now and since the scheduler was created."""
+    model: str
+    priority: str
+    depth: int
+    running: int
+    admitted: int
+    rejected_full: int
+    rejected_deadline: int
+    wait_p50: float
+    wait_p95: float
+
+_priority_override: ContextVar[Priority | None] = ContextVar("priority_override", default=None)
+
+@contextmanager
+def priority(value: Priority) -> Iterator[None]:
+    """
+    Runs the requests made in the block with the given priority, whatever the priority of their connector,
+    e.g. to send the requests of a batch job as bulk work.
+    """
+    token = _priority_override.set(value)
+    try:
+        yield
+    finally:
+        _priority_override.reset(token)
+
+def effective_priority(default: Priority) -> Priority:
+    """
+    Args:
+        default (Priority): The priority of the caller, e.g. of its connector class.
+
+    Returns:
+        Priority: The priority set by an enclosing `priority` block, or the default.
+    """
+    return _priority_override.get() or default
+
+class _Ticket:
+    """A request waiting for a slot. Guarded by the lock of the scheduler."""
+
+    def __init__(self, priority: Priority, deadline: float | None, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        self.priority = priority
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.expired = False
+        self.event = threading.Event()
+        self.loop = loop
+        self.future: asyncio.Future[None] | None = loop.create_future() if loop is not None else None
+
+    def wake(self) -> None:
+        if self.future is None:
+            self.event.set()
+            return
+        future = self.future
+
+        def resolve() -> None:
+            if not future.done():
+                future.set_result(None)
+
+        self.loop.call_soon_threadsafe(resolve)  # type: ignore[union-attr]
+
+class _ModelQueue:
+    """The slots and waiting requests of a single model. Guarded by the lock of the scheduler."""
+    WAIT_BOUNDS: tuple[float, ...] = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    # weight of the latest request in the running average of the time a slot is held.
+    SERVICE_SMOOTHING: float = 0.2
+
+    def __init__(self, slots: int) -> None:
+        self.slots = slots
+        self.running: dict[Priority, int] = {level: 0 for level in Priority}
+        self.waiting: dict[Priority, deque[_Ticket]] = {level: deque() for level in Priority}
+        self.admitted: dict[Priority, int] = {level: 0 for level in Priority}
+        self.rejected_full: dict[Priority, int] = {level: 0 for level in Priority}
+        self.rejected_deadline: dict[Priority, int] = {level: 0 for level in Priority}
+        self.wait: dict[Priority, Histogram] = {level: Histogram(self.WAIT_BOUNDS) for level in Priority}
+        self.service_seconds = 0.0
+
+    @property
+    def total_running(self) -> int:
+        return sum(self.running.values())
+
+class RequestScheduler:
+    """
+    Admission control in front of the Ollama server, shared by every connector of the process.
+
+    Every model gets as many slots as the server runs requests in parallel (OLLAMA_NUM_PARALLEL), and requests beyond them
+    wait in a queue per priority class. A freed slot goes to the oldest request of the most urgent class, and the last
+    `reserved_slots` slots of a model are kept for interactive requests, so long bulk jobs only use the capacity left over.
+    Queues are bounded: a request arriving at a full queue is rejected at once with `QueueFullError` instead of piling up.
+    A request with a deadline is rejected with `DeadlineExceededError` as soon as the queue ahead of it shows it cannot start
+    in time, or when the deadline passes while it waits.
+    """
+    DEFAULT_SLOTS: int = 4
+    DEFAULT_QUEUE_LIMITS: dict[Priority, int] = {Priority.INTERACTIVE: 64, Priority.STANDARD: 64, Priority.BULK: 256}
+
+    def __init__(self,
+                 slots: int | None = None,
+                 queue_limits: dict[Priority, int] | None = None,
+                 reserved_slots: int = 1) -> None:
+        """
+        Args:
+            slots (int | None): The slots of every model. Read from OLLAMA_NUM_PARALLEL if None.
+            queue_limits (dict[Priority, int] | None): The number of requests each priority class can queue per model.
+            reserved_slots (int): The slots of a model only interactive requests can take, if the model has more than that.
+        """
+        self.__lock = threading.Lock()
+        self.__slots = slots if slots is not None else int(os.getenv("OLLAMA_NUM_PARALLEL") or self.DEFAULT_SLOTS)
+        if self.__slots < 1:
+            raise ValueError("slots must be at least 1.")
+        self.__queue_limits = {**self.DEFAULT_QUEUE_LIMITS, **(queue_limits or {})}
+        self.__reserved_slots = reserved_slots
+        self.__models: dict[str, _ModelQueue] = {}
+
+    def configure_model(self, model_id: str, slots: int) -> None:
+        """
+        Sets the slots of a single model, e.g. when it runs with another OLLAMA_NUM_PARALLEL than the default.
+
+        Args:
+            model_id (str): The Ollama model.
+            slots (int): The number of requests the server runs in parallel on the model.
+        """
+        if slots < 1:
+            raise ValueError("slots must be at least 1.")
+        with self.__lock:
+            queue = self.__queue_of(model_id)
+            queue.slots = slots
+            self.__dispatch(queue)
+
+    @contextmanager
+    def slot(self, model_id: str, priority: Priority = Priority.STANDARD, deadline: float | None = None) -> Iterator[None]:
+        """
+        Holds a slot of a model for the duration of a request, waiting for it in the queue of the priority class.
+
+        Args:
+            model_id (str): The Ollama model.
+            priority (Priority): The priority class of the request.
+            deadline (float | None): The `time.monotonic` reading by which the request must have started. None to wait as long as needed.
+
+        Raises:
+            QueueFullError: If the queue of the priority class is full.
+            DeadlineExceededError: If the request cannot start before its deadline.
+        """
+        ticket = self.__enqueue(model_id, priority, deadline)
+        if not ticket.granted:
+            timeout = max(deadline - time.monotonic(), 0.0) if deadline is not None else None
+            ticket.event.wait(timeout)
+            self.__settle(model_id, ticket)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.__release(model_id, ticket, time.monotonic() - started)
+
+    @asynccontextmanager
+    async def async_slot(self, model_id: str, priority: Priority = Priority.STANDARD, deadline: float | None = None) -> AsyncIterator[None]:
+        """
+        Asynchronous variant of `slot`, that waits without holding a thread.
+        """
+        ticket = self.__enqueue(model_id, priority, deadline, asyncio.get_running_loop())
+        if not ticket.granted:
+            timeout = max(deadline - time.monotonic(), 0.0) if deadline is not None else None
+            try:
+                await asyncio.wait_for(ticket.future, timeout)  # type: ignore[arg-type]
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                self.__abandon(model_id, ticket)
+                raise
+            self.__settle(model_id, ticket)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.__release(model_id, ticket, time.monotonic() - started)
+
+    def stats(self) -> list[QueueStats]:
+        """
+        Returns:
+            list[QueueStats]: The queue of every model and priority class seen so far.
+        """
+        with self.__lock:
+            return [
+                QueueStats(model_id, level.name.lower(), len(queue.waiting[level]), queue.running[level], queue.admitted[level],
+                           queue.rejected_full[level], queue.rejected_deadline[level],
+                           queue.wait[level].quantile(0.5), queue.wait[level].quantile(0.95))
+                for model_id, queue in self.__models.items()
+                for level in Priority
+            ]
+
+    def prometheus(self) -> str:
+        """
+        Returns:
+            str: The queue depths, running requests, admissions, rejections and wait times, in the Prometheus text format.
+        """
+        prefix = f"{telemetry.PREFIX}_scheduler"
+        lines: list[str] = []
+        with self.__lock:
+            for name, kind, description, value in (
+                ("queue_depth", "gauge", "Requests waiting for a slot.", lambda queue, level: len(queue.waiting[level])),
+                ("running", "gauge", "Requests holding a slot.", lambda queue, level: queue.running[level]),
+                ("admitted_total", "counter", "Requests that got a slot.", lambda queue, level: queue.admitted[level]),
+                ("rejected_total", "counter", "Requests rejected by the scheduler.", None),
+            ):
+                lines.append(f"# HELP {prefix}_{name} {description}")
+                lines.append(f"# TYPE {prefix}_{name} {kind}")
+                for model_id, queue in self.__models.items():
+                    for level in Priority:
+                        labels = f'model="{model_id}",priority="{level.name.lower()}"'
+                        if value is None:
+                            lines.append(f'{prefix}_{name}{{{labels},reason="queue_full"}} {queue.rejected_full[level]}')
+                            lines.append(f'{prefix}_{name}{{{labels},reason="deadline"}} {queue.rejected_deadline[level]}')
+                        else:
+                            lines.append(f"{prefix}_{name}{{{labels}}} {value(queue, level)}")
+            lines.append(f"# HELP {prefix}_wait_seconds Time requests waited for a slot.")
+            lines.append(f"# TYPE {prefix}_wait_seconds histogram")
+            for model_id, queue in self.__models.items():
+                for level in Priority:
+                    histogram = queue.wait[level]
+                    labels = f'model="{model_id}",priority="{level.name.lower()}"'
+                    cumulative = 0
+                    for bound, count in zip((*histogram.bounds, float("inf")), histogram.counts):
+                        cumulative += count
+                        upper = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f'{prefix}_wait_seconds_bucket{{{labels},le="{upper}"}} {cumulative}')
+                    lines.append(f"{prefix}_wait_seconds_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{prefix}_wait_seconds_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def __queue_of(self, model_id: str) -> _ModelQueue:
+        queue = self.__models.get(model_id)
+        if queue is None:
+            queue = self.__models[model_id] = _ModelQueue(self.__slots)
+        return queue
+
+    def __enqueue(self, model_id: str, priority: Priority, deadline: float | None, loop: asyncio.AbstractEventLoop | None = None) -> _Ticket:
+        ticket = _Ticket(priority, deadline, loop)
+        with self.__lock:
+            queue = self.__queue_of(model_id)
+            waiting = queue.waiting[priority]
+            if len(waiting) >= self.__queue_limits[priority]:
+                queue.rejected_full[priority] += 1
+                raise QueueFullError(f"The {priority.name.lower()} queue of {model_id} is full ({len(waiting)} requests waiting).")
+            if deadline is not None:
+                expected = self.__expected_wait(queue, priority)
+                if ticket.enqueued + expected > deadline:
+                    queue.rejected_deadline[priority] += 1
+                    raise DeadlineExceededError(f"{model_id} is expected to take a request in {expected:.1f} s, past the deadline of the request.")
+            waiting.append(ticket)
+            self.__dispatch(queue)
+        return ticket
+
+    def __expected_wait(self, queue: _ModelQueue, priority: Priority) -> float:
+        """Estimates the wait of a new request from the requests ahead of it and the average time a slot is held."""
+        ahead = sum(len(queue.waiting[level]) for level in Priority if level.value <= priority.value)
+        free = self.__capacity(queue, priority) - queue.total_running
+        if ahead < free:
+            return 0.0
+        return (ahead - free) // queue.slots * queue.service_seconds + queue.service_seconds
+
+    def __capacity(self, queue: _ModelQueue, priority: Priority) -> int:
+        if priority is Priority.INTERACTIVE:
+            return queue.slots
+        return max(queue.slots - self.__reserved_slots, 1)
+
+    def __dispatch(self, queue: _ModelQueue) -> None:
+        """Hands the free slots of a model to the waiting requests, most urgent class first."""
+        now = time.monotonic()
+        for level in Priority:
+            waiting = queue.waiting[level]
+            while waiting and queue.total_running < self.__capacity(queue, level):
+                ticket = waiting.popleft()
+                if ticket.deadline is not None and ticket.deadline < now:
+                    ticket.expired = True
+                    ticket.wake()
+                    continue
+                ticket.granted = True
+                queue.running[level] += 1
+                queue.admitted[level] += 1
+                queue.wait[level].observe(now - ticket.enqueued)
+                ticket.wake()
+
+    def __settle(self, model_id: str, ticket: _Ticket) -> None:
+        """Called when a waiter wakes up: raises if it did not get a slot in time."""
+        with self.__lock:
+            if ticket.granted:
+                return
+            queue = self.__queue_of(model_id)
+            if ticket in queue.waiting[ticket.priority]:
+                queue.waiting[ticket.priority].remove(ticket)
+            queue.rejected_deadline[ticket.priority] += 1
+        raise DeadlineExceededError(f"The request did not get a slot of {model_id} before its deadline.")
+
+    def __abandon(self, model_id: str, ticket: _Ticket) -> None:
+        """Called when a waiter is cancelled: leaves the queue, or gives back the slot it was just granted."""
+        with self.__lock:
+            queue = self.__queue_of(model_id)
+            if ticket.granted:
+                queue.running[ticket.priority] -= 1
+                self.__dispatch(queue)
+            elif ticket in queue.waiting[ticket.priority]:
+                queue.waiting[ticket.priority].remove(ticket)
+
+    def __release(self, model_id: str, ticket: _Ticket, held_seconds: float) -> None:
+        with self.__lock:
+            queue = self.__queue_of(model_id)
+            queue.running[ticket.priority] -= 1
+            if queue.service_seconds:
+                queue.service_seconds += (held_seconds - queue.service_seconds) * _ModelQueue.SERVICE_SMOOTHING
+            else:
+                queue.service_seconds = held_seconds
+            self.__dispatch(queue)
+
+request_scheduler: RequestScheduler = RequestScheduler()
+telemetry.add_collector(request_scheduler.prometheus)
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Mapping, NamedTuple, Sequence
+
+class CacheStats(NamedTuple):
+    """Counters of a response cache."""
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    stores: int
+    evictions: int
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+class ResponseCache:
+    """
+    Two-tier cache of model responses: an in-memory LRU in front of an optional SQLite store.
+
+    Keys are derived from everything that determines a response - the model, the messages sent (system prompt included)
+    and the generation options - so a hit is only returned for an identical request. Entries expire after `ttl` seconds.
+    The cache is safe to share between connectors and threads.
+    """
+    DEFAULT_MEMORY_ENTRIES: int = 1024
+    DEFAULT_DISK_ENTRIES: int = 100_000
+    DEFAULT_TTL: float = 7 * 24 * 60 * 60
+    # pruning the disk store on every write would cost a table scan per request.
+    PRUNE_INTERVAL: int = 256
+
+    def __init__(self,
+                 path: str | None = None,
+                 max_memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+                 max_disk_entries: int = DEFAULT_DISK_ENTRIES,
+                 ttl: float | None = DEFAULT_TTL) -> None:
+        """
+        Args:
+            path (str | None): The SQLite file of the disk tier. Only the memory tier is used if None.
+            max_memory_entries (int): The number of entries kept in memory.
+            max_disk_entries (int): The number of entries kept on disk. The least recently used ones are deleted first.
+            ttl (float | None): The lifetime of an entry in seconds, or None for entries that never expire.
+        """
+        if max_memory_entries < 1 or max_disk_entries < 1:
+            raise ValueError("Cache sizes must be at least 1.")
+        self.__lock = threading.Lock()
+        self.__memory: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self.__max_memory_entries = max_memory_entries
+        self.__max_disk_entries = max_disk_entries
+        self.__ttl = ttl
+        self.__memory_hits = self.__disk_hits = self.__misses = self.__stores = self.__evictions = 0
+        self.__writes_since_prune = 0
+        self.__connection: sqlite3.Connection | None = None
+        if path:
+            self.__connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self.__connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    @property
+    def stats(self) -> CacheStats:
+        with self.__lock:
+            return CacheStats(self.__memory_hits, self.__disk_hits, self.__misses, self.__stores, self.__evictions)
+
+    @staticmethod
+    def make_key(model_id: str,
+                 messages: Sequence[Mapping[str, Any]],
+                 options: Mapping[str, Any] | None = None,
+                 response_format: str | Mapping[str, Any] | None = None) -> str:
+        """
+        Derives the cache key of a request.
+
+        Args:
+            model_id (str): The model queried.
+            messages (Sequence[Mapping[str, Any]]): The messages sent, system prompt included.
+            options (Mapping[str, Any] | None): The generation options sent.
+            response_format (str | Mapping[str, Any] | None): The output format requested, "json" or a JSON schema.
+
+        Returns:
+            str: The hex digest identifying the request.
+        """
+        request: dict[str, Any] = {"model": model_id, "messages": list(messages), "options": dict(options or {})}
+        if response_format:
+            request["format"] = response_format
+        payload = json.dumps(request,
+                             sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """
+        Args:
+            key (str): The key returned by `make_key`.
+
+        Returns:
+            str | None: The cached response, or None if missing or expired.
+        """
+        now = time.time()
+        with self.__lock:
+            entry = self.__memory.get(key)
+            if entry is not None:
+                if self.__is_fresh(entry[1], now):
+                    self.__memory.move_to_end(key)
+                    self.__memory_hits += 1
+                    return entry[0]
+                del self.__memory[key]
+            if self.__connection is not None:
+                row = self.__connection.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and self.__is_fresh(row[1], now):
+                    self.__connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                    self.__remember(key, row[0], row[1])
+                    self.__disk_hits += 1
+                    return row[0]
+            self.__misses += 1
+            return None
+
+    def put(self, key: str, response: str) -> None:
+        """
+        Stores a response in both tiers.
+
+        Args:
+            key (str): The key returned by `make_key`.
+            response (str): The response to cache.
+        """
+        now = time.time()
+        with self.__lock:
+            self.__remember(key, response, now)
+            self.__stores += 1
+            if self.__connection is not None:
+                self.__connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, response, now, now),
+                )
+                self.__writes_since_prune += 1
+                if self.__writes_since_prune >= self.PRUNE_INTERVAL:
+                    self.__prune_disk(now)
+
+    def clear(self) -> None:
+        """Drops every entry from both tiers. The counters are kept."""
+        with self.__lock:
+            self.__memory.clear()
+            if self.__connection is not None:
+                self.__connection.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__connection is not None:
+                self.__connection.close()
+                self.__connection = None
+
+    def __is_fresh(self, created: float, now: float) -> bool:
+        return self.__ttl is None or now - created < self.__ttl
+
+    def __remember(self, key: str, response: str, created: float) -> None:
+        self.__memory[key] = (response, created)
+        self.__memory.move_to_end(key)
+        while len(self.__memory) > self.__max_memory_entries:
+            self.__memory.popitem(last=False)
+            self.__evictions += 1
+
+    def __prune_disk(self, now: float) -> None:
+        assert self.__connection is not None
+        self.__writes_since_prune = 0
+        if self.__ttl is not None:
+            self.__connection.execute("DELETE FROM responses WHERE created < ?", (now - self.__ttl,))
+        overflow = self.__connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.__max_disk_entries
+        if overflow > 0:
+            self.__connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)", (overflow,)
+            )
+            self.__evictions += overflow
@@ -1,36 +1,92 @@
+from enum import Enum
 from deepseek_connector import DeepSeekR1LocalConnector
+from generation_profile import GenerationProfile, label_schema, parse_label
+from model_cascade import CascadeConfig, ConfidenceMethod
+from model_manager import model_manager
+from request_scheduler import Priority
+from session_manager import SessionManager
 import gradio as gr
 
+class Sentiment(Enum):
+    POSITIVE = "positive"
+    NEGATIVE = "negative"
+    NEUTRAL = "neutral"
+
 class DeepSeekR1SentimentAnalyzer(DeepSeekR1LocalConnector):
+    PRIORITY: Priority = Priority.INTERACTIVE
+    # the answer is a single label: no reasoning, a few tokens of JSON restricted to the labels.
+    GENERATION_PROFILE: GenerationProfile = GenerationProfile(num_predict=16,
+                                                              temperature=0.0,
+                                                              response_format=label_schema(Sentiment),
+                                                              think=False)
+    # a label is a handful of tokens: the 8b model is only worth it when the 1.5b one is unsure of them.
+    CASCADE: CascadeConfig | None = CascadeConfig(method=ConfidenceMethod.LOGPROBS, threshold=0.8)
 
     def __init__(self) -> None:
         super().__init__(system_behavior=("You are a sentiment analysis assistant. "
                                           "Your task is to analyze the sentiment of the given text.\n"
-                                          "You will respond ONLY with the sentiment (positive, negative, neutral) of a provided text.\n"))
+                                          "You will respond ONLY with the sentiment (positive, negative, neutral) of a provided text.\n"),
+                         stateless=True)
+
+    def classify(self, text: str) -> Sentiment:
+        """
+        Args:
+            text (str): The text to analyze for sentiment.
 
+        Returns:
+            Sentiment: The sentiment of the text.
+
+        Raises:
+            ValueError: If the model answered with something else than a sentiment.
+        """
+        self._add_user_message(self._build_prompt(text))
+        return parse_label(self._query(), Sentiment)
+
+    async def classify_async(self, text: str) -> Sentiment:
+        """
+        Asynchronous variant of `classify`.
+        """
+        self._add_user_message(self._build_prompt(text))
+        return parse_label(await self._query_async(), Sentiment)
 
     def ask(self, request: str) -> str:
         """
-        Analyzes the sentiment of the given text and returns a summary of findings.
+        Analyzes the sentiment of the given text.
 
         Args:
             request (str): The text to analyze for sentiment.
 
         Returns:
-            str: The sentiment analysis result.
+            str: The sentiment, one of positive, negative or neutral.
         """
-        prompt = f"Analyze the sentiment of the following text:\n\n{request}\n\n"
-        self._add_user_message(prompt)
-        return self._query()
+        return self.classify(request).value
 
-sentiment_analyzer: DeepSeekR1SentimentAnalyzer = DeepSeekR1SentimentAnalyzer()
+    def _build_prompt(self, request: str) -> str:
+        return f"Analyze the sentiment of the following text:\n\n{request}\n\n"
 
-if __name__ == "__main__":
-    sentiment_analyzer_interface: gr.Interface = gr.Interface(
-        fn=sentiment_analyzer.ask,
+    def _parse_response(self, response: str) -> str:
+        return parse_label(response, Sentiment).value
+
+    def _is_valid_response(self, response: str) -> bool:
+        try:
+            parse_label(response, Sentiment)
+        except ValueError:
+            return False
+        return True
+
+def sentiment_analyzer_interface() -> gr.Blocks:
+    """Builds the UI of the sentiment analyzer. The connector is stateless, so every session shares one."""
+    sentiment_sessions: SessionManager[DeepSeekR1SentimentAnalyzer] = SessionManager(DeepSeekR1SentimentAnalyzer, shared=True)
+    interface: gr.Interface = gr.Interface(
+        fn=sentiment_sessions.handler("ask_async"),
         inputs=gr.Textbox(label="Text to Analyze", placeholder="Enter the text you want to analyze here..."),
         outputs=gr.Textbox(label="Sentiment Analysis Result", placeholder="The sentiment analysis result will appear here..."),
         title="DeepSeek R1 Sentiment Analyzer",
         description="This application uses the DeepSeek R1 model to analyze sentiment. Enter the text you want to analyze in the input box and click 'Submit' to get the sentiment analysis result.",
     )
-    sentiment_analyzer_interface.launch()
+    return sentiment_sessions.attach(interface)
+
+if __name__ == "__main__":
+    interface = sentiment_analyzer_interface()
+    model_manager.preload()
+    interface.launch()
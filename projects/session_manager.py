@@ -0,0 +1,359 @@
+import hashlib
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Generic, Iterator, NamedTuple, TypeVar
+import gradio as gr
+from deepseek_connector import DeepSeekR1LocalConnector
+from model_manager import model_manager
+
+C = TypeVar("C", bound=DeepSeekR1LocalConnector)
+
+def history_bytes(connector: DeepSeekR1LocalConnector) -> int:
+    """
+    Args:
+        connector (DeepSeekR1LocalConnector): The connector of a session.
+
+    Returns:
+        int: The size of the retained conversation of the connector, in UTF-8 bytes. The connector itself is not counted.
+    """
+    return sum(len(message["content"].encode("utf-8")) for message in connector.export_history())
+
+class SessionStats(NamedTuple):
+    """A snapshot of the sessions of a manager, and of what happened to them since it was created."""
+    sessions: int
+    spilled: int
+    history_bytes: int
+    created: int
+    evicted: int
+    expired: int
+    restored: int
+    restore_failures: int
+
+class _Session:
+    """A live session. Guarded by the lock of the manager."""
+
+    def __init__(self, connector: DeepSeekR1LocalConnector, now: float) -> None:
+        self.connector = connector
+        self.last_used = now
+        self.active = 0
+        self.size = 0
+
+class SessionManager(Generic[C]):
+    """
+    Gives every browser session a connector of its own, so concurrent users neither share nor race on one conversation.
+
+    Sessions are keyed by the Gradio session hash and kept in LRU order. A session idle for longer than `idle_ttl` is dropped,
+    and the least recently used ones are evicted whenever there are more than `max_sessions` of them or their retained
+    conversations exceed `max_history_bytes` in total. Only the conversations are measured: the memory of the process is
+    bounded by `max_sessions` times the footprint of a connector on top of them, so connectors should share what does not
+    change between sessions, e.g. a knowledge base. With a `spill_dir`, evicted sessions are written to disk instead and
+    restored on their next request - only the conversation survives, caches of the connector are rebuilt.
+    A session busy with a request is never evicted.
+
+    Stateless connectors keep nothing between requests, so a `shared` manager lends a single connector to every session instead.
+    """
+    DEFAULT_MAX_SESSIONS: int = 1000
+    DEFAULT_IDLE_TTL: float = 30 * 60.0
+    DEFAULT_MAX_HISTORY_BYTES: int = 64 * 2 ** 20
+
+    def __init__(self,
+                 connector_type: type[C],
+                 factory: Callable[[], C] | None = None,
+                 max_sessions: int = DEFAULT_MAX_SESSIONS,
+                 idle_ttl: float | None = DEFAULT_IDLE_TTL,
+                 max_history_bytes: int | None = DEFAULT_MAX_HISTORY_BYTES,
+                 spill_dir: str | os.PathLike | None = None,
+                 measure: Callable[[C], int] = history_bytes,
+                 shared: bool = False) -> None:
+        """
+        Args:
+            connector_type (type[C]): The connector class of the sessions. Its methods are what `handler` binds.
+            factory (Callable[[], C] | None): Builds the connector of a new session. The class itself, without arguments, if None.
+            max_sessions (int): The number of sessions kept in memory.
+            idle_ttl (float | None): The seconds of inactivity after which a session is dropped, spilled or not. Never if None.
+            max_history_bytes (int | None): The total size of the conversations kept in memory. Unbounded if None.
+            spill_dir (str | os.PathLike | None): The directory evicted sessions are written to. They are dropped if None.
+            measure (Callable[[C], int]): Measures the memory held by the connector of a session, in bytes.
+            shared (bool): Whether every session is lent the same connector, built on the first request. Only for stateless
+                connectors, whose requests may run concurrently. No session is tracked then, and the limits do not apply.
+        """
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1.")
+        if idle_ttl is not None and idle_ttl <= 0:
+            raise ValueError("idle_ttl must be positive or None.")
+        if max_history_bytes is not None and max_history_bytes < 1:
+            raise ValueError("max_history_bytes must be positive or None.")
+        self.__connector_type = connector_type
+        self.__factory: Callable[[], C] = factory or connector_type
+        self.__max_sessions = max_sessions
+        self.__idle_ttl = idle_ttl
+        self.__max_history_bytes = max_history_bytes
+        self.__spill_dir = os.fspath(spill_dir) if spill_dir is not None else None
+        self.__measure = measure
+        self.__shared = shared
+        self.__shared_connector: C | None = None
+        self.__lock = threading.Lock()
+        self.__sessions: OrderedDict[str, _Session] = OrderedDict()
+        # spilled session id -> the time it was last used, oldest first.
+        self.__spilled: OrderedDict[str, float] = OrderedDict()
+        self.__history_bytes = 0
+        self.__created = self.__evicted = self.__expired = self.__restored = self.__restore_failures = 0
+        # connectors are only built by the first request of a session, so their models - those of the cascade included -
+        # are registered here to be preloaded with the others.
+        for model_id in connector_type.models():
+            model_manager.register(model_id, connector_type.CONTEXT_TOKENS)
+        if self.__spill_dir is not None:
+            os.makedirs(self.__spill_dir, exist_ok=True)
+            self.__remove_stale_spills()
+
+    #region Properties
+    @property
+    def connector_type(self) -> type[C]:
+        return self.__connector_type
+
+    @property
+    def stats(self) -> SessionStats:
+        with self.__lock:
+            return SessionStats(len(self.__sessions), len(self.__spilled), self.__history_bytes,
+                                self.__created, self.__evicted, self.__expired, self.__restored, self.__restore_failures)
+    #endregion
+
+    @contextmanager
+    def session(self, session_id: str | None) -> Iterator[C]:
+        """
+        Lends the connector of a session for the duration of a request.
+
+        Args:
+            session_id (str | None): The session, e.g. the Gradio session hash. A throwaway connector is lent if None.
+
+        Yields:
+            C: The connector of the session, created or restored from disk if needed. The shared one for a shared manager.
+        """
+        if self.__shared:
+            yield self.__acquire_shared()
+            return
+        if session_id is None:
+            yield self.__factory()
+            return
+        connector = self.__acquire(session_id)
+        try:
+            yield connector
+        finally:
+            self.__release(session_id, connector)
+
+    def close(self, session_id: str) -> None:
+        """Drops a session, e.g. when its browser tab is closed, together with its spilled conversation."""
+        with self.__lock:
+            session = self.__sessions.pop(session_id, None)
+            if session is not None:
+                self.__history_bytes -= session.size
+            if self.__spilled.pop(session_id, None) is not None:
+                self.__remove_spill(session_id)
+
+    def sweep(self) -> int:
+        """
+        Drops the sessions idle for longer than the TTL. Runs on every request anyway, but can be scheduled for quiet periods.
+
+        Returns:
+            int: The number of sessions dropped.
+        """
+        with self.__lock:
+            return self.__expire(time.monotonic())
+
+    def handler(self, method: str) -> Callable[..., Any]:
+        """
+        Binds a method of the connector class as a Gradio event handler that runs on the connector of the calling session.
+        Plain, generator, async and async generator methods are all supported, with the same inputs as the method.
+
+        Args:
+            method (str): The name of the method, e.g. 'ask_async'.
+
+        Returns:
+            Callable[..., Any]: The handler, which takes the inputs of the method followed by the `gr.Request` Gradio injects.
+        """
+        function = getattr(self.__connector_type, method)
+        key = self.__session_id
+
+        if inspect.isasyncgenfunction(function):
+            async def bound(*args: Any) -> AsyncIterator[Any]:
+                *inputs, request = args
+                with self.session(key(request)) as connector:
+                    async for item in getattr(connector, method)(*inputs):
+                        yield item
+        elif inspect.iscoroutinefunction(function):
+            async def bound(*args: Any) -> Any:
+                *inputs, request = args
+                with self.session(key(request)) as connector:
+                    return await getattr(connector, method)(*inputs)
+        elif inspect.isgeneratorfunction(function):
+            def bound(*args: Any) -> Iterator[Any]:
+                *inputs, request = args
+                with self.session(key(request)) as connector:
+                    yield from getattr(connector, method)(*inputs)
+        else:
+            def bound(*args: Any) -> Any:
+                *inputs, request = args
+                with self.session(key(request)) as connector:
+                    return getattr(connector, method)(*inputs)
+
+        # Gradio reads the inputs off the signature, and passes the request to the parameter annotated with gr.Request.
+        parameters = list(inspect.signature(function).parameters.values())[1:]
+        session_parameter = inspect.Parameter("session", inspect.Parameter.POSITIONAL_OR_KEYWORD, default=None, annotation=gr.Request | None)
+        bound.__signature__ = inspect.Signature([*parameters, session_parameter])  # type: ignore[attr-defined]
+        bound.__annotations__ = {"session": gr.Request | None}
+        bound.__name__ = bound.__qualname__ = method
+        bound.__doc__ = function.__doc__
+        return bound
+
+    def attach(self, blocks: gr.Blocks) -> gr.Blocks:
+        """
+        Drops the session of a browser tab as soon as it is closed, instead of waiting for the TTL.
+
+        Args:
+            blocks (gr.Blocks): The UI the handlers of this manager are bound in.
+
+        Returns:
+            gr.Blocks: The same UI.
+        """
+        blocks.unload(self.__close_request)
+        return blocks
+
+    def __close_request(self, session: gr.Request) -> None:
+        if session is not None and session.session_hash:
+            self.close(session.session_hash)
+
+    @staticmethod
+    def __session_id(request: Any) -> str | None:
+        return getattr(request, "session_hash", None) or None
+
+    def __acquire(self, session_id: str) -> C:
+        with self.__lock:
+            self.__expire(time.monotonic())
+            session = self.__sessions.get(session_id)
+            if session is not None:
+                return self.__lend(session_id, session)
+        # connectors may take seconds to build, so other sessions are not held up meanwhile.
+        connector = self.__factory()
+        with self.__lock:
+            session = self.__sessions.get(session_id)
+            # a concurrent first request of the same session may have got there first, and its connector is kept.
+            if session is None:
+                session = _Session(connector, time.monotonic())
+                self.__sessions[session_id] = session
+                if self.__spilled.pop(session_id, None) is not None:
+                    self.__restore(session_id, session)
+                else:
+                    self.__created += 1
+            return self.__lend(session_id, session)
+
+    def __lend(self, session_id: str, session: _Session) -> C:
+        self.__sessions.move_to_end(session_id)
+        session.last_used = time.monotonic()
+        session.active += 1
+        return session.connector  # type: ignore[return-value]
+
+    def __acquire_shared(self) -> C:
+        connector = self.__shared_connector
+        if connector is not None:
+            return connector
+        connector = self.__factory()
+        with self.__lock:
+            if self.__shared_connector is None:
+                self.__shared_connector = connector
+                self.__created += 1
+            return self.__shared_connector
+
+    def __release(self, session_id: str, connector: C) -> None:
+        size = self.__measure(connector)
+        with self.__lock:
+            session = self.__sessions.get(session_id)
+            # the session may have been closed while the request was running.
+            if session is None or session.connector is not connector:
+                return
+            session.active -= 1
+            session.last_used = time.monotonic()
+            self.__sessions.move_to_end(session_id)
+            self.__history_bytes += size - session.size
+            session.size = size
+            self.__enforce_limits()
+
+    def __expire(self, now: float) -> int:
+        if self.__idle_ttl is None:
+            return 0
+        deadline = now - self.__idle_ttl
+        expired = 0
+        # sessions are in the order they were last used, so the idle ones are all at the front.
+        idle: list[str] = []
+        for session_id, session in self.__sessions.items():
+            if session.last_used >= deadline:
+                break
+            if not session.active:
+                idle.append(session_id)
+        for session_id in idle:
+            self.__history_bytes -= self.__sessions.pop(session_id).size
+            expired += 1
+        while self.__spilled and next(iter(self.__spilled.values())) < deadline:
+            session_id, _ = self.__spilled.popitem(last=False)
+            self.__remove_spill(session_id)
+            expired += 1
+        self.__expired += expired
+        return expired
+
+    def __enforce_limits(self) -> None:
+        def over_limits() -> bool:
+            return (len(self.__sessions) > self.__max_sessions
+                    or (self.__max_history_bytes is not None and self.__history_bytes > self.__max_history_bytes))
+
+        if not over_limits():
+            return
+        for session_id in [session_id for session_id, session in self.__sessions.items() if not session.active]:
+            session = self.__sessions.pop(session_id)
+            self.__history_bytes -= session.size
+            self.__evicted += 1
+            if self.__spill_dir is not None:
+                self.__spill(session_id, session)
+            if not over_limits():
+                break
+
+    def __spill_path(self, session_id: str) -> str:
+        digest = hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.__spill_dir or "", f"{self.__connector_type.__name__}-{digest}.json")
+
+    def __spill(self, session_id: str, session: _Session) -> None:
+        history = session.connector.export_history()
+        if not history:
+            return
+        with open(self.__spill_path(session_id), "w", encoding="utf-8") as spill_file:
+            json.dump(history, spill_file, ensure_ascii=False)
+        self.__spilled[session_id] = session.last_used
+
+    def __restore(self, session_id: str, session: _Session) -> None:
+        path = self.__spill_path(session_id)
+        try:
+            with open(path, "r", encoding="utf-8") as spill_file:
+                session.connector.restore_history(json.load(spill_file))
+            self.__restored += 1
+        except (OSError, ValueError) as error:
+            # the session starts over with an empty conversation.
+            self.__restore_failures += 1
+            print(f"Warning: the conversation of a spilled session could not be restored: {error}", file=sys.stderr)
+        self.__remove_spill(session_id)
+
+    def __remove_spill(self, session_id: str) -> None:
+        try:
+            os.remove(self.__spill_path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def __remove_stale_spills(self) -> None:
+        # session hashes do not outlive the process, so spills of a previous run can never be restored.
+        prefix = f"{self.__connector_type.__name__}-"
+        for name in os.listdir(self.__spill_dir or "."):
+            if name.startswith(prefix) and name.endswith(".json"):
+                os.remove(os.path.join(self.__spill_dir or ".", name))
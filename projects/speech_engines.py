@@ -0,0 +1,203 @@
+import queue
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+import speech_recognition as sr
+
+class RecognizerPool:
+    """
+    Pool of reusable `sr.Recognizer` instances sharing one ambient-noise calibration.
+
+    Calibration listens to the microphone for about a second, so it is done once and its energy threshold is cached
+    and applied to every recognizer handed out. It is only repeated after `recalibrate_interval` seconds.
+    """
+    DEFAULT_SIZE: int = 4
+    DEFAULT_RECALIBRATE_INTERVAL: float = 300.0
+    __shared: "RecognizerPool | None" = None
+    __shared_lock: threading.Lock = threading.Lock()
+
+    def __init__(self,
+                 size: int = DEFAULT_SIZE,
+                 recalibrate_interval: float = DEFAULT_RECALIBRATE_INTERVAL,
+                 calibration_duration: float = 1.0) -> None:
+        """
+        Args:
+            size (int): The maximum number of recognizers in use at the same time.
+            recalibrate_interval (float): How long a calibration stays valid, in seconds.
+            calibration_duration (float): How long the ambient noise is sampled, in seconds.
+        """
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self.__idle: queue.LifoQueue[sr.Recognizer] = queue.LifoQueue()
+        self.__slots = threading.BoundedSemaphore(size)
+        self.__lock = threading.Lock()
+        self.__recalibrate_interval = recalibrate_interval
+        self.__calibration_duration = calibration_duration
+        self.__energy_threshold: float | None = None
+        self.__calibrated_at: float = float("-inf")
+
+    @classmethod
+    def shared(cls) -> "RecognizerPool":
+        """
+        Returns:
+            RecognizerPool: The pool shared by the whole process.
+        """
+        with cls.__shared_lock:
+            if cls.__shared is None:
+                cls.__shared = cls()
+            return cls.__shared
+
+    @property
+    def energy_threshold(self) -> float | None:
+        """The cached ambient-noise threshold, or None before the first calibration."""
+        return self.__energy_threshold
+
+    @property
+    def needs_calibration(self) -> bool:
+        return time.monotonic() - self.__calibrated_at >= self.__recalibrate_interval
+
+    @contextmanager
+    def acquire(self) -> Iterator[sr.Recognizer]:
+        """Lends a recognizer, set up with the cached calibration, for the duration of the block."""
+        with self.__slots:
+            try:
+                recognizer = self.__idle.get_nowait()
+            except queue.Empty:
+                recognizer = sr.Recognizer()
+            if self.__energy_threshold is not None:
+                recognizer.energy_threshold = self.__energy_threshold
+            try:
+                yield recognizer
+            finally:
+                self.__idle.put(recognizer)
+
+    def calibrate(self, recognizer: sr.Recognizer, source: sr.AudioSource) -> None:
+        """
+        Measures the ambient noise with the given source, unless another thread has just done it, and caches the threshold.
+
+        Args:
+            recognizer (sr.Recognizer): A recognizer lent by this pool.
+            source (sr.AudioSource): The open microphone.
+        """
+        with self.__lock:
+            if not self.needs_calibration:
+                recognizer.energy_threshold = self.__energy_threshold
+                return
+            recognizer.adjust_for_ambient_noise(source, duration=self.__calibration_duration)
+            self.__energy_threshold = recognizer.energy_threshold
+            self.__calibrated_at = time.monotonic()
+
+class SpeechJob:
+    """A text queued for speech. Can be waited for."""
+
+    def __init__(self, text: str, owner: Any, generation: int) -> None:
+        self.text = text
+        self.owner = owner
+        self.generation = generation
+        self.__done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.__done.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self.__done.wait(timeout)
+
+    def _finish(self) -> None:
+        self.__done.set()
+
+class TTSWorker:
+    """
+    Dedicated thread that owns the text-to-speech engine and speaks queued jobs one after another.
+
+    pyttsx3 hands out one engine per driver for the whole process, and its `runAndWait` must not be entered by
+    several threads at once. Funnelling every session through this worker keeps the engine consistent, while callers
+    only enqueue text and return immediately. Jobs of an owner (e.g. a session) that were not spoken yet can be cancelled.
+    """
+    __shared: "TTSWorker | None" = None
+    __shared_lock: threading.Lock = threading.Lock()
+
+    def __init__(self, engine_factory: Callable[[], Any]) -> None:
+        """
+        Args:
+            engine_factory (Callable[[], Any]): Creates the engine, e.g. `pyttsx3.init`. Called on the worker thread.
+        """
+        self.__engine_factory = engine_factory
+        self.__jobs: queue.Queue[SpeechJob | None] = queue.Queue()
+        self.__generations: weakref.WeakKeyDictionary[Any, int] = weakref.WeakKeyDictionary()
+        self.__lock = threading.Lock()
+        self.__last_error: Exception | None = None
+        self.__worker = threading.Thread(target=self.__run, name="tts-worker", daemon=True)
+        self.__worker.start()
+
+    @classmethod
+    def shared(cls, engine_factory: Callable[[], Any]) -> "TTSWorker":
+        """
+        Returns the worker shared by the whole process, creating it with `engine_factory` on first use.
+        """
+        with cls.__shared_lock:
+            if cls.__shared is None:
+                cls.__shared = cls(engine_factory)
+            return cls.__shared
+
+    @property
+    def pending(self) -> int:
+        return self.__jobs.qsize()
+
+    @property
+    def last_error(self) -> Exception | None:
+        """The latest failure of the worker, creating the engine or speaking a job, or None if nothing failed yet."""
+        return self.__last_error
+
+    def speak(self, text: str, owner: Any = None) -> SpeechJob:
+        """
+        Queues a text for speech.
+
+        Args:
+            text (str): The text to speak.
+            owner (Any): The object the job belongs to, for `cancel`. Must support weak references.
+
+        Returns:
+            SpeechJob: The queued job.
+        """
+        with self.__lock:
+            generation = self.__generations.get(owner, 0) if owner is not None else 0
+        job = SpeechJob(text, owner, generation)
+        self.__jobs.put(job)
+        return job
+
+    def cancel(self, owner: Any) -> None:
+        """Skips every job of the owner that has not started yet."""
+        with self.__lock:
+            self.__generations[owner] = self.__generations.get(owner, 0) + 1
+
+    def close(self) -> None:
+        self.__jobs.put(None)
+
+    def __is_cancelled(self, job: SpeechJob) -> bool:
+        if job.owner is None:
+            return False
+        with self.__lock:
+            return self.__generations.get(job.owner, 0) != job.generation
+
+    def __run(self) -> None:
+        try:
+            engine = self.__engine_factory()
+        except Exception as error:
+            # without an engine (e.g. no speech driver installed) the jobs are still drained, so nobody waits forever.
+            self.__last_error = error
+            print(f"Text-to-speech is unavailable: {error}", file=sys.stderr)
+            engine = None
+        while (job := self.__jobs.get()) is not None:
+            try:
+                if engine is not None and not self.__is_cancelled(job):
+                    engine.say(job.text)
+                    engine.runAndWait()
+            except Exception as error:
+                self.__last_error = error
+                print(f"Text-to-speech failed: {error}", file=sys.stderr)
+            finally:
+                job._finish()
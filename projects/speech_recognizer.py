@@ -1,25 +1,187 @@
+from enum import Enum
 from io import BytesIO
+from typing import Any
+import os
+import threading
 import speech_recognition as sr
 import numpy as np
+from speech_engines import RecognizerPool
+
+class SpeechEngine(Enum):
+    GOOGLE = "google"
+    WHISPER = "whisper"
+
+def to_mono_float32(samples: np.ndarray, sample_rate: int, target_rate: int = 16000) -> np.ndarray:
+    """
+    Converts audio as delivered by Gradio (integer or float samples, mono or multi-channel) into the
+    mono float32 samples in [-1, 1] at `target_rate` that Whisper expects.
+
+    Args:
+        samples (np.ndarray): The samples, shaped (frames,) or (frames, channels).
+        sample_rate (int): The sample rate of the samples.
+        target_rate (int): The sample rate to resample to.
+
+    Returns:
+        np.ndarray: The converted samples.
+    """
+    if np.issubdtype(samples.dtype, np.integer):
+        converted = samples.astype(np.float32) / float(np.iinfo(samples.dtype).max)
+    else:
+        converted = samples.astype(np.float32, copy=False)
+    if converted.ndim > 1:
+        converted = converted.mean(axis=1)
+    if sample_rate != target_rate and len(converted):
+        duration = len(converted) / sample_rate
+        target_positions = np.linspace(0.0, duration, int(duration * target_rate), endpoint=False, dtype=np.float64)
+        source_positions = np.arange(len(converted), dtype=np.float64) / sample_rate
+        converted = np.interp(target_positions, source_positions, converted).astype(np.float32)
+    return converted
+
+def trim_silence(samples: np.ndarray, sample_rate: int, threshold: float = 0.01, frame_ms: int = 30, padding_ms: int = 200) -> np.ndarray:
+    """
+    Energy-based voice activity detection: cuts the leading and trailing frames whose RMS is below the threshold,
+    so silence around an utterance is never sent to the model.
+
+    Args:
+        samples (np.ndarray): Mono float32 samples in [-1, 1].
+        sample_rate (int): The sample rate of the samples.
+        threshold (float): The RMS below which a frame counts as silence.
+        frame_ms (int): The frame length, in milliseconds.
+        padding_ms (int): The audio kept around the detected speech, in milliseconds.
+
+    Returns:
+        np.ndarray: The trimmed samples. Empty if there is no speech at all.
+    """
+    frame = max(int(sample_rate * frame_ms / 1000), 1)
+    frames = len(samples) // frame
+    if frames == 0:
+        return samples[:0]
+    energy = np.sqrt(np.mean(np.square(samples[:frames * frame].reshape(frames, frame)), axis=1))
+    voiced = np.flatnonzero(energy >= threshold)
+    if not len(voiced):
+        return samples[:0]
+    padding = int(sample_rate * padding_ms / 1000)
+    start = max(int(voiced[0]) * frame - padding, 0)
+    end = min((int(voiced[-1]) + 1) * frame + padding, len(samples))
+    return samples[start:end]
+
+class WhisperTranscriber:
+    """
+    Offline speech-to-text with faster-whisper.
+    Models are loaded once per size, device and compute type, and stay resident for every later transcription.
+    """
+    SAMPLE_RATE: int = 16000
+    __models: dict[tuple[str, str, str], Any] = {}
+    __models_lock: threading.Lock = threading.Lock()
+
+    def __init__(self,
+                 model_size: str = "base",
+                 device: str = "cpu",
+                 compute_type: str = "int8",
+                 language: str | None = None,
+                 beam_size: int = 1,
+                 vad_filter: bool = True) -> None:
+        """
+        Args:
+            model_size (str): The Whisper model, e.g. 'tiny', 'base', 'small', or a path to a converted model.
+            device (str): The device to run on.
+            compute_type (str): The quantization of the model. int8 is the fastest on CPU.
+            language (str | None): The language spoken, or None to detect it.
+            beam_size (int): The beam size of decoding. Greedy decoding (1) is the fastest.
+            vad_filter (bool): Whether faster-whisper should also skip silent stretches inside the audio with its Silero VAD.
+        """
+        self.__key = (model_size, device, compute_type)
+        self.__language = language
+        self.__beam_size = beam_size
+        self.__vad_filter = vad_filter
+
+    @property
+    def model(self) -> Any:
+        """The resident model, loaded on first use."""
+        with self.__models_lock:
+            model = self.__models.get(self.__key)
+            if model is None:
+                # imported here, so the Google engine keeps working where faster-whisper is not installed.
+                from faster_whisper import WhisperModel
+                model_size, device, compute_type = self.__key
+                model = WhisperModel(model_size, device=device, compute_type=compute_type)
+                self.__models[self.__key] = model
+            return model
+
+    def transcribe(self, samples: np.ndarray, sample_rate: int) -> str:
+        """
+        Transcribes raw audio samples.
+
+        Args:
+            samples (np.ndarray): The samples, of any dtype and channel layout Gradio produces.
+            sample_rate (int): The sample rate of the samples.
+
+        Returns:
+            str: The transcript. Empty if the audio holds no speech.
+        """
+        audio = trim_silence(to_mono_float32(samples, sample_rate, self.SAMPLE_RATE), self.SAMPLE_RATE)
+        if not len(audio):
+            return ""
+        segments, _ = self.model.transcribe(audio,
+                                            language=self.__language,
+                                            beam_size=self.__beam_size,
+                                            vad_filter=self.__vad_filter,
+                                            condition_on_previous_text=False)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def transcribe_audio_data(self, audio: sr.AudioData) -> str:
+        raw = audio.get_raw_data(convert_rate=self.SAMPLE_RATE, convert_width=2)
+        return self.transcribe(np.frombuffer(raw, dtype=np.int16), self.SAMPLE_RATE)
 
 class SpeechRecognizer:
+    """
+    Turns speech into text, either with the Google Web Speech API or offline with faster-whisper.
+    The engine defaults to the SPEECH_ENGINE environment variable ('google' or 'whisper'), and the Whisper model to WHISPER_MODEL.
+    """
+
+    def __init__(self,
+                 engine: SpeechEngine | None = None,
+                 whisper: WhisperTranscriber | None = None,
+                 recognizers: RecognizerPool | None = None) -> None:
+        self.__recognizers = recognizers or RecognizerPool.shared()
+        self.__engine = engine or SpeechEngine(os.getenv("SPEECH_ENGINE", SpeechEngine.GOOGLE.value).lower())
+        self.__whisper = whisper or (WhisperTranscriber(model_size=os.getenv("WHISPER_MODEL", "base"))
+                                     if self.__engine is SpeechEngine.WHISPER else None)
+
+    @property
+    def engine(self) -> SpeechEngine:
+        return self.__engine
+
     def listen_for_request(self, audio: list[int] | tuple[int, np.ndarray] | sr.AudioData | None = None) -> str:
-        recognizer: sr.Recognizer = sr.Recognizer()
-        if audio is None:
-            with sr.Microphone() as micro:
-                recognizer.adjust_for_ambient_noise(micro)
-                audio = recognizer.listen(micro)
-            recognized_audio = recognizer.recognize_google(audio)
-        elif isinstance(audio, tuple):
-            sample_width: int = audio[1].itemsize
-            audio_data = sr.AudioData(audio[1].tobytes(), audio[0], sample_width)
-            recognized_audio = recognizer.recognize_google(audio_data)
-        elif isinstance(audio, sr.AudioData):
-            recognized_audio = recognizer.recognize_google(audio)
-        else:
-            raise ValueError("Unsupported audio type. Must be list, AudioData, or None.")
+        if isinstance(audio, tuple) and self.__whisper is not None:
+            # the samples go to Whisper as they are, without the round-trip through raw bytes and AudioData.
+            return self.__whisper.transcribe(audio[1], audio[0])
+        with self.__recognizers.acquire() as recognizer:
+            if audio is None:
+                with sr.Microphone() as micro:
+                    # the ambient noise is measured once and cached by the pool, not before every request.
+                    if self.__recognizers.needs_calibration:
+                        self.__recognizers.calibrate(recognizer, micro)
+                    audio = recognizer.listen(micro)
+                recognized_audio = self.__recognize(recognizer, audio)
+            elif isinstance(audio, tuple):
+                samples = audio[1]
+                if np.issubdtype(samples.dtype, np.floating):
+                    samples = (np.clip(samples, -1.0, 1.0) * np.iinfo(np.int16).max).astype(np.int16)
+                sample_width: int = samples.itemsize
+                audio_data = sr.AudioData(samples.tobytes(), audio[0], sample_width)
+                recognized_audio = recognizer.recognize_google(audio_data)
+            elif isinstance(audio, sr.AudioData):
+                recognized_audio = self.__recognize(recognizer, audio)
+            else:
+                raise ValueError("Unsupported audio type. Must be list, AudioData, or None.")
         return recognized_audio
 
+    def __recognize(self, recognizer: sr.Recognizer, audio: sr.AudioData) -> str:
+        if self.__whisper is not None:
+            return self.__whisper.transcribe_audio_data(audio)
+        return recognizer.recognize_google(audio)
+
 if __name__ == "__main__":
     recognizer = SpeechRecognizer()
     print("Listening for request...")
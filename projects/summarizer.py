@@ -1,4 +1,10 @@
+import os
+from typing import Iterable
+from conversation_memory import estimate_tokens
 from deepseek_connector import DeepSeekR1LocalConnector
+from model_manager import model_manager
+from session_manager import SessionManager
+from document_preprocessing import iter_text_file
 from ollama import chat, ChatResponse
 import gradio as gr
 
@@ -6,7 +12,13 @@ class DeepSeekR1Summarizer(DeepSeekR1LocalConnector):
     """
     DeepSeek R1 Summarizer class that inherits from DeepSeekR1LocalConnector.
     This class is used to summarize text using the DeepSeek R1 model.
+    Texts longer than the context window are summarized part by part, and the partial summaries are combined hierarchically.
     """
+    __PART_PROMPT: str = "Summarize this part of a longer text:{text}Respond ONLY with a concise summary of this part, nothing more."
+    __COMBINE_PROMPT: str = "Combine these summaries of consecutive parts of a longer text into one concise summary:{text}Respond ONLY with the combined summary, nothing more."
+    __FINAL_PROMPT: str = ("These are summaries of consecutive parts of a longer text:{text}"
+                           "Respond with concise summary of the whole text and bullet list of main subjects covered in it.")
+    __WHOLE_PROMPT: str = "Summarize the following text:{text}"
 
     def __init__(self):
         """
@@ -24,21 +36,85 @@ class DeepSeekR1Summarizer(DeepSeekR1LocalConnector):
         Returns:
             str: The summary of the text.
         """
+        if self._is_long(request):
+            return self._answer_long(request)
+        self._add_user_message(self._build_prompt(request))
+        return self._query()
+
+    def summarize_document(self, document: str | Iterable[str], concurrency: int = 4) -> str:
+        """
+        Summarizes a document of any length with map-reduce: parts that fit the context are summarized in parallel,
+        then their summaries are combined, level by level, into the final summary and bullet list.
+
+        Args:
+            document (str | Iterable[str]): The text, or its pieces (e.g. an open text stream), which are read lazily.
+            concurrency (int): The maximum number of parts summarized at the same time.
+
+        Returns:
+            str: The summary of the document.
+        """
+        return self._map_reduce(document,
+                                self.__PART_PROMPT,
+                                self.__COMBINE_PROMPT,
+                                concurrency=concurrency,
+                                final_template=self.__FINAL_PROMPT,
+                                whole_template=self.__WHOLE_PROMPT)
+
+    def summarize_file(self, path: str | os.PathLike | None, concurrency: int = 4) -> str:
+        """
+        Summarizes a text file, e.g. an upload of `gr.File`, reading it line by line.
+
+        Args:
+            path (str | os.PathLike | None): The path of the file.
+            concurrency (int): The maximum number of parts summarized at the same time.
+
+        Returns:
+            str: The summary of the file.
+        """
+        if not path:
+            raise ValueError("No file was provided.")
+        return self.summarize_document(iter_text_file(path), concurrency)
+
+    def _is_long(self, request: str, isolated: bool = False) -> bool:
+        # the retained turns of the session go out with the text, so they count against the budget as well.
+        history = 0 if isolated else self._memory.used
+        return bool(request) and estimate_tokens(request) + history > self._chunk_token_budget
+
+    def _answer_long(self, request: str) -> str:
+        # texts over the context budget never go out as a single prompt, whichever entry point they come through.
+        return self.summarize_document(request)
+
+    def _build_prompt(self, request: str) -> str:
         if not request or request.strip() == "":
             raise ValueError("Request cannot be empty.")
-        prompt: str = (f"Summarize the following text:\n\n{request}\n\n")
-        self._add_user_message(prompt)
-        return self._query()
+        return f"Summarize the following text:\n\n{request}\n\n"
+
 
+def summarizer_interface() -> gr.Blocks:
+    """Builds the UI of the summarizer. Every session gets its connector on its first request."""
+    summarizer_sessions: SessionManager[DeepSeekR1Summarizer] = SessionManager(DeepSeekR1Summarizer)
+    interface: gr.TabbedInterface = gr.TabbedInterface(
+        [
+            gr.Interface(
+                fn=summarizer_sessions.handler("ask_stream_async"),
+                inputs=gr.Textbox(label="Text to Summarize", placeholder="Enter the text you want to summarize here..."),
+                outputs=gr.Textbox(label="Summary", placeholder="The summary will appear here..."),
+                title="DeepSeek R1 Text Summarizer",
+                description="This application uses the DeepSeek R1 model to summarize text. Enter the text you want to summarize in the input box and click 'Submit' to get the summary.",
+            ),
+            gr.Interface(
+                fn=summarizer_sessions.handler("summarize_file"),
+                inputs=gr.File(label="Text File to Summarize", file_types=[".txt", ".md"], type="filepath"),
+                outputs=gr.Textbox(label="Summary", placeholder="The summary will appear here..."),
+                title="DeepSeek R1 Document Summarizer",
+                description="Summarizes long documents part by part. Upload a text file and click 'Submit' to get the summary.",
+            ),
+        ],
+        tab_names=["Text", "Document"],
+    )
+    return summarizer_sessions.attach(interface)
 
-summarizer = DeepSeekR1Summarizer()
-summarizer_interface: gr.Interface = gr.Interface(
-    fn=summarizer.ask,
-    inputs=gr.Textbox(label="Text to Summarize", placeholder="Enter the text you want to summarize here..."),
-    outputs=gr.Textbox(label="Summary", placeholder="The summary will appear here..."),
-    title="DeepSeek R1 Text Summarizer",
-    description="This application uses the DeepSeek R1 model to summarize text. Enter the text you want to summarize in the input box and click 'Submit' to get the summary.",
-)
-    
 if __name__ == "__main__":
-    summarizer_interface.launch()
\ No newline at end of file
+    interface = summarizer_interface()
+    model_manager.preload()
+    interface.launch()
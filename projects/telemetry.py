@@ -0,0 +1,380 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, NamedTuple, TextIO
+
+class RequestRecord(NamedTuple):
+    """
+    The measurements of a single model request. Durations are in seconds; the server ones are 0 when the request failed.
+    """
+    task: str
+    model: str
+    stream: bool
+    timestamp: float
+    outcome: str
+    queue_seconds: float
+    latency_seconds: float
+    total_seconds: float
+    load_seconds: float
+    prompt_tokens: int
+    prompt_eval_seconds: float
+    completion_tokens: int
+    eval_seconds: float
+    error: str | None
+
+    @property
+    def tokens_per_second(self) -> float:
+        """The generation speed of the completion, as measured by the server."""
+        return self.completion_tokens / self.eval_seconds if self.eval_seconds > 0 else 0.0
+
+class Histogram:
+    """Cumulative histogram with fixed bucket bounds, as exposed by Prometheus."""
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, quantile: float) -> float:
+        """
+        Estimates a quantile as the upper bound of the bucket it falls into.
+
+        Args:
+            quantile (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The estimate. Infinity if it falls above the last bound, 0 if nothing was observed.
+        """
+        if not self.count:
+            return 0.0
+        rank = quantile * self.count
+        seen = 0
+        for bound, count in zip((*self.bounds, float("inf")), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class _Series:
+    """The aggregated measurements of a task and model. Guarded by the lock of the telemetry."""
+    LATENCY_BOUNDS: tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+    QUEUE_BOUNDS: tuple[float, ...] = (0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+    SPEED_BOUNDS: tuple[float, ...] = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0)
+
+    def __init__(self) -> None:
+        self.outcomes: dict[str, int] = {}
+        self.cache_hits = 0
+        self.latency = Histogram(self.LATENCY_BOUNDS)
+        self.queue = Histogram(self.QUEUE_BOUNDS)
+        self.speed = Histogram(self.SPEED_BOUNDS)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.load_seconds = 0.0
+        self.prompt_eval_seconds = 0.0
+        self.eval_seconds = 0.0
+        self.strip_seconds = 0.0
+        self.reasoning_characters = 0
+
+class CallTracker:
+    """
+    Measures a single model request. Created by `Telemetry.track`; the caller marks when the request leaves the queue
+    and hands over the final response. Leaving the block with an exception records the request as failed or cancelled.
+    """
+
+    def __init__(self, telemetry: "Telemetry", task: str, model: str, stream: bool) -> None:
+        self.__telemetry = telemetry
+        self.__task = task
+        self.__model = model
+        self.__stream = stream
+        self.__timestamp = time.time()
+        self.__queued = time.perf_counter()
+        self.__dispatched: float | None = None
+        self.__response: Any = None
+
+    def dispatched(self) -> None:
+        """Marks the moment a concurrency slot was acquired and the request was sent."""
+        self.__dispatched = time.perf_counter()
+
+    def completed(self, response: Any) -> None:
+        """
+        Args:
+            response (Any): The ChatResponse, or the final part of a streamed one, carrying the timing fields.
+        """
+        self.__response = response
+
+    def __enter__(self) -> "CallTracker":
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, error: BaseException | None, traceback: Any) -> None:
+        finished = time.perf_counter()
+        dispatched = self.__dispatched if self.__dispatched is not None else finished
+        if exc_type is None:
+            outcome, message = "ok", None
+        elif issubclass(exc_type, (GeneratorExit, asyncio.CancelledError, KeyboardInterrupt)):
+            # the consumer stopped reading a stream, or the request was cancelled.
+            outcome, message = "cancelled", None
+        elif isinstance(getattr(exc_type, "outcome", None), str):
+            # errors that stand for an outcome of their own, e.g. a rejection by the scheduler.
+            outcome, message = exc_type.outcome, f"{exc_type.__name__}: {error}"  # type: ignore[attr-defined]
+        else:
+            outcome, message = "error", f"{exc_type.__name__}: {error}"
+        response = self.__response
+
+        def field(name: str) -> int:
+            return (getattr(response, name, None) or 0) if response is not None else 0
+
+        self.__telemetry.record(RequestRecord(
+            task=self.__task,
+            model=self.__model,
+            stream=self.__stream,
+            timestamp=self.__timestamp,
+            outcome=outcome,
+            queue_seconds=dispatched - self.__queued,
+            latency_seconds=finished - self.__queued,
+            total_seconds=field("total_duration") / 1e9,
+            load_seconds=field("load_duration") / 1e9,
+            prompt_tokens=field("prompt_eval_count"),
+            prompt_eval_seconds=field("prompt_eval_duration") / 1e9,
+            completion_tokens=field("eval_count"),
+            eval_seconds=field("eval_duration") / 1e9,
+            error=message,
+        ))
+
+class Telemetry:
+    """
+    Process-wide metrics of the model requests of every connector, per task (connector class) and model.
+
+    Records latency, queueing and generation speed histograms, prompt and completion tokens, server-side durations,
+    cache hits, reasoning-stripping overhead and errors. Exposes them in the Prometheus text format, optionally over HTTP,
+    writes every request to a JSON-lines log if one is opened (the TELEMETRY_LOG environment variable opens one at start),
+    and passes every request to the registered tracing hooks. Registered collectors add the metrics of other components.
+    """
+    PREFIX: str = "deepseek"
+
+    def __init__(self, log_path: str | None = None) -> None:
+        self.__lock = threading.Lock()
+        self.__series: dict[tuple[str, str], _Series] = {}
+        self.__hooks: list[Callable[[RequestRecord], None]] = []
+        self.__collectors: list[Callable[[], str]] = []
+        self.__log: TextIO | None = None
+        self.__server: ThreadingHTTPServer | None = None
+        if log_path:
+            self.open_log(log_path)
+
+    def track(self, task: str, model: str, stream: bool = False) -> CallTracker:
+        """
+        Args:
+            task (str): The task, e.g. the name of the connector class.
+            model (str): The model queried.
+            stream (bool): Whether the response is streamed.
+
+        Returns:
+            CallTracker: The context manager measuring the request.
+        """
+        return CallTracker(self, task, model, stream)
+
+    def record(self, record: RequestRecord) -> None:
+        """Aggregates a request, logs it and passes it to the hooks."""
+        with self.__lock:
+            series = self.__series_of(record.task, record.model)
+            series.outcomes[record.outcome] = series.outcomes.get(record.outcome, 0) + 1
+            series.latency.observe(record.latency_seconds)
+            series.queue.observe(record.queue_seconds)
+            series.prompt_tokens += record.prompt_tokens
+            series.completion_tokens += record.completion_tokens
+            series.load_seconds += record.load_seconds
+            series.prompt_eval_seconds += record.prompt_eval_seconds
+            series.eval_seconds += record.eval_seconds
+            if record.tokens_per_second:
+                series.speed.observe(record.tokens_per_second)
+            if self.__log is not None:
+                self.__log.write(json.dumps({**record._asdict(), "tokens_per_second": record.tokens_per_second}) + "\n")
+                self.__log.flush()
+            hooks = list(self.__hooks)
+        for hook in hooks:
+            try:
+                hook(record)
+            except Exception as error:
+                # a broken hook must never fail the request it observes.
+                print(f"Telemetry hook {hook!r} failed: {error}")
+
+    def observe_cache_hit(self, task: str, model: str) -> None:
+        with self.__lock:
+            self.__series_of(task, model).cache_hits += 1
+
+    def observe_strip(self, task: str, model: str, seconds: float, reasoning_characters: int = 0) -> None:
+        """Adds the time spent removing reasoning blocks from a response, and the size of the reasoning removed."""
+        with self.__lock:
+            series = self.__series_of(task, model)
+            series.strip_seconds += seconds
+            series.reasoning_characters += reasoning_characters
+
+    def add_hook(self, hook: Callable[[RequestRecord], None]) -> None:
+        """
+        Registers a tracing hook, called with the record of every request once it completes, on the thread that made it.
+        """
+        with self.__lock:
+            self.__hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[RequestRecord], None]) -> None:
+        with self.__lock:
+            self.__hooks.remove(hook)
+
+    def add_collector(self, collector: Callable[[], str]) -> None:
+        """
+        Registers a source of further metrics, e.g. of a component outside the connectors.
+        It returns them in the Prometheus text format, and is called whenever `prometheus` is.
+        """
+        with self.__lock:
+            self.__collectors.append(collector)
+
+    def open_log(self, path: str) -> None:
+        """Starts appending every request, as a JSON object per line, to the file."""
+        with self.__lock:
+            if self.__log is not None:
+                self.__log.close()
+            self.__log = open(path, "a", encoding="utf-8")
+
+    def close_log(self) -> None:
+        with self.__lock:
+            if self.__log is not None:
+                self.__log.close()
+                self.__log = None
+
+    def summary(self) -> list[dict[str, Any]]:
+        """
+        Returns:
+            list[dict[str, Any]]: The headline numbers of every task and model: requests, errors, cache hits,
+            latency percentiles (bucket estimates), tokens and generation speed.
+        """
+        with self.__lock:
+            return [
+                {
+                    "task": task,
+                    "model": model,
+                    "requests": sum(series.outcomes.values()),
+                    "errors": series.outcomes.get("error", 0),
+                    "cache_hits": series.cache_hits,
+                    "latency_p50": series.latency.quantile(0.5),
+                    "latency_p95": series.latency.quantile(0.95),
+                    "latency_p99": series.latency.quantile(0.99),
+                    "prompt_tokens": series.prompt_tokens,
+                    "completion_tokens": series.completion_tokens,
+                    "tokens_per_second": series.completion_tokens / series.eval_seconds if series.eval_seconds else 0.0,
+                    "strip_seconds": series.strip_seconds,
+                    "reasoning_characters": series.reasoning_characters,
+                }
+                for (task, model), series in self.__series.items()
+            ]
+
+    def prometheus(self) -> str:
+        """
+        Returns:
+            str: Every metric in the Prometheus text exposition format.
+        """
+        counters: list[tuple[str, str, str]] = [
+            ("requests_total", "counter", "Model requests by outcome."),
+            ("cache_hits_total", "counter", "Requests answered from the response cache."),
+            ("prompt_tokens_total", "counter", "Prompt tokens evaluated by the server."),
+            ("completion_tokens_total", "counter", "Completion tokens generated."),
+            ("load_seconds_total", "counter", "Time the server spent loading models."),
+            ("prompt_eval_seconds_total", "counter", "Time the server spent evaluating prompts."),
+            ("eval_seconds_total", "counter", "Time the server spent generating completions."),
+            ("think_strip_seconds_total", "counter", "Time spent removing reasoning blocks from responses."),
+            ("reasoning_characters_total", "counter", "Characters of reasoning removed from responses."),
+        ]
+        with self.__lock:
+            lines: list[str] = []
+            for name, kind, description in counters:
+                lines.append(f"# HELP {self.PREFIX}_{name} {description}")
+                lines.append(f"# TYPE {self.PREFIX}_{name} {kind}")
+                for (task, model), series in self.__series.items():
+                    labels = f'task="{task}",model="{model}"'
+                    if name == "requests_total":
+                        lines.extend(f'{self.PREFIX}_{name}{{{labels},outcome="{outcome}"}} {count}' for outcome, count in series.outcomes.items())
+                    else:
+                        lines.append(f"{self.PREFIX}_{name}{{{labels}}} {self.__counter_value(series, name)}")
+            for name, attribute, description in (
+                ("request_latency_seconds", "latency", "Latency of model requests, queueing included."),
+                ("queue_seconds", "queue", "Time requests waited for a concurrency slot."),
+                ("tokens_per_second", "speed", "Generation speed of completions."),
+            ):
+                lines.append(f"# HELP {self.PREFIX}_{name} {description}")
+                lines.append(f"# TYPE {self.PREFIX}_{name} histogram")
+                for (task, model), series in self.__series.items():
+                    histogram: Histogram = getattr(series, attribute)
+                    labels = f'task="{task}",model="{model}"'
+                    cumulative = 0
+                    for bound, count in zip((*histogram.bounds, float("inf")), histogram.counts):
+                        cumulative += count
+                        upper = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f'{self.PREFIX}_{name}_bucket{{{labels},le="{upper}"}} {cumulative}')
+                    lines.append(f"{self.PREFIX}_{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{self.PREFIX}_{name}_count{{{labels}}} {histogram.count}")
+            collectors = list(self.__collectors)
+        # collected outside of the lock, as collectors take locks of their own.
+        return "\n".join(lines) + "\n" + "".join(collector() for collector in collectors)
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Serves `prometheus` at /metrics on a background thread, for scraping.
+
+        Returns:
+            ThreadingHTTPServer: The running server.
+        """
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        if self.__server is None:
+            self.__server = ThreadingHTTPServer((host, port), MetricsHandler)
+            threading.Thread(target=self.__server.serve_forever, name="telemetry-metrics", daemon=True).start()
+        return self.__server
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__series.clear()
+
+    def __series_of(self, task: str, model: str) -> _Series:
+        series = self.__series.get((task, model))
+        if series is None:
+            series = self.__series[(task, model)] = _Series()
+        return series
+
+    @staticmethod
+    def __counter_value(series: _Series, name: str) -> float:
+        return {
+            "cache_hits_total": series.cache_hits,
+            "prompt_tokens_total": series.prompt_tokens,
+            "completion_tokens_total": series.completion_tokens,
+            "load_seconds_total": series.load_seconds,
+            "prompt_eval_seconds_total": series.prompt_eval_seconds,
+            "eval_seconds_total": series.eval_seconds,
+            "think_strip_seconds_total": series.strip_seconds,
+            "reasoning_characters_total": series.reasoning_characters,
+        }[name]
+
+telemetry: Telemetry = Telemetry(os.getenv("TELEMETRY_LOG") or None)
@@ -0,0 +1,17 @@
+import os
+import sys
+from typing import Iterator
+import pytest
+
+# the modules are plain files of the projects directory, not an installed package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_ollama_server import MockOllamaServer
+from ollama_client_pool import client_pool
+
+@pytest.fixture
+def mock_ollama() -> Iterator[MockOllamaServer]:
+    """A fast mock Ollama server, which the shared client pool sends the requests of the test to."""
+    with MockOllamaServer(token_rate=100_000.0, time_to_first_token=0.0) as server:
+        client_pool.configure(host=server.url)
+        yield server
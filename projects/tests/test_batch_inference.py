@@ -0,0 +1,110 @@
+import io
+import json
+import random
+import threading
+import time
+import pytest
+from batch_inference import BatchCheckpoint, main, read_records, run_batch
+from mock_ollama_server import MockOllamaServer
+from request_scheduler import QueueFullError
+
+def test_ordered_results_follow_the_input() -> None:
+    delays = [random.Random(index).random() * 0.02 for index in range(20)]
+
+    def handler(index: int) -> str:
+        time.sleep(delays[index])
+        return str(index)
+
+    results = list(run_batch(range(20), handler, concurrency=4))
+    assert [result.index for result in results] == list(range(20))
+    assert [result.response for result in results] == [str(index) for index in range(20)]
+
+def test_unordered_results_cover_the_input() -> None:
+    results = list(run_batch(range(20), lambda index: str(index), concurrency=4, ordered=False))
+    assert sorted(result.index for result in results) == list(range(20))
+
+def test_concurrency_is_bounded() -> None:
+    lock = threading.Lock()
+    state = {"in_flight": 0, "max": 0}
+
+    def handler(item: int) -> str:
+        with lock:
+            state["in_flight"] += 1
+            state["max"] = max(state["max"], state["in_flight"])
+        time.sleep(0.01)
+        with lock:
+            state["in_flight"] -= 1
+        return ""
+
+    list(run_batch(range(30), handler, concurrency=3))
+    assert state["max"] == 3
+
+def test_skipped_items_are_not_processed() -> None:
+    seen: list[int] = []
+    results = list(run_batch(range(6), lambda index: seen.append(index) or "", skip={1, 4}))
+    assert [result.index for result in results] == [0, 2, 3, 5]
+    assert sorted(seen) == [0, 2, 3, 5]
+
+def test_transient_errors_are_retried() -> None:
+    attempts = {"count": 0}
+
+    def handler(item: str) -> str:
+        attempts["count"] += 1
+        if attempts["count"] < 3:
+            raise QueueFullError("busy")
+        return item
+
+    result, = run_batch(["text"], handler, retries=2, backoff=0.001)
+    assert result.ok and result.attempts == 3
+
+def test_other_errors_fail_at_once() -> None:
+    def handler(item: str) -> str:
+        raise ValueError("No content in the response from the model.")
+
+    result, = run_batch(["text"], handler, retries=5, backoff=10.0)
+    assert not result.ok
+    assert result.attempts == 1
+    assert result.error == "ValueError: No content in the response from the model."
+
+def test_invalid_concurrency() -> None:
+    with pytest.raises(ValueError):
+        list(run_batch([1], str, concurrency=0))
+
+def test_bare_jsonl_values_are_wrapped() -> None:
+    records = list(read_records(io.StringIO('{"text": "a"}\n\n"b"\n'), "jsonl"))
+    assert records == [{"text": "a"}, {"text": "b"}]
+
+def write_input(path, count: int) -> None:
+    path.write_text("".join(json.dumps({"id": index, "text": f"I like item {index}"}) + "\n" for index in range(count)), encoding="utf-8")
+
+def read_output(path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+def test_resume_skips_completed_records(tmp_path, mock_ollama: MockOllamaServer) -> None:
+    source, output, checkpoint = tmp_path / "in.jsonl", tmp_path / "out.jsonl", tmp_path / "done.txt"
+    write_input(source, 6)
+    assert main(["sentiment", str(source), str(output), "--checkpoint", str(checkpoint)]) == 0
+    first_run = mock_ollama.requests
+    # an interrupted run: the last two records were never written.
+    rows = read_output(output)[:4]
+    output.write_text("".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8")
+    checkpoint.write_text("".join(f"{row['index']}\n" for row in rows), encoding="utf-8")
+
+    assert main(["sentiment", str(source), str(output), "--checkpoint", str(checkpoint)]) == 0
+    assert sorted(row["index"] for row in read_output(output)) == list(range(6))
+    assert BatchCheckpoint(str(checkpoint)).completed() == set(range(6))
+    assert mock_ollama.requests - first_run <= 2 * 2
+
+def test_missing_output_resets_the_checkpoint(tmp_path, mock_ollama: MockOllamaServer) -> None:
+    source, output, checkpoint = tmp_path / "in.jsonl", tmp_path / "out.jsonl", tmp_path / "done.txt"
+    write_input(source, 3)
+    checkpoint.write_text("0\n1\n2\n", encoding="utf-8")
+    assert main(["sentiment", str(source), str(output), "--checkpoint", str(checkpoint)]) == 0
+    assert [row["index"] for row in read_output(output)] == [0, 1, 2]
+
+def test_failed_records_are_retried_on_resume(tmp_path, mock_ollama: MockOllamaServer) -> None:
+    source, output, checkpoint = tmp_path / "in.jsonl", tmp_path / "out.jsonl", tmp_path / "done.txt"
+    source.write_text('{"text": "good"}\n{"other": "no text field"}\n', encoding="utf-8")
+    assert main(["sentiment", str(source), str(output), "--checkpoint", str(checkpoint)]) == 1
+    assert [row["index"] for row in read_output(output)] == [0]
+    assert BatchCheckpoint(str(checkpoint)).completed() == {0}
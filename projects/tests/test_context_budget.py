@@ -0,0 +1,47 @@
+from conversation_memory import ConversationMemory
+from deepseek_connector import DeepSeekR1LocalConnector
+from model_manager import model_manager
+from prompt_layout import estimate_prompt_tokens
+
+class EchoConnector(DeepSeekR1LocalConnector):
+    """A stateful connector with few-shot examples, queried by nobody."""
+    MODEL_ID: str = "test-context-budget"
+
+    @property
+    def _few_shot_examples(self) -> list[tuple[str, str]]:
+        return [("An example question about the weather " * 20, "An example answer " * 30)] * 3
+
+    def ask(self, request: str) -> str:
+        raise NotImplementedError
+
+def fill(connector: DeepSeekR1LocalConnector, turns: int, words: int) -> None:
+    for turn in range(turns):
+        connector._add_user_message(f"question {turn} " + "word " * words)
+        connector._add_assistant_message(f"answer {turn} " + "word " * words)
+
+def test_full_conversation_fits_the_window() -> None:
+    connector = EchoConnector(model_id=EchoConnector.MODEL_ID)
+    window = model_manager.context_window(EchoConnector.MODEL_ID)
+    assert window == connector._context_window
+    fill(connector, turns=200, words=150)
+    prompt_tokens = estimate_prompt_tokens(connector._chat_history)
+    assert prompt_tokens + connector.RESPONSE_TOKENS + connector.PROMPT_OVERHEAD_TOKENS <= window
+    # the memory is full, not empty: eviction kept as much of the conversation as fits.
+    assert prompt_tokens > window // 2
+
+def test_many_short_turns_fit_the_window() -> None:
+    # role markers of every message count against the budget, not only their content.
+    connector = EchoConnector(model_id=EchoConnector.MODEL_ID)
+    fill(connector, turns=3000, words=1)
+    prompt_tokens = estimate_prompt_tokens(connector._chat_history)
+    assert prompt_tokens + connector.RESPONSE_TOKENS + connector.PROMPT_OVERHEAD_TOKENS <= connector._context_window
+
+def test_budget_follows_the_window_of_the_model() -> None:
+    model_manager.register("test-context-budget-wide", 16384)
+    connector = EchoConnector(model_id="test-context-budget-wide")
+    assert connector._context_window == 16384
+    assert connector._memory.budget > EchoConnector(model_id=EchoConnector.MODEL_ID)._memory.budget
+
+def test_explicit_memory_is_kept() -> None:
+    memory = ConversationMemory(budget=100)
+    assert EchoConnector(memory=memory)._memory is memory
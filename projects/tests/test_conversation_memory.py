@@ -0,0 +1,70 @@
+import pytest
+from conversation_memory import ConversationMemory, LastTurnsEviction, SlidingWindowEviction, count_characters, estimate_tokens
+
+def test_estimate_tokens_rounds_up() -> None:
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abc") == 1
+    assert estimate_tokens("abcde") == 2
+
+def test_system_prompt_is_pinned_first() -> None:
+    memory = ConversationMemory("Be brief.", budget=None)
+    memory.append("user", "hello")
+    memory.extend([{"role": "system", "content": "ignored"}, {"role": "assistant", "content": "hi"}])
+    assert memory.messages() == [
+        {"role": "system", "content": "Be brief."},
+        {"role": "user", "content": "hello"},
+        {"role": "assistant", "content": "hi"},
+    ]
+
+def test_sliding_window_drops_oldest_turns_first() -> None:
+    memory = ConversationMemory(budget=10, measure=count_characters)
+    for turn in ("aaaa", "bbbb", "cccc"):
+        memory.append("user", turn)
+    assert [message["content"] for message in memory.messages()] == ["bbbb", "cccc"]
+    assert memory.used == 8
+
+def test_system_prompt_counts_against_the_budget() -> None:
+    memory = ConversationMemory("sys", budget=10, measure=count_characters)
+    assert memory.budget == 7
+    memory.append("user", "aaaa")
+    memory.append("user", "bbbb")
+    assert [message["content"] for message in memory.messages()[1:]] == ["bbbb"]
+
+def test_latest_turn_is_kept_even_over_budget() -> None:
+    memory = ConversationMemory(budget=5, measure=count_characters)
+    memory.append("user", "a" * 20)
+    assert len(memory) == 1
+    assert memory.used == 20
+
+def test_no_leading_assistant_turn_after_eviction() -> None:
+    memory = ConversationMemory(budget=12, measure=count_characters, eviction=SlidingWindowEviction())
+    memory.append("user", "q1--")
+    memory.append("assistant", "a1--")
+    memory.append("user", "q2--")
+    memory.append("assistant", "a2--")
+    roles = [message["role"] for message in memory.messages()]
+    assert roles == ["user", "assistant"]
+    assert memory.used == 8
+
+def test_last_turns_eviction_caps_the_turns() -> None:
+    memory = ConversationMemory(budget=None, eviction=LastTurnsEviction(max_turns=3))
+    for index in range(3):
+        memory.append("user", f"q{index}")
+        memory.append("assistant", f"a{index}")
+    # the cap leaves an answer first, which is dropped as well.
+    assert [message["content"] for message in memory.messages()] == ["q2", "a2"]
+
+def test_last_turns_eviction_rejects_no_turns() -> None:
+    with pytest.raises(ValueError):
+        LastTurnsEviction(0)
+
+def test_clear_keeps_the_system_prompt() -> None:
+    memory = ConversationMemory("sys")
+    memory.append("user", "hello")
+    memory.clear()
+    assert memory.messages() == [{"role": "system", "content": "sys"}]
+    assert memory.used == 0
+
+def test_invalid_budget() -> None:
+    with pytest.raises(ValueError):
+        ConversationMemory(budget=0)
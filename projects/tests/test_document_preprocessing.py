@@ -0,0 +1,80 @@
+import pytest
+from document_preprocessing import html_to_text, iter_chunks, iter_spans, iter_text_file, split_into_chunks
+
+def words(text: str) -> int:
+    return len(text.split())
+
+SENTENCES = [f"Sentence number {i} is here." for i in range(12)]
+TEXT = " ".join(SENTENCES)
+
+def test_text_that_fits_is_a_single_chunk() -> None:
+    assert split_into_chunks("One short paragraph.", 100, measure=words) == ["One short paragraph."]
+
+def test_chunks_fit_the_budget_and_keep_every_sentence() -> None:
+    chunks = split_into_chunks(TEXT, 12, measure=words)
+    assert len(chunks) > 1
+    # every unit costs its size plus one for the joining newline.
+    assert all(sum(words(line) + 1 for line in chunk.splitlines()) <= 12 for chunk in chunks)
+    assert [line for chunk in chunks for line in chunk.splitlines()] == SENTENCES
+
+def test_consecutive_chunks_overlap() -> None:
+    chunks = split_into_chunks(TEXT, 18, overlap_tokens=6, measure=words)
+    for previous, following in zip(chunks, chunks[1:]):
+        assert previous.splitlines()[-1] == following.splitlines()[0]
+    assert sorted({line for chunk in chunks for line in chunk.splitlines()}) == sorted(SENTENCES)
+
+def test_an_overlong_sentence_is_cut() -> None:
+    sentence = " ".join(["word"] * 50)
+    chunks = split_into_chunks(sentence, 10)
+    assert len(chunks) > 1
+    assert "".join(chunks) == sentence
+
+def test_pieces_are_consumed_lazily(tmp_path) -> None:
+    path = tmp_path / "document.txt"
+    path.write_text("\n".join(SENTENCES) + "\n", encoding="utf-8")
+    read: list[str] = []
+    def lines():
+        for line in iter_text_file(str(path)):
+            read.append(line)
+            yield line
+    first = next(iter_chunks(lines(), 12, measure=words))
+    assert first.splitlines() == SENTENCES[:2]
+    assert len(read) < len(SENTENCES)
+
+@pytest.mark.parametrize("max_tokens, overlap_tokens", [(0, 0), (10, 10), (10, -1)])
+def test_invalid_budgets(max_tokens: int, overlap_tokens: int) -> None:
+    with pytest.raises(ValueError):
+        split_into_chunks(TEXT, max_tokens, overlap_tokens)
+    with pytest.raises(ValueError):
+        list(iter_spans(TEXT, max_tokens, overlap_tokens))
+
+def test_spans_cover_the_text_within_the_budget() -> None:
+    spans = list(iter_spans(TEXT, 11, measure=words))
+    assert len(spans) > 1
+    assert all(words(TEXT[start:end]) <= 11 for start, end in spans)
+    assert spans[0][0] == 0 and spans[-1][1] == len(TEXT)
+    for (_, end), (start, _) in zip(spans, spans[1:]):
+        assert start == end
+
+def test_spans_end_on_sentence_boundaries() -> None:
+    for start, end in iter_spans(TEXT, 11, measure=words):
+        assert TEXT[start:end].rstrip().endswith(".")
+
+def test_spans_overlap_by_whole_sentences() -> None:
+    spans = list(iter_spans(TEXT, 16, overlap_tokens=5, measure=words))
+    for (_, end), (start, next_end) in zip(spans, spans[1:]):
+        assert start < end < next_end
+        assert TEXT[start:end].strip() in SENTENCES
+
+def test_spans_cut_a_text_without_boundaries() -> None:
+    text = "x" * 1000
+    spans = list(iter_spans(text, 50))
+    assert len(spans) > 1
+    assert "".join(text[start:end] for start, end in spans) == text
+
+def test_html_to_text_keeps_the_requested_section() -> None:
+    html = """<html><body><nav>Menu</nav>
+        <section id="experience"><p>Engineer at Acme</p></section>
+        <section id="education"><p>MSc</p></section></body></html>"""
+    assert "Menu" not in html_to_text(html)
+    assert html_to_text(html, "experience") == "Engineer at Acme"
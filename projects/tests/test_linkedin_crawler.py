@@ -0,0 +1,78 @@
+import threading
+import time
+from typing import Iterator
+import pytest
+import requests
+from batch_inference import load_module
+from mock_ollama_server import MockOllamaServer
+from ollama_client_pool import client_pool
+
+resume_generator = load_module("ai-resume-generator.py")
+
+class CountingSession(requests.Session):
+    """An HTTP session that holds every request for a while and records how many were in flight at once."""
+
+    def __init__(self, delay: float) -> None:
+        super().__init__()
+        self.delay = delay
+        self.urls: list[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.__lock = threading.Lock()
+
+    def get(self, url, **kwargs):  # type: ignore[override]
+        with self.__lock:
+            self.urls.append(url)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            return super().get(url, **kwargs)
+        finally:
+            with self.__lock:
+                self.in_flight -= 1
+
+class CountingCrawler(resume_generator.LinkedInCrawler):
+    """A crawler that records how many section extractions run at once."""
+
+    def __init__(self, session: requests.Session, delay: float) -> None:
+        super().__init__(session=session)
+        self.delay = delay
+        self.extracting = 0
+        self.max_extracting = 0
+        self.__lock = threading.Lock()
+
+    def _complete(self, prompt, response_format=None, prefix=None):
+        with self.__lock:
+            self.extracting += 1
+            self.max_extracting = max(self.max_extracting, self.extracting)
+        try:
+            time.sleep(self.delay)
+            return super()._complete(prompt, response_format, prefix)
+        finally:
+            with self.__lock:
+                self.extracting -= 1
+
+@pytest.fixture
+def mock() -> Iterator[MockOllamaServer]:
+    with MockOllamaServer(token_rate=100_000.0, time_to_first_token=0.0, missing_pages=["/details/certifications"]) as server:
+        client_pool.configure(host=server.url)
+        yield server
+
+def test_pages_are_fetched_and_sections_extracted_concurrently(mock: MockOllamaServer) -> None:
+    session = CountingSession(delay=0.2)
+    crawler = CountingCrawler(session, delay=0.2)
+    crawler.ask(f"{mock.url}/in/40/")
+    assert sorted(session.urls) == sorted([f"{mock.url}/in/40", f"{mock.url}/in/40/details/skills", f"{mock.url}/in/40/details/certifications"])
+    assert session.max_in_flight == 3
+    # the certifications page is missing, so four sections are extracted, all of them at once.
+    assert crawler.max_extracting == 4
+
+def test_sections_are_assembled_in_order(mock: MockOllamaServer) -> None:
+    crawler = resume_generator.LinkedInCrawler()
+    crawler.ask(f"{mock.url}/in/40")
+    prompt = crawler.export_history()[0]["content"]
+    positions = [prompt.index(f"{name}:") for name in ("Profile", "Education", "Experience", "Skills", "Certifications")]
+    assert positions == sorted(positions)
+    assert "No certifications information available." in prompt[positions[-1]:]
+    assert "No skills information available." not in prompt
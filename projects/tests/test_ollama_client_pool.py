@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+import pytest
+from deepseek_connector import DeepSeekR1LocalConnector
+from mock_ollama_server import MockOllamaServer
+from ollama_client_pool import OllamaClientPool
+
+class EchoConnector(DeepSeekR1LocalConnector):
+    def __init__(self) -> None:
+        super().__init__(system_behavior="Answer briefly.", stateless=True)
+
+    def ask(self, request: str) -> str:
+        self._add_user_message(self._build_prompt(request))
+        return self._query()
+
+    def _build_prompt(self, request: str) -> str:
+        return f"Question: {request}"
+
+def test_sync_client_is_shared_until_configured() -> None:
+    pool = OllamaClientPool()
+    client = pool.sync_client()
+    assert pool.sync_client() is client
+    pool.configure(timeout=10.0)
+    assert pool.sync_client() is not client
+    assert pool.timeout == 10.0
+
+def test_async_client_per_event_loop() -> None:
+    pool = OllamaClientPool()
+
+    async def clients():
+        return pool.async_client(), pool.async_client()
+
+    first, again = asyncio.run(clients())
+    other, _ = asyncio.run(clients())
+    assert first is again
+    assert other is not first
+
+def test_sync_slots_bound_requests_in_flight() -> None:
+    pool = OllamaClientPool()
+    pool.configure(max_in_flight=2)
+    lock = threading.Lock()
+    state = {"in_flight": 0, "max": 0}
+
+    def request() -> None:
+        with pool.slot():
+            with lock:
+                state["in_flight"] += 1
+                state["max"] = max(state["max"], state["in_flight"])
+            time.sleep(0.05)
+            with lock:
+                state["in_flight"] -= 1
+
+    threads = [threading.Thread(target=request) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert state["max"] == 2
+
+def test_async_slots_bound_requests_in_flight() -> None:
+    pool = OllamaClientPool()
+    pool.configure(max_in_flight=3)
+    state = {"in_flight": 0, "max": 0}
+
+    async def request() -> None:
+        async with pool.async_slot():
+            state["in_flight"] += 1
+            state["max"] = max(state["max"], state["in_flight"])
+            await asyncio.sleep(0.02)
+            state["in_flight"] -= 1
+
+    async def main() -> None:
+        await asyncio.gather(*(request() for _ in range(10)))
+
+    asyncio.run(main())
+    assert state["max"] == 3
+
+def test_invalid_max_in_flight() -> None:
+    with pytest.raises(ValueError):
+        OllamaClientPool().configure(max_in_flight=0)
+
+def test_concurrent_async_requests(mock_ollama: MockOllamaServer) -> None:
+    connector = EchoConnector()
+
+    async def main() -> list[str]:
+        return await asyncio.gather(*(connector.ask_async(f"question {index}") for index in range(8)))
+
+    answers = asyncio.run(main())
+    assert len(answers) == 8 and all(answers)
+    # the requests differ, and so do the deterministic answers of the mock.
+    assert len(set(answers)) == 8
+    assert mock_ollama.requests == 8
+
+def test_async_stream_matches_the_full_answer(mock_ollama: MockOllamaServer) -> None:
+    connector = EchoConnector()
+
+    async def stream() -> list[str]:
+        return [partial async for partial in connector.ask_stream_async("streamed")]
+
+    partials = asyncio.run(stream())
+    assert partials[-1] == connector.ask("streamed")
+    assert "<think>" not in partials[-1]
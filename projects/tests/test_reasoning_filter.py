@@ -0,0 +1,81 @@
+import pytest
+from reasoning_filter import ThinkBlockFilter, split_reasoning, strip_reasoning
+
+def stream(text: str, chunk_size: int, capture_reasoning: bool = False) -> tuple[str, ThinkBlockFilter]:
+    """Feeds the text in chunks of `chunk_size` characters, as a streamed response, and returns the visible text and the filter."""
+    think_filter = ThinkBlockFilter(capture_reasoning=capture_reasoning)
+    visible = [think_filter.feed(text[start:start + chunk_size]) for start in range(0, len(text), chunk_size)]
+    visible.append(think_filter.flush())
+    return "".join(visible), think_filter
+
+def split_at(text: str, position: int) -> tuple[str, ThinkBlockFilter]:
+    """Feeds the text as two chunks split at `position`, and returns the visible text and the filter."""
+    think_filter = ThinkBlockFilter(capture_reasoning=True)
+    visible = think_filter.feed(text[:position]) + think_filter.feed(text[position:]) + think_filter.flush()
+    return visible, think_filter
+
+RESPONSE = "<think>\nThe user wants a label.\n</think>\n\nPositive."
+
+@pytest.mark.parametrize("position", range(len(RESPONSE) + 1))
+def test_tags_split_across_chunks(position: int) -> None:
+    visible, think_filter = split_at(RESPONSE, position)
+    assert visible == "Positive."
+    assert think_filter.reasoning == "The user wants a label."
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64])
+def test_tags_streamed_in_small_chunks(chunk_size: int) -> None:
+    visible, _ = stream("<THINK>a < b, so</Think>Answer: a<b", chunk_size)
+    assert visible == "Answer: a<b"
+
+def test_partial_tag_in_answer_is_kept() -> None:
+    visible, _ = stream("<think>x</think>Use <thin and </thi as text.", 3)
+    assert visible == "Use <thin and </thi as text."
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 1000])
+def test_unterminated_block_is_dropped(chunk_size: int) -> None:
+    visible, think_filter = stream("<think>\nreasoning cut off by num_predict", chunk_size, capture_reasoning=True)
+    assert visible == ""
+    assert think_filter.reasoning == "reasoning cut off by num_predict"
+    assert not think_filter.in_reasoning
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1000])
+def test_closing_tag_without_opening_drops_what_precedes_it(chunk_size: int) -> None:
+    # chat templates that open the block in the prompt leave only the closing tag in the response.
+    visible, think_filter = stream("Hmm, the tone is upbeat.\n</think>\n\nPositive.", chunk_size, capture_reasoning=True)
+    assert visible == "Positive."
+    assert think_filter.reasoning == "Hmm, the tone is upbeat."
+    assert think_filter.reasoning_length == len("Hmm, the tone is upbeat.\n")
+
+def test_stray_closing_tag_after_a_block_is_dropped() -> None:
+    assert strip_reasoning("<think>a</think>Answer</think> continues") == "Answer continues"
+
+def test_response_without_tags_is_released_by_flush() -> None:
+    think_filter = ThinkBlockFilter()
+    assert think_filter.feed("No reasoning ") == ""
+    assert think_filter.feed("at all.") == ""
+    assert think_filter.flush() == "No reasoning at all."
+
+def test_answer_is_streamed_once_the_block_is_closed() -> None:
+    think_filter = ThinkBlockFilter()
+    assert think_filter.feed("<think>x</think>\n\nFirst") == "First"
+    assert think_filter.feed(" token") == " token"
+
+def test_reasoning_is_captured_block_by_block() -> None:
+    visible, reasoning = split_reasoning("<think> first </think>One. <think>second</think>Two.")
+    assert visible == "One. Two."
+    assert reasoning == "first\n\nsecond"
+
+def test_reasoning_is_only_counted_unless_captured() -> None:
+    visible, think_filter = stream("<think>12345</think>Answer", 2)
+    assert visible == "Answer"
+    assert think_filter.reasoning == ""
+    assert think_filter.reasoning_length == 5
+
+@pytest.mark.parametrize("text, expected", [
+    ("<think></think>Answer", "Answer"),
+    ("<THINK>x</think>Answer", "Answer"),
+    ("  <think>\n\n</think>\n\n  Answer  ", "Answer"),
+    ("", ""),
+])
+def test_strip_reasoning(text: str, expected: str) -> None:
+    assert strip_reasoning(text) == expected
@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+from typing import Callable
+import pytest
+from request_scheduler import DeadlineExceededError, Priority, QueueFullError, RequestScheduler, effective_priority, priority
+
+MODEL = "test-model"
+
+def wait_until(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    stop = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < stop, "timed out"
+        time.sleep(0.001)
+
+def depth(scheduler: RequestScheduler, level: Priority) -> int:
+    return next(stats.depth for stats in scheduler.stats() if stats.model == MODEL and stats.priority == level.name.lower())
+
+def test_free_slots_go_to_the_most_urgent_class_first() -> None:
+    scheduler = RequestScheduler(slots=1, reserved_slots=0)
+    order: list[str] = []
+
+    def request(level: Priority, name: str) -> None:
+        with scheduler.slot(MODEL, level):
+            order.append(name)
+
+    threads: list[threading.Thread] = []
+    with scheduler.slot(MODEL):
+        for level, name in ((Priority.BULK, "bulk"), (Priority.STANDARD, "standard-1"),
+                            (Priority.STANDARD, "standard-2"), (Priority.INTERACTIVE, "interactive")):
+            waiting = depth(scheduler, level)
+            threads.append(threading.Thread(target=request, args=(level, name)))
+            threads[-1].start()
+            wait_until(lambda: depth(scheduler, level) == waiting + 1)
+    for thread in threads:
+        thread.join(5)
+    assert order == ["interactive", "standard-1", "standard-2", "bulk"]
+
+def test_reserved_slots_are_kept_for_interactive_requests() -> None:
+    scheduler = RequestScheduler(slots=2, reserved_slots=1)
+    done = threading.Event()
+
+    def bulk() -> None:
+        with scheduler.slot(MODEL, Priority.BULK):
+            done.set()
+
+    with scheduler.slot(MODEL, Priority.STANDARD):
+        thread = threading.Thread(target=bulk)
+        thread.start()
+        wait_until(lambda: depth(scheduler, Priority.BULK) == 1)
+        # the last slot is still free for an interactive request.
+        with scheduler.slot(MODEL, Priority.INTERACTIVE, deadline=time.monotonic() + 1.0):
+            assert not done.is_set()
+    thread.join(5)
+    assert done.is_set()
+
+def test_a_full_queue_rejects_at_once() -> None:
+    scheduler = RequestScheduler(slots=1, queue_limits={Priority.STANDARD: 1})
+
+    def request(level: Priority) -> None:
+        with scheduler.slot(MODEL, level):
+            pass
+
+    with scheduler.slot(MODEL):
+        threads = [threading.Thread(target=request, args=(Priority.STANDARD,))]
+        threads[0].start()
+        wait_until(lambda: depth(scheduler, Priority.STANDARD) == 1)
+        with pytest.raises(QueueFullError):
+            request(Priority.STANDARD)
+        # other classes have queues of their own.
+        threads.append(threading.Thread(target=request, args=(Priority.BULK,)))
+        threads[1].start()
+        wait_until(lambda: depth(scheduler, Priority.BULK) == 1)
+    for thread in threads:
+        thread.join(5)
+    standard = next(stats for stats in scheduler.stats() if stats.priority == "standard")
+    assert (standard.admitted, standard.rejected_full) == (2, 1)
+
+def test_waiting_past_the_deadline_is_rejected() -> None:
+    scheduler = RequestScheduler(slots=1)
+    with scheduler.slot(MODEL):
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceededError):
+            with scheduler.slot(MODEL, deadline=started + 0.05):
+                pass
+        assert time.monotonic() - started < 1.0
+    assert depth(scheduler, Priority.STANDARD) == 0
+    # the slot freed by the holder is not taken by the expired request.
+    with scheduler.slot(MODEL, deadline=time.monotonic() + 0.01):
+        pass
+
+def test_a_deadline_the_queue_cannot_meet_is_rejected_without_waiting() -> None:
+    scheduler = RequestScheduler(slots=1)
+    with scheduler.slot(MODEL):
+        time.sleep(0.2)
+    # the model is known to hold a slot for about 0.2 s now.
+    with scheduler.slot(MODEL):
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceededError, match="expected"):
+            with scheduler.slot(MODEL, deadline=started + 0.05):
+                pass
+        assert time.monotonic() - started < 0.05
+    stats = next(stats for stats in scheduler.stats() if stats.priority == "standard")
+    assert (stats.admitted, stats.rejected_deadline) == (2, 1)
+
+def test_async_waiters_are_served_in_priority_order() -> None:
+    scheduler = RequestScheduler(slots=1, reserved_slots=0)
+    order: list[str] = []
+
+    async def request(level: Priority, name: str) -> None:
+        async with scheduler.async_slot(MODEL, level):
+            order.append(name)
+
+    async def main() -> None:
+        async with scheduler.async_slot(MODEL):
+            tasks = [asyncio.create_task(request(Priority.BULK, "bulk"))]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(request(Priority.INTERACTIVE, "interactive")))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["interactive", "bulk"]
+
+def test_a_cancelled_async_waiter_leaves_the_queue() -> None:
+    scheduler = RequestScheduler(slots=1)
+
+    async def request() -> None:
+        async with scheduler.async_slot(MODEL):
+            pass
+
+    async def main() -> None:
+        async with scheduler.async_slot(MODEL):
+            waiter = asyncio.create_task(request())
+            await asyncio.sleep(0.01)
+            assert depth(scheduler, Priority.STANDARD) == 1
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            assert depth(scheduler, Priority.STANDARD) == 0
+        async with scheduler.async_slot(MODEL, deadline=time.monotonic() + 0.01):
+            pass
+
+    asyncio.run(main())
+
+def test_priority_block_overrides_the_default() -> None:
+    assert effective_priority(Priority.INTERACTIVE) is Priority.INTERACTIVE
+    with priority(Priority.BULK):
+        assert effective_priority(Priority.INTERACTIVE) is Priority.BULK
+    assert effective_priority(Priority.STANDARD) is Priority.STANDARD
+
+def test_invalid_slots() -> None:
+    with pytest.raises(ValueError):
+        RequestScheduler(slots=0)
+    with pytest.raises(ValueError):
+        RequestScheduler(slots=1).configure_model(MODEL, 0)
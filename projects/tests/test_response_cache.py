@@ -0,0 +1,102 @@
+import sqlite3
+import pytest
+import response_cache
+from deepseek_connector import DeepSeekR1LocalConnector
+from mock_ollama_server import MockOllamaServer
+from response_cache import ResponseCache
+
+MESSAGES = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "Hello"}]
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return clock
+
+def test_key_depends_on_everything_that_shapes_the_response() -> None:
+    key = ResponseCache.make_key("m", MESSAGES, {"temperature": 0.0}, "json")
+    assert key == ResponseCache.make_key("m", list(MESSAGES), {"temperature": 0.0}, "json")
+    assert key != ResponseCache.make_key("other", MESSAGES, {"temperature": 0.0}, "json")
+    assert key != ResponseCache.make_key("m", MESSAGES[1:], {"temperature": 0.0}, "json")
+    assert key != ResponseCache.make_key("m", MESSAGES, {"temperature": 0.7}, "json")
+    assert key != ResponseCache.make_key("m", MESSAGES, {"temperature": 0.0}, None)
+
+def test_memory_tier_is_lru() -> None:
+    cache = ResponseCache(max_memory_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    stats = cache.stats
+    assert (stats.memory_hits, stats.misses, stats.stores, stats.evictions) == (3, 1, 3, 1)
+
+def test_entries_expire(clock: Clock) -> None:
+    cache = ResponseCache(ttl=60.0)
+    cache.put("a", "A")
+    clock.now += 59.0
+    assert cache.get("a") == "A"
+    clock.now += 2.0
+    assert cache.get("a") is None
+
+def test_disk_tier_survives_the_process(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite")
+    first = ResponseCache(path)
+    first.put("a", "A")
+    first.close()
+    second = ResponseCache(path, max_memory_entries=1)
+    assert second.get("a") == "A"
+    assert second.stats.disk_hits == 1
+    # promoted to memory by the disk hit.
+    assert second.get("a") == "A"
+    assert second.stats.memory_hits == 1
+    second.close()
+
+def test_disk_tier_drops_least_recently_used(tmp_path, clock: Clock, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(ResponseCache, "PRUNE_INTERVAL", 1)
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path, max_memory_entries=1, max_disk_entries=2)
+    for key in ("a", "b"):
+        clock.now += 1.0
+        cache.put(key, key.upper())
+    clock.now += 1.0
+    assert cache.get("a") == "A"
+    clock.now += 1.0
+    cache.put("c", "C")
+    cache.close()
+    keys = {row[0] for row in sqlite3.connect(path).execute("SELECT key FROM responses")}
+    assert keys == {"a", "c"}
+
+def test_clear_empties_both_tiers(tmp_path) -> None:
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    cache.put("a", "A")
+    cache.clear()
+    assert cache.get("a") is None
+    cache.close()
+
+def test_invalid_sizes() -> None:
+    with pytest.raises(ValueError):
+        ResponseCache(max_memory_entries=0)
+
+class EchoConnector(DeepSeekR1LocalConnector):
+    def ask(self, request: str) -> str:
+        self._add_user_message(request)
+        return self._query()
+
+def test_connector_answers_repeated_requests_from_the_cache(mock_ollama: MockOllamaServer) -> None:
+    cache = ResponseCache()
+    connector = EchoConnector(system_behavior="Answer briefly.", stateless=True, response_cache=cache)
+    answer = connector.ask("What is the capital of France?")
+    assert connector.ask("What is the capital of France?") == answer
+    assert mock_ollama.requests == 1
+    assert cache.stats.hits == 1
+    connector.ask("And of Italy?")
+    assert mock_ollama.requests == 2
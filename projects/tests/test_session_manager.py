@@ -0,0 +1,150 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import session_manager
+from deepseek_connector import DeepSeekR1LocalConnector
+from session_manager import SessionManager
+
+class NoteTaker(DeepSeekR1LocalConnector):
+    """Keeps the conversation without querying a model."""
+
+    def ask(self, request: str) -> str:
+        self._add_to_chat_history("user", request)
+        self._add_to_chat_history("assistant", "noted")
+        return "noted"
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(session_manager.time, "monotonic", clock)
+    return clock
+
+def ask(manager: SessionManager[NoteTaker], session_id: str, request: str = "Hello") -> NoteTaker:
+    with manager.session(session_id) as connector:
+        connector.ask(request)
+    return connector
+
+def test_sessions_keep_separate_conversations() -> None:
+    manager = SessionManager(NoteTaker)
+    first = ask(manager, "a", "first")
+    second = ask(manager, "b", "second")
+    assert first is not second
+    assert ask(manager, "a", "again") is first
+    assert [m["content"] for m in first.export_history() if m["role"] == "user"] == ["first", "again"]
+    assert manager.stats.sessions == 2 and manager.stats.created == 2
+
+def test_no_session_gets_a_throwaway_connector() -> None:
+    manager = SessionManager(NoteTaker)
+    assert ask(manager, None) is not ask(manager, None)
+    assert manager.stats.sessions == 0
+
+def test_idle_sessions_expire(clock: Clock) -> None:
+    manager = SessionManager(NoteTaker, idle_ttl=60.0)
+    first = ask(manager, "a")
+    clock.now += 30.0
+    ask(manager, "b")
+    clock.now += 45.0
+    assert manager.sweep() == 1
+    assert manager.stats.sessions == 1 and manager.stats.expired == 1
+    assert ask(manager, "a") is not first
+
+def test_least_recently_used_session_is_evicted() -> None:
+    manager = SessionManager(NoteTaker, max_sessions=2)
+    first = ask(manager, "a")
+    second = ask(manager, "b")
+    ask(manager, "a")
+    ask(manager, "c")
+    assert manager.stats.evicted == 1
+    assert ask(manager, "a") is first
+    assert ask(manager, "b") is not second
+
+def test_sessions_are_evicted_over_the_history_budget() -> None:
+    manager = SessionManager(NoteTaker, max_history_bytes=100)
+    ask(manager, "a", "x" * 60)
+    ask(manager, "b", "y" * 60)
+    stats = manager.stats
+    assert stats.sessions == 1 and stats.evicted == 1
+    assert stats.history_bytes <= 100
+
+def test_a_busy_session_is_never_evicted() -> None:
+    manager = SessionManager(NoteTaker, max_sessions=1)
+    with manager.session("a") as busy:
+        busy.ask("working")
+        other = ask(manager, "b")
+        # the idle session made room instead.
+        assert manager.stats.evicted == 1
+    assert ask(manager, "a") is busy
+    assert ask(manager, "b") is not other
+
+def test_evicted_sessions_are_spilled_and_restored(tmp_path) -> None:
+    manager = SessionManager(NoteTaker, max_sessions=1, spill_dir=tmp_path)
+    history = ask(manager, "a", "remember me").export_history()
+    ask(manager, "b")
+    assert manager.stats.spilled == 1
+    assert len(list(tmp_path.iterdir())) == 1
+    restored = ask(manager, "a", "again")
+    assert restored.export_history()[:len(history)] == history
+    stats = manager.stats
+    assert stats.restored == 1 and stats.evicted == 2
+    # "b" was spilled in turn, and the file of "a" removed on restore.
+    assert len(list(tmp_path.iterdir())) == 1
+
+def test_a_lost_spill_is_reported_and_counted(tmp_path, capsys: pytest.CaptureFixture[str]) -> None:
+    manager = SessionManager(NoteTaker, max_sessions=1, spill_dir=tmp_path)
+    ask(manager, "a", "remember me")
+    ask(manager, "b")
+    for spill in tmp_path.iterdir():
+        spill.write_text("{not json", encoding="utf-8")
+    restored = ask(manager, "a", "again")
+    assert [m["content"] for m in restored.export_history() if m["role"] == "user"] == ["again"]
+    stats = manager.stats
+    assert (stats.restored, stats.restore_failures) == (0, 1)
+    captured = capsys.readouterr()
+    assert "could not be restored" in captured.err and captured.out == ""
+
+def test_closing_a_session_drops_its_spill(tmp_path) -> None:
+    manager = SessionManager(NoteTaker, max_sessions=1, spill_dir=tmp_path)
+    ask(manager, "a")
+    ask(manager, "b")
+    manager.close("a")
+    assert manager.stats.spilled == 0
+    assert not list(tmp_path.iterdir())
+
+def test_spills_of_a_previous_run_are_removed(tmp_path) -> None:
+    (tmp_path / "NoteTaker-stale.json").write_text("[]", encoding="utf-8")
+    (tmp_path / "unrelated.json").write_text("[]", encoding="utf-8")
+    SessionManager(NoteTaker, spill_dir=tmp_path)
+    assert [path.name for path in tmp_path.iterdir()] == ["unrelated.json"]
+
+def test_shared_manager_lends_one_connector() -> None:
+    manager = SessionManager(NoteTaker, factory=lambda: NoteTaker(stateless=True), shared=True)
+    assert ask(manager, "a") is ask(manager, "b") is ask(manager, None)
+    assert manager.stats.created == 1 and manager.stats.sessions == 0
+
+def test_concurrent_first_requests_of_a_session_share_its_connector() -> None:
+    barrier = threading.Barrier(4)
+
+    def slow_factory() -> NoteTaker:
+        barrier.wait(timeout=5)
+        time.sleep(0.01)
+        return NoteTaker()
+
+    manager = SessionManager(NoteTaker, factory=slow_factory)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        connectors = list(pool.map(lambda _: ask(manager, "a"), range(4)))
+    assert all(connector is connectors[0] for connector in connectors)
+    assert manager.stats.created == 1
+    assert len(connectors[0].export_history()) == 8
+
+@pytest.mark.parametrize("arguments", [{"max_sessions": 0}, {"idle_ttl": 0}, {"max_history_bytes": 0}])
+def test_invalid_limits(arguments: dict) -> None:
+    with pytest.raises(ValueError):
+        SessionManager(NoteTaker, **arguments)
@@ -0,0 +1,69 @@
+import threading
+import pytest
+from speech_engines import TTSWorker
+
+class FakeEngine:
+    def __init__(self) -> None:
+        self.spoken: list[str] = []
+        self.__text = ""
+
+    def say(self, text: str) -> None:
+        if not text:
+            raise RuntimeError("nothing to say")
+        self.__text = text
+
+    def runAndWait(self) -> None:
+        self.spoken.append(self.__text)
+
+class Owner:
+    pass
+
+def test_jobs_are_spoken_in_order() -> None:
+    engine = FakeEngine()
+    worker = TTSWorker(lambda: engine)
+    jobs = [worker.speak(text) for text in ("one", "two", "three")]
+    assert jobs[-1].wait(5)
+    assert engine.spoken == ["one", "two", "three"]
+    assert worker.last_error is None
+    worker.close()
+
+def test_cancelled_jobs_are_skipped() -> None:
+    gate = threading.Event()
+
+    class BlockingEngine(FakeEngine):
+        def runAndWait(self) -> None:
+            gate.wait(5)
+            super().runAndWait()
+
+    engine = BlockingEngine()
+    worker = TTSWorker(lambda: engine)
+    first, second = Owner(), Owner()
+    worker.speak("start")
+    jobs = [worker.speak("dropped", first), worker.speak("kept", second)]
+    worker.cancel(first)
+    gate.set()
+    assert all(job.wait(5) for job in jobs)
+    assert engine.spoken == ["start", "kept"]
+    worker.close()
+
+def test_failures_are_reported_and_kept(capsys: pytest.CaptureFixture[str]) -> None:
+    engine = FakeEngine()
+    worker = TTSWorker(lambda: engine)
+    assert worker.speak("").wait(5)
+    assert isinstance(worker.last_error, RuntimeError)
+    assert worker.speak("after").wait(5)
+    assert engine.spoken == ["after"]
+    captured = capsys.readouterr()
+    assert "Text-to-speech failed: nothing to say" in captured.err
+    assert captured.out == ""
+    worker.close()
+
+def test_jobs_are_drained_without_an_engine(capsys: pytest.CaptureFixture[str]) -> None:
+    def no_driver() -> FakeEngine:
+        raise OSError("no speech driver")
+
+    worker = TTSWorker(no_driver)
+    assert worker.speak("lost").wait(5)
+    assert isinstance(worker.last_error, OSError)
+    assert "Text-to-speech is unavailable: no speech driver" in capsys.readouterr().err
+    worker.close()
@@ -1,5 +1,8 @@
 from deepseek_connector import DeepSeekR1LocalConnector
+from model_manager import model_manager
+from session_manager import SessionManager
 from ollama import chat, ChatResponse
+from typing import AsyncIterator, Iterator
 import gradio as gr
 
 class DeepSeekR1TextGenerator(DeepSeekR1LocalConnector):
@@ -12,20 +15,36 @@ class DeepSeekR1TextGenerator(DeepSeekR1LocalConnector):
                                           "Your response should be in the Markdown format, if applicable."))
 
     def ask(self, request: str, word_limit: int = 500) -> str:
+        self._add_user_message(self._build_prompt(request, word_limit))
+        return self._query()
+
+    def ask_stream(self, request: str, word_limit: int = 500) -> Iterator[str]:
+        self._add_user_message(self._build_prompt(request, word_limit))
+        yield from self._accumulate(self._query_stream())
+
+    async def ask_stream_async(self, request: str, word_limit: int = 500) -> AsyncIterator[str]:
+        self._add_user_message(self._build_prompt(request, word_limit))
+        async for text in self._accumulate_async(self._query_stream_async()):
+            yield text
+
+    def _build_prompt(self, request: str, word_limit: int = 500) -> str:
         if not request or request.strip() == "":
             raise ValueError("Request cannot be empty.")
-        prompt = f"Generate a text based on the following request in {word_limit} words:\n\n{request}\n\n"
-        self._add_user_message(prompt)
-        return self._query()
+        return f"Generate a text based on the following request in {word_limit} words:\n\n{request}\n\n"
 
-# replace the Interface with Blocks layout
-generator = DeepSeekR1TextGenerator()
-with gr.Blocks() as generator_interface:
-    text_request = gr.Textbox(label="Text Request", placeholder="Enter the text request you want to generate here...")
-    word_limit = gr.Slider(minimum=100, maximum=1000, step=50, label="Word Limit", value=500)
-    submit_btn = gr.Button("Submit")
-    output = gr.Markdown(label="Generated Text")
-    submit_btn.click(fn=generator.ask, inputs=[text_request, word_limit], outputs=[output], show_progress="full")
+def generator_interface() -> gr.Blocks:
+    """Builds the UI of the text generator. Every session gets its connector on its first request."""
+    generator_sessions: SessionManager[DeepSeekR1TextGenerator] = SessionManager(DeepSeekR1TextGenerator)
+    # replace the Interface with Blocks layout
+    with gr.Blocks() as interface:
+        text_request = gr.Textbox(label="Text Request", placeholder="Enter the text request you want to generate here...")
+        word_limit = gr.Slider(minimum=100, maximum=1000, step=50, label="Word Limit", value=500)
+        submit_btn = gr.Button("Submit")
+        output = gr.Markdown(label="Generated Text")
+        submit_btn.click(fn=generator_sessions.handler("ask_stream_async"), inputs=[text_request, word_limit], outputs=[output], show_progress="full")
+    return generator_sessions.attach(interface)
 
 if __name__ == "__main__":
-    generator_interface.launch()
\ No newline at end of file
+    interface = generator_interface()
+    model_manager.preload()
+    interface.launch()
\ No newline at end of file
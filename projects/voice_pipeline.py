@@ -0,0 +1,133 @@
+import re
+import numpy as np
+from speech_engines import SpeechJob, TTSWorker
+from speech_recognizer import to_mono_float32
+
+class SentenceSplitter:
+    """
+    Splits streamed text into complete sentences as soon as they end, so each of them can be spoken
+    while the rest of the response is still being generated.
+    """
+    # a sentence ends with terminal punctuation (optionally closed by quotes or brackets) followed by whitespace,
+    # or with a line break. Digits around a dot ("3.5") are not followed by whitespace, so they never match.
+    __BOUNDARY = re.compile(r"(?<=[.!?…])[\"')\]]*\s+|\n+")
+
+    def __init__(self, min_length: int = 12) -> None:
+        """
+        Args:
+            min_length (int): Sentences shorter than this are merged with the next one, to avoid choppy speech on "Yes." or list markers.
+        """
+        self.__buffer: str = ""
+        self.__min_length = min_length
+
+    def feed(self, chunk: str) -> list[str]:
+        """
+        Args:
+            chunk (str): The next chunk of the streamed text.
+
+        Returns:
+            list[str]: The sentences completed by the chunk. May be empty.
+        """
+        self.__buffer += chunk
+        sentences: list[str] = []
+        start = 0
+        for boundary in self.__BOUNDARY.finditer(self.__buffer):
+            sentence = self.__buffer[start:boundary.end()].strip()
+            if len(sentence) >= self.__min_length:
+                sentences.append(sentence)
+                start = boundary.end()
+        self.__buffer = self.__buffer[start:]
+        return sentences
+
+    def flush(self) -> list[str]:
+        """
+        Returns:
+            list[str]: The text left after the last complete sentence, if any.
+        """
+        rest, self.__buffer = self.__buffer.strip(), ""
+        return [rest] if rest else []
+
+class Endpointer:
+    """
+    Collects streamed microphone chunks and detects the end of an utterance by the silence that follows it.
+    """
+
+    def __init__(self,
+                 sample_rate: int = 16000,
+                 silence_threshold: float = 0.01,
+                 end_silence_ms: int = 700,
+                 max_utterance_s: float = 30.0) -> None:
+        """
+        Args:
+            sample_rate (int): The sample rate the chunks are converted to.
+            silence_threshold (float): The RMS below which a chunk counts as silence.
+            end_silence_ms (int): The silence after speech that ends the utterance, in milliseconds.
+            max_utterance_s (float): The length after which an utterance is ended even without a pause, in seconds.
+        """
+        self.__sample_rate = sample_rate
+        self.__silence_threshold = silence_threshold
+        self.__end_silence = int(sample_rate * end_silence_ms / 1000)
+        self.__max_samples = int(sample_rate * max_utterance_s)
+        self.__chunks: list[np.ndarray] = []
+        self.__samples = 0
+        self.__trailing_silence = 0
+        self.__heard_speech = False
+
+    def feed(self, sample_rate: int, samples: np.ndarray) -> bool:
+        """
+        Adds a chunk of microphone audio.
+
+        Args:
+            sample_rate (int): The sample rate of the chunk.
+            samples (np.ndarray): The samples of the chunk, as delivered by Gradio.
+
+        Returns:
+            bool: Whether the utterance has ended and can be taken.
+        """
+        chunk = to_mono_float32(samples, sample_rate, self.__sample_rate)
+        if not len(chunk):
+            return False
+        if float(np.sqrt(np.mean(np.square(chunk)))) >= self.__silence_threshold:
+            self.__heard_speech = True
+            self.__trailing_silence = 0
+        elif self.__heard_speech:
+            self.__trailing_silence += len(chunk)
+        else:
+            # leading silence is never part of an utterance.
+            return False
+        self.__chunks.append(chunk)
+        self.__samples += len(chunk)
+        return self.__trailing_silence >= self.__end_silence or self.__samples >= self.__max_samples
+
+    def take(self) -> tuple[int, np.ndarray]:
+        """
+        Returns the collected utterance and starts listening for the next one.
+
+        Returns:
+            tuple[int, np.ndarray]: The sample rate and the float32 samples of the utterance.
+        """
+        utterance = np.concatenate(self.__chunks) if self.__chunks else np.zeros(0, dtype=np.float32)
+        self.__chunks = []
+        self.__samples = self.__trailing_silence = 0
+        self.__heard_speech = False
+        return self.__sample_rate, utterance
+
+class SentenceSpeaker:
+    """
+    Speaks the sentences of one session in order, through the shared text-to-speech worker, without blocking the caller.
+    Interrupting drops only the sentences of this session that were not spoken yet.
+    """
+
+    def __init__(self, worker: TTSWorker) -> None:
+        """
+        Args:
+            worker (TTSWorker): The worker that owns the engine.
+        """
+        self.__worker = worker
+
+    def say(self, sentence: str) -> SpeechJob:
+        return self.__worker.speak(sentence, owner=self)
+
+    def interrupt(self) -> None:
+        """Drops the sentences that have not been spoken yet."""
+        self.__worker.cancel(self)
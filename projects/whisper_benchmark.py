@@ -0,0 +1,63 @@
+import argparse
+import time
+import wave
+import numpy as np
+from speech_recognizer import WhisperTranscriber
+
+def load_wav(path: str) -> tuple[int, np.ndarray]:
+    """
+    Loads a 16-bit PCM WAV file in the (sample_rate, samples) form Gradio delivers microphone audio in.
+
+    Args:
+        path (str): The WAV file.
+
+    Returns:
+        tuple[int, np.ndarray]: The sample rate and the int16 samples, shaped (frames, channels) for multi-channel files.
+    """
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError("Only 16-bit PCM WAV files are supported.")
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+        channels = wav.getnchannels()
+        return wav.getframerate(), samples.reshape(-1, channels) if channels > 1 else samples
+
+def synthetic_audio(seconds: float, sample_rate: int = 48000) -> tuple[int, np.ndarray]:
+    """
+    Generates speech-like audio - an amplitude modulated harmonic tone with pauses - for measuring speed when no recording is at hand.
+    The transcript is meaningless, but the decoder still has to process every voiced frame.
+    """
+    timeline = np.arange(int(seconds * sample_rate)) / sample_rate
+    voice = sum(np.sin(2 * np.pi * 140 * harmonic * timeline) / harmonic for harmonic in range(1, 6))
+    syllables = np.clip(np.sin(2 * np.pi * 3 * timeline), 0, None) * (np.sin(2 * np.pi * 0.25 * timeline) > -0.5)
+    return sample_rate, (0.3 * voice * syllables * np.iinfo(np.int16).max / 3).astype(np.int16)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measures the real-time factor of faster-whisper models on CPU.")
+    parser.add_argument("--audio", help="16-bit PCM WAV file to transcribe. Synthetic audio is used if omitted.")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Length of the synthetic audio.")
+    parser.add_argument("--models", nargs="+", default=["tiny", "base", "small"])
+    parser.add_argument("--compute-type", default="int8")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    sample_rate, samples = load_wav(args.audio) if args.audio else synthetic_audio(args.seconds)
+    duration = len(samples) / sample_rate
+    print(f"Audio: {duration:.1f} s at {sample_rate} Hz")
+    print(f"{'model':<10}{'load s':>10}{'best s':>10}{'RTF':>8}  transcript")
+    for model_size in args.models:
+        transcriber = WhisperTranscriber(model_size=model_size, compute_type=args.compute_type)
+        started = time.perf_counter()
+        transcriber.model
+        load_time = time.perf_counter() - started
+        timings: list[float] = []
+        transcript = ""
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            transcript = transcriber.transcribe(samples, sample_rate)
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        # real-time factor: processing time per second of audio. Below 1 is faster than real time.
+        print(f"{model_size:<10}{load_time:>10.2f}{best:>10.2f}{best / duration:>8.3f}  {transcript[:40]!r}")
+
+if __name__ == "__main__":
+    main()